@@ -10,7 +10,10 @@ module.exports = {
       max_memory_restart: "500M",
       env: {
         PYTHONPATH: ".",
-        NODE_ENV: "production"
+        NODE_ENV: "production",
+        SERVICE_NAME: "bot",
+        DB_POOL_SIZE: "5",
+        DB_MAX_OVERFLOW: "5"
       }
     },
     {
@@ -23,7 +26,10 @@ module.exports = {
       max_memory_restart: "1G",
       env: {
         PYTHONPATH: ".",
-        NODE_ENV: "production"
+        NODE_ENV: "production",
+        SERVICE_NAME: "worker",
+        DB_POOL_SIZE: "5",
+        DB_MAX_OVERFLOW: "5"
       }
     },
     {
@@ -36,7 +42,10 @@ module.exports = {
       max_memory_restart: "500M",
       env: {
         PYTHONPATH: ".",
-        NODE_ENV: "production"
+        NODE_ENV: "production",
+        SERVICE_NAME: "ingestor",
+        DB_POOL_SIZE: "2",
+        DB_MAX_OVERFLOW: "2"
       }
     },
     {
@@ -50,7 +59,10 @@ module.exports = {
       max_memory_restart: "300M",
       env: {
         PYTHONPATH: ".",
-        NODE_ENV: "production"
+        NODE_ENV: "production",
+        SERVICE_NAME: "payment",
+        DB_POOL_SIZE: "3",
+        DB_MAX_OVERFLOW: "2"
       }
     },
     {
@@ -63,7 +75,10 @@ module.exports = {
       max_memory_restart: "300M",
       env: {
         PYTHONPATH: ".",
-        NODE_ENV: "production"
+        NODE_ENV: "production",
+        SERVICE_NAME: "sniper",
+        DB_POOL_SIZE: "1",
+        DB_MAX_OVERFLOW: "0"
       }
     },
     {
@@ -77,7 +92,10 @@ module.exports = {
       cwd: "./",
       env: {
         PYTHONPATH: ".",
-        NODE_ENV: "production"
+        NODE_ENV: "production",
+        SERVICE_NAME: "analyzer",
+        DB_POOL_SIZE: "5",
+        DB_MAX_OVERFLOW: "5"
       },
       error_file: "logs/analyzer-error.log",
       out_file: "logs/analyzer-out.log",
@@ -5,12 +5,15 @@ Chạy: python init_db.py
 import asyncio
 from src.database.db import init_db
 from src.common.logger import get_logger
+from src.worker.news_partitions import news_partitions
 
 logger = get_logger("init_db")
 
 async def main():
     logger.info("Initializing database tables...")
     await init_db()
+    # create_all only creates the partitioned crypto_news parent: inserts need partitions
+    await news_partitions.ensure_partitions()
     logger.info("Database initialized successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,144 @@
+"""Partition crypto_news by created_at (weekly) with cross-partition dedup table
+
+Revision ID: 003_partition_crypto_news
+Revises: 002_crypto_news_schema
+Create Date: 2026-10-19 09:00:00.000000
+
+- crypto_news becomes PARTITION BY RANGE (created_at), one partition per week
+  (crypto_news_pYYYYMMDD, Monday start) + crypto_news_default.
+- Unique constraints on a partitioned table must include the partition key, so
+  content_hash uniqueness moves to news_hashes (content_hash PK -> news_id, created_at).
+- news_duplicates no longer has a FK to crypto_news.id (FK to partitioned table
+  would need (id, created_at)).
+New partitions ahead of time and retention are handled by src/worker/news_partitions.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003_partition_crypto_news'
+down_revision = '002_crypto_news_schema'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Rebuild crypto_news as a weekly range-partitioned table."""
+
+    op.drop_constraint('news_duplicates_first_news_id_fkey', 'news_duplicates', type_='foreignkey')
+    op.execute("ALTER TABLE crypto_news RENAME TO crypto_news_legacy")
+    op.execute("ALTER SEQUENCE crypto_news_id_seq RENAME TO crypto_news_legacy_id_seq")
+    for index in ('idx_content_hash', 'idx_source_id', 'idx_created_at', 'idx_final_weight'):
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+
+    op.execute("CREATE SEQUENCE crypto_news_id_seq")
+    op.execute("""
+        CREATE TABLE crypto_news (
+            id BIGINT NOT NULL DEFAULT nextval('crypto_news_id_seq'),
+            content_hash VARCHAR(64) NOT NULL,
+            source_id BIGINT NOT NULL,
+            source_name VARCHAR NOT NULL,
+            message_id INTEGER,
+            text_summary VARCHAR(500) NOT NULL,
+            text_full TEXT,
+            layer1_matched_keywords JSON,
+            layer2_quality_score DOUBLE PRECISION,
+            layer2_sentiment VARCHAR,
+            layer2_urgency VARCHAR,
+            layer2_credibility DOUBLE PRECISION,
+            layer3_relevance DOUBLE PRECISION,
+            layer3_credibility DOUBLE PRECISION,
+            layer3_market_impact DOUBLE PRECISION,
+            final_weight DOUBLE PRECISION,
+            ai_reasoning TEXT,
+            message_link VARCHAR,
+            image_path VARCHAR,
+            tags JSON,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            first_seen_at TIMESTAMPTZ DEFAULT now(),
+            last_seen_at TIMESTAMPTZ DEFAULT now(),
+            occurrences INTEGER DEFAULT 1,
+            view_count INTEGER DEFAULT 0,
+            share_count INTEGER DEFAULT 0,
+            user_feedback INTEGER DEFAULT 0,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE crypto_news_id_seq OWNED BY crypto_news.id")
+
+    # Indexes are created on every partition automatically
+    op.create_index('idx_crypto_news_content_hash', 'crypto_news', ['content_hash'])
+    op.create_index('idx_crypto_news_source_id', 'crypto_news', ['source_id'])
+    op.create_index('idx_crypto_news_created_at', 'crypto_news', ['created_at'])
+    op.create_index('idx_crypto_news_final_weight', 'crypto_news', ['final_weight'])
+
+    # Weekly partitions covering existing data + 4 weeks ahead, plus a default catch-all
+    op.execute("""
+        DO $$
+        DECLARE
+            week_start DATE := date_trunc('week', coalesce((SELECT min(created_at) FROM crypto_news_legacy), now()))::date;
+            last_week DATE := date_trunc('week', now() + interval '4 weeks')::date;
+        BEGIN
+            WHILE week_start <= last_week LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF crypto_news FOR VALUES FROM (%L) TO (%L)',
+                    'crypto_news_p' || to_char(week_start, 'YYYYMMDD'), week_start, week_start + 7
+                );
+                week_start := week_start + 7;
+            END LOOP;
+        END $$;
+    """)
+    op.execute("CREATE TABLE IF NOT EXISTS crypto_news_default PARTITION OF crypto_news DEFAULT")
+
+    # Cross-partition dedup
+    op.create_table(
+        'news_hashes',
+        sa.Column('content_hash', sa.String(64), nullable=False),
+        sa.Column('news_id', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('content_hash')
+    )
+    op.create_index('idx_news_hashes_created_at', 'news_hashes', ['created_at'])
+
+    # Copy data
+    op.execute("INSERT INTO crypto_news SELECT * FROM crypto_news_legacy")
+    op.execute("""
+        INSERT INTO news_hashes (content_hash, news_id, created_at)
+        SELECT content_hash, id, created_at FROM crypto_news_legacy
+    """)
+    op.execute("SELECT setval('crypto_news_id_seq', coalesce((SELECT max(id) FROM crypto_news_legacy), 0) + 1, false)")
+    op.execute("DROP TABLE crypto_news_legacy")
+
+
+def downgrade() -> None:
+    """Back to a single crypto_news table with unique content_hash."""
+
+    op.execute("ALTER TABLE crypto_news RENAME TO crypto_news_partitioned")
+    op.execute("ALTER SEQUENCE crypto_news_id_seq RENAME TO crypto_news_partitioned_id_seq")
+    for index in ('idx_crypto_news_content_hash', 'idx_crypto_news_source_id',
+                  'idx_crypto_news_created_at', 'idx_crypto_news_final_weight'):
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+
+    op.execute("CREATE TABLE crypto_news (LIKE crypto_news_partitioned INCLUDING DEFAULTS)")
+    op.execute("CREATE SEQUENCE crypto_news_id_seq OWNED BY crypto_news.id")
+    op.execute("ALTER TABLE crypto_news ALTER COLUMN id SET DEFAULT nextval('crypto_news_id_seq')")
+    op.execute("INSERT INTO crypto_news SELECT * FROM crypto_news_partitioned")
+    op.execute("SELECT setval('crypto_news_id_seq', coalesce((SELECT max(id) FROM crypto_news), 0) + 1, false)")
+    op.execute("DROP TABLE crypto_news_partitioned CASCADE")
+
+    op.create_primary_key('crypto_news_pkey', 'crypto_news', ['id'])
+    op.create_unique_constraint('crypto_news_content_hash_key', 'crypto_news', ['content_hash'])
+    op.create_index('idx_content_hash', 'crypto_news', ['content_hash'])
+    op.create_index('idx_source_id', 'crypto_news', ['source_id'])
+    op.create_index('idx_created_at', 'crypto_news', ['created_at'])
+    op.create_index('idx_final_weight', 'crypto_news', ['final_weight'])
+
+    op.drop_index('idx_news_hashes_created_at', table_name='news_hashes')
+    op.drop_table('news_hashes')
+
+    op.execute("DELETE FROM news_duplicates WHERE first_news_id NOT IN (SELECT id FROM crypto_news)")
+    op.create_foreign_key(
+        'news_duplicates_first_news_id_fkey', 'news_duplicates', 'crypto_news',
+        ['first_news_id'], ['id']
+    )
@@ -0,0 +1,40 @@
+"""Composite indexes for the news feed API (keyset pagination on created_at, id)
+
+Revision ID: 004_news_feed_indexes
+Revises: 003_partition_crypto_news
+Create Date: 2026-10-19 10:00:00.000000
+
+Every feed filter is paired with the (created_at DESC, id DESC) ordering so
+keyset pages are an index range scan inside the pruned partitions.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '004_news_feed_indexes'
+down_revision = '003_partition_crypto_news'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create feed indexes (propagated to every crypto_news partition)."""
+    op.execute("CREATE INDEX IF NOT EXISTS idx_crypto_news_feed ON crypto_news (created_at DESC, id DESC)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_crypto_news_source_feed "
+        "ON crypto_news (source_id, created_at DESC, id DESC)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_crypto_news_sentiment_feed "
+        "ON crypto_news (layer2_sentiment, created_at DESC, id DESC)"
+    )
+    # Tag filter: tags @> '["SIGNAL"]'
+    op.execute("CREATE INDEX IF NOT EXISTS idx_crypto_news_tags ON crypto_news USING GIN ((tags::jsonb))")
+
+
+def downgrade() -> None:
+    """Drop feed indexes."""
+    op.execute("DROP INDEX IF EXISTS idx_crypto_news_tags")
+    op.execute("DROP INDEX IF EXISTS idx_crypto_news_sentiment_feed")
+    op.execute("DROP INDEX IF EXISTS idx_crypto_news_source_feed")
+    op.execute("DROP INDEX IF EXISTS idx_crypto_news_feed")
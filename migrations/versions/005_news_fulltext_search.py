@@ -0,0 +1,42 @@
+"""Full-text search over crypto_news (tsvector + GIN, pg_trgm for ticker tokens)
+
+Revision ID: 005_news_fulltext_search
+Revises: 004_news_feed_indexes
+Create Date: 2026-10-19 11:00:00.000000
+
+- search_vector: to_tsvector('simple', text) written by the analyzer (news_writer)
+  on insert. 'simple' config because messages mix Vietnamese and English.
+- Trigram index on text_summary for ticker-like tokens ($BTC, #ETH) that the
+  tsvector parser strips of their prefix.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '005_news_fulltext_search'
+down_revision = '004_news_feed_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add search_vector + GIN/trigram indexes and backfill existing rows."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("ALTER TABLE crypto_news ADD COLUMN IF NOT EXISTS search_vector tsvector")
+    op.execute("""
+        UPDATE crypto_news
+        SET search_vector = to_tsvector('simple', coalesce(text_full, text_summary))
+        WHERE search_vector IS NULL
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_crypto_news_search ON crypto_news USING GIN (search_vector)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_crypto_news_summary_trgm "
+        "ON crypto_news USING GIN (text_summary gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Drop full-text search column and indexes."""
+    op.execute("DROP INDEX IF EXISTS idx_crypto_news_summary_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_crypto_news_search")
+    op.execute("ALTER TABLE crypto_news DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,27 @@
+"""Per-rule source channel scoping
+
+Revision ID: 006_filter_rule_source_channels
+Revises: 005_news_fulltext_search
+Create Date: 2026-10-19 12:00:00.000000
+
+filter_rules.source_channels: JSON list of chat_id, NULL = every source.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006_filter_rule_source_channels'
+down_revision = '005_news_fulltext_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add filter_rules.source_channels."""
+    op.add_column('filter_rules', sa.Column('source_channels', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop filter_rules.source_channels."""
+    op.drop_column('filter_rules', 'source_channels')
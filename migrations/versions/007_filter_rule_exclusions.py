@@ -0,0 +1,27 @@
+"""Per-rule exclusion terms
+
+Revision ID: 007_filter_rule_exclusions
+Revises: 006_filter_rule_source_channels
+Create Date: 2026-10-19 12:30:00.000000
+
+filter_rules.must_not_have: JSON list of terms, NULL = no exclusion.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_filter_rule_exclusions'
+down_revision = '006_filter_rule_source_channels'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add filter_rules.must_not_have."""
+    op.add_column('filter_rules', sa.Column('must_not_have', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop filter_rules.must_not_have."""
+    op.drop_column('filter_rules', 'must_not_have')
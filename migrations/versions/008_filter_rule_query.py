@@ -0,0 +1,28 @@
+"""Boolean keyword queries
+
+Revision ID: 008_filter_rule_query
+Revises: 007_filter_rule_exclusions
+Create Date: 2026-10-19 13:00:00.000000
+
+filter_rules.query: canonical AND/OR/NOT/NEAR query (src/worker/query_parser.py),
+NULL = plain keyword rule.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008_filter_rule_query'
+down_revision = '007_filter_rule_exclusions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add filter_rules.query."""
+    op.add_column('filter_rules', sa.Column('query', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop filter_rules.query."""
+    op.drop_column('filter_rules', 'query')
@@ -0,0 +1,74 @@
+"""NOTIFY ingestor on blacklist / source config changes
+
+Revision ID: 009_ingestor_config_notify
+Revises: 008_filter_rule_query
+Create Date: 2026-10-19 14:00:00.000000
+
+Triggers on blacklisted_channels and source_configs call pg_notify('ingestor_config', ...)
+for every row change (including manual SQL), so the ingestor updates its in-memory
+blacklist / source configs incrementally (src/ingestor/config_sync.py).
+Payload: {"table", "op", "id", "old_id"} (+ "tags", "priority" for source_configs).
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '009_ingestor_config_notify'
+down_revision = '008_filter_rule_query'
+branch_labels = None
+depends_on = None
+
+TABLES = ('blacklisted_channels', 'source_configs')
+
+
+def upgrade() -> None:
+    """Create the notify function and row / truncate triggers."""
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_ingestor_config() RETURNS trigger AS $$
+        DECLARE
+            payload json;
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP);
+            ELSIF TG_TABLE_NAME = 'blacklisted_channels' THEN
+                payload := json_build_object(
+                    'table', TG_TABLE_NAME, 'op', TG_OP,
+                    'id', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE NEW.channel_id END,
+                    'old_id', CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE OLD.channel_id END
+                );
+            ELSIF TG_OP = 'DELETE' THEN
+                payload := json_build_object(
+                    'table', TG_TABLE_NAME, 'op', TG_OP, 'id', NULL, 'old_id', OLD.chat_id
+                );
+            ELSE
+                payload := json_build_object(
+                    'table', TG_TABLE_NAME, 'op', TG_OP,
+                    'id', NEW.chat_id,
+                    'old_id', CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE OLD.chat_id END,
+                    'tags', NEW.tags, 'priority', NEW.priority
+                );
+            END IF;
+            PERFORM pg_notify('ingestor_config', payload::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_notify
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION notify_ingestor_config()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_notify_truncate
+            AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_ingestor_config()
+        """)
+
+
+def downgrade() -> None:
+    """Drop the triggers and the notify function."""
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_truncate ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS notify_ingestor_config()")
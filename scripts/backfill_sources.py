@@ -0,0 +1,71 @@
+"""
+Backfill lịch sử cho 1 hoặc nhiều nguồn (chạy bởi ingestor, xem src/ingestor/backfill.py)
+
+Ví dụ:
+  python scripts/backfill_sources.py add -1001234567890 -1009876543210 --limit 500
+  python scripts/backfill_sources.py add -1001234567890 --days 3 --max-requests 20
+  python scripts/backfill_sources.py status
+Job đã dừng vì hết ngân sách (budget_exhausted) chạy tiếp từ chỗ cũ khi add lại;
+--restart để lấy lại từ đầu.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from tabulate import tabulate
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ingestor.backfill import BACKFILL_MAX_REQUESTS, enqueue_backfill, get_backfill_jobs
+
+
+async def add_jobs(chat_ids, limit, days, max_requests, restart):
+    for chat_id in chat_ids:
+        status = await enqueue_backfill(chat_id, limit=limit, days=days, max_requests=max_requests, restart=restart)
+        print(f"⏪ {chat_id}: {status}")
+
+
+async def show_status():
+    rows = []
+    for job in await get_backfill_jobs():
+        since_ts = int(job.get("since_ts", 0))
+        rows.append([
+            job.get("chat_id"), job.get("status"), job.get("pushed"), job.get("fetched"),
+            f"{job.get('requests')}/{job.get('max_requests')}", job.get("limit") or "-",
+            datetime.fromtimestamp(since_ts).strftime("%Y-%m-%d %H:%M") if since_ts else "-",
+            datetime.fromtimestamp(int(job.get("updated_at", 0))).strftime("%Y-%m-%d %H:%M:%S"),
+            (job.get("error") or "")[:60],
+        ])
+    print(tabulate(rows, headers=["Chat ID", "Status", "Pushed", "Fetched", "Requests", "Limit", "Since", "Updated", "Error"],
+                   tablefmt="grid"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Queue a backfill for one or more sources")
+    add_parser.add_argument("chat_ids", type=int, nargs="+", help="Telegram Chat IDs (e.g., -100123456)")
+    add_parser.add_argument("--limit", type=int, default=0, help="Last N messages")
+    add_parser.add_argument("--days", type=int, default=0, help="Last D days")
+    add_parser.add_argument("--max-requests", type=int, default=BACKFILL_MAX_REQUESTS,
+                            help="Request budget per source (1 request = 100 messages)")
+    add_parser.add_argument("--restart", action="store_true", help="Ignore saved progress")
+
+    subparsers.add_parser("status", help="Show backfill jobs")
+
+    args = parser.parse_args()
+
+    if args.command == "add":
+        if not args.limit and not args.days:
+            parser.error("--limit and/or --days is required")
+        asyncio.run(add_jobs(args.chat_ids, args.limit, args.days, args.max_requests, args.restart))
+    elif args.command == "status":
+        asyncio.run(show_status())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: pydantic FilterRule vs CompactRule vs CompactRule + posting list (rule index)
+Đo ở 1k / 10k / 100k rule:
+- build: thời gian tạo rule (µs / 1000 rule)
+- memory: bytes / rule (tracemalloc, gồm regex + TermSet + posting list)
+- match: thời gian match 1 tin qua toàn bộ rule (ms / tin)
+
+Chạy: python scripts/bench_rule_store.py [--sizes 1000,10000,100000] [--vocab 2000]
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.common.text_norm import normalize
+from src.worker.filter_engine import FilterRule, MessageProcessor, PostingIndex, TermSet, compile_rule
+
+SAMPLE_MESSAGES = [
+    "🚨 BREAKING: Bitcoin just broke through $95,000! $BTC dominance surging #Bitcoin",
+    "ETH listing on Binance launchpool, đầu tư sớm kw17 kw256",
+    "Giveaway: follow + retweet to win 1000 $DOGE kw3",
+    "SOL on-chain metrics show whale accumulation kw1999 kw42",
+]
+
+
+def make_rows(n: int, vocab: int, seed: int = 42):
+    """(rule_id, user_id, keyword, must_not_have) like filter_rules rows (keywords shared across users)."""
+    rnd = random.Random(seed)
+    tickers = ["$btc", "$eth", "$sol", "$doge", "$bnb", "#ai", "listing", "airdrop", "đầu tư"]
+    rows = []
+    for i in range(n):
+        keyword = rnd.choice(tickers) if rnd.random() < 0.3 else f"kw{rnd.randrange(vocab)}"
+        must_not_have = ["giveaway"] if rnd.random() < 0.1 else []
+        rows.append((i, i // 3, keyword, must_not_have))
+    return rows
+
+
+def measure(build):
+    """(result, seconds, bytes). Timed without tracemalloc (it slows allocation), then built again traced."""
+    gc.collect()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+
+def bench(n: int, vocab: int):
+    rows = make_rows(n, vocab)
+    processor = MessageProcessor()
+    messages = [{"text": text, "chat_id": 1} for text in SAMPLE_MESSAGES]
+
+    pydantic_rules, py_time, py_mem = measure(lambda: [
+        FilterRule(id=rid, user_id=uid, must_have=[kw], must_not_have=mnh) for rid, uid, kw, mnh in rows
+    ])
+
+    def build_compact():
+        terms = TermSet()
+        return terms, [compile_rule(rid, uid, kw, terms, mnh) for rid, uid, kw, mnh in rows]
+
+    (terms, compact_rules), cp_time, cp_mem = measure(build_compact)
+
+    started = time.perf_counter()
+    py_matches = [len(processor.process_incoming_message(m, pydantic_rules)) for m in messages]
+    py_match = (time.perf_counter() - started) / len(messages)
+
+    started = time.perf_counter()
+    cp_matches = [len(processor.process_incoming_message(m, compact_rules, terms)) for m in messages]
+    cp_match = (time.perf_counter() - started) / len(messages)
+
+    def build_postings():
+        terms = TermSet()
+        return terms, PostingIndex([compile_rule(rid, uid, kw, terms, mnh) for rid, uid, kw, mnh in rows])
+
+    (posting_terms, posting_index), pl_time, pl_mem = measure(build_postings)
+
+    started = time.perf_counter()
+    pl_matches = [len(processor.match_postings(m, [posting_index], posting_terms)) for m in messages]
+    pl_match = (time.perf_counter() - started) / len(messages)
+
+    if not py_matches == cp_matches == pl_matches:
+        print(f"  !! match mismatch: pydantic={py_matches} compact={cp_matches} postings={pl_matches}")
+
+    print(f"{n:>7} rules | {'pydantic':<8} | build {py_time / n * 1e9:>10,.0f} µs/1k | "
+          f"{py_mem / n:>7,.0f} B/rule | match {py_match * 1e3:>8.2f} ms/msg")
+    print(f"{'':>7}       | {'compact':<8} | build {cp_time / n * 1e9:>10,.0f} µs/1k | "
+          f"{cp_mem / n:>7,.0f} B/rule | match {cp_match * 1e3:>8.2f} ms/msg | {len(terms)} terms")
+    print(f"{'':>7}       | {'postings':<8} | build {pl_time / n * 1e9:>10,.0f} µs/1k | "
+          f"{pl_mem / n:>7,.0f} B/rule | match {pl_match * 1e3:>8.2f} ms/msg | {len(posting_index.postings)} lists")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--vocab", type=int, default=2000, help="distinct generated keywords")
+    args = parser.parse_args()
+
+    # Warm up lazy translate tables / regex cache
+    normalize(" ".join(SAMPLE_MESSAGES))
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        bench(size, args.vocab)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.database.db import AsyncSessionLocal
 from src.database.models import SourceConfig, SourceTag
+from src.ingestor.backfill import enqueue_backfill
 
 async def list_sources():
     async with AsyncSessionLocal() as session:
@@ -23,7 +24,7 @@ async def list_sources():
             
         print(tabulate(data, headers=["Chat ID", "Name", "Tags", "Priority"], tablefmt="grid"))
 
-async def add_source(chat_id, name, tag, priority):
+async def add_source(chat_id, name, tag, priority, backfill=0):
     async with AsyncSessionLocal() as session:
         # Check if exists
         result = await session.execute(select(SourceConfig).where(SourceConfig.chat_id == chat_id))
@@ -41,6 +42,10 @@ async def add_source(chat_id, name, tag, priority):
         await session.commit()
         print(f"✅ Source {name} ({chat_id}) saved with tag {tag}.")
 
+    if backfill:
+        status = await enqueue_backfill(chat_id, limit=backfill)
+        print(f"⏪ Backfill of last {backfill} messages: {status}")
+
 async def remove_source(chat_id):
     async with AsyncSessionLocal() as session:
         await session.execute(delete(SourceConfig).where(SourceConfig.chat_id == chat_id))
@@ -60,6 +65,7 @@ def main():
     add_parser.add_argument("name", type=str, help="Name of the source")
     add_parser.add_argument("tag", type=str, choices=[t.value for t in SourceTag], help="Tag type")
     add_parser.add_argument("--priority", type=int, default=1, help="Priority (1-10)")
+    add_parser.add_argument("--backfill", type=int, default=0, help="Backfill the last N messages (see backfill_sources.py)")
 
     # Remove command
     remove_parser = subparsers.add_parser("remove", help="Remove a source")
@@ -70,7 +76,7 @@ def main():
     if args.command == "list":
         asyncio.run(list_sources())
     elif args.command == "add":
-        asyncio.run(add_source(args.chat_id, args.name, args.tag, args.priority))
+        asyncio.run(add_source(args.chat_id, args.name, args.tag, args.priority, args.backfill))
     elif args.command == "remove":
         asyncio.run(remove_source(args.chat_id))
 
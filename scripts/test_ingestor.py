@@ -66,7 +66,7 @@ async def test_ingestor():
         
         print(f"✅ Protection module loaded")
         print(f"   Account age: {account_age} days")
-        print(f"   Current limits: {limits['max_messages_per_hour']} msg/hour")
+        print(f"   Current limits: {limits['max_calls_per_hour']} API calls/hour")
         print(f"   Daily joins: {limits['max_joins_per_day']} joins/day")
         
         # Test 5: Import main ingestor
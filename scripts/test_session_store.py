@@ -0,0 +1,130 @@
+"""
+Test BufferedSession round-trip: flush -> reopen with Telethon SQLiteSession / BufferedSession
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from telethon.crypto import AuthKey
+from telethon.sessions import SQLiteSession
+from telethon.tl import types
+
+from src.ingestor.session_store import BufferedSession
+
+USER_ID, USER_HASH = 123456789, 987654321
+CHANNEL_ID, CHANNEL_HASH = 1122334455, 5544332211
+
+
+def check(label: str, ok: bool) -> bool:
+    print(f"  {'✅' if ok else '❌'} {label}")
+    return ok
+
+
+def fill(session: BufferedSession, key: AuthKey):
+    session.set_dc(2, "149.154.167.51", 443)
+    session.auth_key = key
+    session.process_entities([
+        types.User(id=USER_ID, access_hash=USER_HASH, username="sample_user", first_name="Sample"),
+    ])
+    session.set_update_state(0, types.updates.State(
+        pts=100, qts=0, date=datetime(2026, 1, 1, tzinfo=timezone.utc), seq=5, unread_count=0
+    ))
+
+
+def verify(filename: str, key: AuthKey, label: str) -> bool:
+    """Reopen with stock SQLiteSession and BufferedSession, check everything came back."""
+    ok = True
+    print(f"\n{label}")
+
+    sqlite_session = SQLiteSession(filename)
+    try:
+        ok &= check("SQLiteSession: dc / address / port",
+                    (sqlite_session.dc_id, sqlite_session.server_address, sqlite_session.port)
+                    == (2, "149.154.167.51", 443))
+        ok &= check("SQLiteSession: auth key",
+                    sqlite_session.auth_key is not None and sqlite_session.auth_key.key == key.key)
+        ok &= check("SQLiteSession: user entity",
+                    sqlite_session.get_input_entity(USER_ID).access_hash == USER_HASH)
+        state = sqlite_session.get_update_state(0)
+        ok &= check("SQLiteSession: update state", state is not None and (state.pts, state.seq) == (100, 5))
+    finally:
+        sqlite_session.close()
+
+    buffered = BufferedSession(filename)
+    try:
+        ok &= check("BufferedSession: dc + auth key",
+                    buffered.dc_id == 2 and buffered.auth_key.key == key.key)
+        ok &= check("BufferedSession: user entity",
+                    buffered.get_input_entity(USER_ID).access_hash == USER_HASH)
+        ok &= check("BufferedSession: clean after load", not buffered.is_dirty())
+    finally:
+        buffered.close()
+    return ok
+
+
+async def test_async_flush(tmp: str) -> bool:
+    filename = os.path.join(tmp, "async.session")
+    key = AuthKey(data=os.urandom(256))
+    session = BufferedSession(filename)
+    fill(session, key)
+    await session.flush()
+    ok = check("flush() wrote (flush_count == 1)", session.flush_count == 1)
+    ok &= check("not dirty after flush", not session.is_dirty())
+    ok &= verify(filename, key, "Reopen after flush()")
+
+    # Later change (new DC + channel) -> second flush rewrites the header
+    session.set_dc(4, "149.154.167.91", 443)
+    session.process_entities([
+        types.Channel(id=CHANNEL_ID, title="Sample Channel", photo=types.ChatPhotoEmpty(),
+                      date=datetime(2026, 1, 1, tzinfo=timezone.utc), access_hash=CHANNEL_HASH),
+    ])
+    await session.flush()
+    ok &= check("second flush wrote (flush_count == 2)", session.flush_count == 2)
+    session.close()
+
+    print("\nReopen after second flush()")
+    sqlite_session = SQLiteSession(filename)
+    try:
+        ok &= check("SQLiteSession sees the new DC", sqlite_session.dc_id == 4)
+        ok &= check("SQLiteSession sees the channel",
+                    sqlite_session.get_input_entity(-1000000000000 - CHANNEL_ID).access_hash == CHANNEL_HASH)
+    finally:
+        sqlite_session.close()
+    return ok
+
+
+def test_close_flush(tmp: str) -> bool:
+    filename = os.path.join(tmp, "close.session")
+    key = AuthKey(data=os.urandom(256))
+    session = BufferedSession(filename)
+    fill(session, key)
+    session.close()
+    ok = check("close() wrote (flush_count == 1)", session.flush_count == 1)
+    return verify(filename, key, "Reopen after close()") and ok
+
+
+async def main():
+    print("=" * 60)
+    print("BUFFERED SESSION ROUND-TRIP TEST")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("\nflush() after set_dc / auth_key / entities")
+        ok = await test_async_flush(tmp)
+        print("\nclose() after set_dc / auth_key / entities")
+        ok &= test_close_flush(tmp)
+
+    print("\n" + "=" * 60)
+    print("✅ ALL PASSED" if ok else "❌ FAILED")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -9,6 +9,7 @@ from sqlalchemy import select, func
 from src.common.config import settings
 from src.database.db import AsyncSessionLocal
 from src.database.models import User, PlanType
+from src.common.rule_events import publish_user_changed
 
 logger = logging.getLogger("admin")
 router = Router()
@@ -79,6 +80,7 @@ async def cmd_gift(message: types.Message, command: CommandObject):
         
         user.plan_type = PlanType.VIP
         await session.commit()
+        await publish_user_changed(target_user_id)
         
         new_expiry = user.expiry_date.strftime("%d/%m/%Y")
         
@@ -91,6 +93,80 @@ async def cmd_gift(message: types.Message, command: CommandObject):
         pass
 
 
+# ============ /signal_stats ============
+@router.message(Command("signal_stats"))
+async def cmd_signal_stats(message: types.Message, command: CommandObject):
+    """
+    Hit rate của Signal Parser (local regex vs AI) theo nguồn.
+    Usage: /signal_stats [YYYY-MM-DD]
+    """
+    if not is_admin(message.from_user.id):
+        return
+
+    from src.worker.signal_parser import SignalExtractor
+
+    date_str = (command.args or "").strip() or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    stats = await SignalExtractor.get_stats(date_str)
+
+    if not stats:
+        await message.answer(f"📭 Chưa có dữ liệu signal cho ngày {date_str}.")
+        return
+
+    total_local = sum(s.get("local", 0) for s in stats.values())
+    total_ai = sum(s.get("ai", 0) + s.get("ai_no_signal", 0) for s in stats.values())
+    total = total_local + total_ai
+
+    lines = [
+        f"🎯 **Signal Parser - {date_str}**\n",
+        f"Local: {total_local} | AI: {total_ai} | Tiết kiệm AI: {total_local * 100 / total:.0f}%\n",
+    ]
+    top_sources = sorted(stats.items(), key=lambda kv: -sum(kv[1].values()))[:15]
+    for chat_id, s in top_sources:
+        source_total = sum(s.values())
+        hit_rate = s.get("local", 0) * 100 / source_total
+        lines.append(f"`{chat_id}`: {hit_rate:.0f}% local ({s.get('local', 0)}/{source_total})")
+
+    await message.answer("\n".join(lines), parse_mode="Markdown")
+
+
+# ============ /dbpool ============
+@router.message(Command("dbpool"))
+async def cmd_dbpool(message: types.Message):
+    """DB + Redis connection pool của từng process pm2 (snapshot mới nhất trong Redis)."""
+    if not is_admin(message.from_user.id):
+        return
+
+    from src.common.metrics import get_metrics
+
+    pools = await get_metrics("db_pool")
+    if not pools:
+        await message.answer("📭 Chưa có metrics (service chưa chạy start_metrics_reporter?).")
+        return
+
+    lines = ["🗄️ **DB Pool theo service**\n"]
+    total_connections = 0
+    for service, s in sorted(pools.items()):
+        connections = int(s.get("checked_out", 0)) + int(s.get("idle", 0))
+        total_connections += connections
+        lines.append(
+            f"`{service}`: dùng {s.get('checked_out')}/{s.get('size')} (+{s.get('overflow')} overflow), "
+            f"chờ {s.get('waiters')} | wait avg {s.get('wait_avg_ms')}ms, max {s.get('wait_max_ms')}ms, "
+            f"timeout {s.get('timeouts')}"
+        )
+    lines.append(f"\n🔌 Tổng kết nối Postgres: {total_connections}")
+
+    redis_pools = await get_metrics("redis_pool")
+    if redis_pools:
+        lines.append("\n🧰 **Redis Pool** (in use / max)")
+        for service, s in sorted(redis_pools.items()):
+            lines.append(
+                f"`{service}`: cmd {s.get('cmd_in_use', 0)}/{s.get('cmd_max', '-')}, "
+                f"blocking {s.get('blocking_in_use', 0)}/{s.get('blocking_max', '-')}"
+            )
+
+    await message.answer("\n".join(lines), parse_mode="Markdown")
+
+
 # ============ /broadcast ============
 @router.message(Command("broadcast"))
 async def cmd_broadcast(message: types.Message):
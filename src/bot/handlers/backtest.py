@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Router, types, F
+from aiogram.filters import Command, CommandObject
+
+from src.common.utils import escape_markdown, split_exclusions
+from src.worker.backtest import keyword_backtester, BacktestProgress
+from src.worker.query_parser import is_query, normalize_term, split_query_input
+
+logger = logging.getLogger("backtest")
+router = Router()
+
+DEFAULT_DAYS = 7
+PROGRESS_EDIT_INTERVAL = 1.5  # seconds between progress edits (Telegram rate limit)
+
+# 1 backtest / user at a time
+_running_users = set()
+
+
+def format_progress(keyword: str, progress: BacktestProgress, requested_days: int = DEFAULT_DAYS) -> str:
+    safe_keyword = escape_markdown(keyword.replace("`", ""))
+    if not progress.done:
+        return f"⏳ Đang backtest `{safe_keyword}`... đã quét {progress.scanned:,} tin, khớp {progress.matches:,}"
+
+    text = f"📊 **Backtest `{safe_keyword}` ({progress.days} ngày)**\n\n"
+    text += f"🔎 Đã quét: {progress.scanned:,} tin ({progress.elapsed:.1f}s)\n"
+    text += f"🎯 Khớp: {progress.matches:,} tin (~{progress.matches_per_day:.1f} tin/ngày)\n"
+
+    if progress.per_day:
+        text += "\n📅 **Theo ngày:**\n"
+        for day in sorted(progress.per_day, reverse=True)[:7]:
+            text += f"- {day}: {progress.per_day[day]}\n"
+
+    if progress.samples:
+        text += "\n📝 **Ví dụ:**\n"
+        for sample in progress.samples:
+            snippet = escape_markdown(sample["text"][:120].replace("\n", " "))
+            text += f"- _{escape_markdown(sample['source'])}_: {snippet}\n"
+
+    if progress.matches_per_day > 50:
+        text += "\n⚠️ Từ khóa khá nhiễu, cân nhắc dùng từ cụ thể hơn."
+    elif progress.matches == 0:
+        text += "\nℹ️ Chưa có tin nào khớp trong khoảng thời gian này."
+    if requested_days > progress.days:
+        text += f"\nℹ️ Chỉ backtest được {progress.days} ngày gần nhất (tin cũ hơn đã được lưu trữ)."
+    return text
+
+
+async def run_backtest(message: types.Message, user_id: int, query: str, days: int = DEFAULT_DAYS):
+    """Stream a backtest into a single message that is edited as chunks complete."""
+    if is_query(query):
+        bool_query, error = split_query_input(query)
+        if error:
+            await message.answer(f"⚠️ Truy vấn không hợp lệ: {error}")
+            return
+        keyword, must_not_have = bool_query, []
+    else:
+        bool_query = None
+        keyword, must_not_have = split_exclusions(query)
+        must_not_have = [term for term in map(normalize_term, must_not_have) if term]
+    if not keyword:
+        await message.answer("⚠️ Thiếu từ khóa.")
+        return
+
+    if user_id in _running_users:
+        await message.answer("⏳ Bạn đang có 1 backtest chạy, vui lòng đợi.")
+        return
+
+    _running_users.add(user_id)
+    status = await message.answer(f"⏳ Đang backtest `{escape_markdown(keyword)}`...", parse_mode="Markdown")
+    last_edit = time.monotonic()
+    try:
+        async for progress in keyword_backtester.run(keyword, days, must_not_have, query=bool_query):
+            now = time.monotonic()
+            if progress.done or now - last_edit >= PROGRESS_EDIT_INTERVAL:
+                last_edit = now
+                try:
+                    await status.edit_text(format_progress(query, progress, days), parse_mode="Markdown")
+                except Exception as e:
+                    logger.debug(f"Backtest progress edit skipped: {e}")
+    except Exception as e:
+        logger.error(f"Backtest failed for '{keyword}': {e}", exc_info=True)
+        await status.edit_text("❌ Backtest thất bại. Vui lòng thử lại sau.")
+    finally:
+        _running_users.discard(user_id)
+
+
+# ============ /backtest ============
+@router.message(Command("backtest"))
+async def cmd_backtest(message: types.Message, command: CommandObject):
+    args = (command.args or "").strip()
+    if not args:
+        await message.answer(
+            "⚠️ Cú pháp: `/backtest <từ khóa> [-loại trừ ...] [số ngày]`\nVí dụ: `/backtest $BTC -giveaway 7`",
+            parse_mode="Markdown"
+        )
+        return
+
+    keyword, days = args, DEFAULT_DAYS
+    parts = args.rsplit(maxsplit=1)
+    if len(parts) == 2 and parts[1].isdigit():
+        keyword, days = parts[0], int(parts[1])
+
+    # Run in background so the dispatcher keeps serving other updates
+    # Query operators are uppercase, plain keywords are stored lowercase
+    keyword = keyword if is_query(keyword) else keyword.lower()
+    asyncio.create_task(run_backtest(message, message.from_user.id, keyword, days))
+
+
+@router.callback_query(F.data.startswith("bt_"))
+async def cb_backtest(callback: types.CallbackQuery):
+    keyword = callback.data[3:]
+    keyword = keyword if is_query(keyword) else keyword.lower()
+    await callback.answer()
+    asyncio.create_task(run_backtest(callback.message, callback.from_user.id, keyword))
@@ -3,6 +3,7 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy import select
 from src.database.db import AsyncSessionLocal
 from src.database.models import FilterRule, User, PlanType
+from src.common.rule_events import publish_rules_changed
 
 router = Router()
 
@@ -92,6 +93,7 @@ async def apply_preset(callback: types.CallbackQuery):
         
         if added_count > 0:
             await session.commit()
+            await publish_rules_changed(user_id)
             await callback.answer(f"✅ Đã thêm {added_count} từ khóa từ bộ {PRESET_NAMES[preset_key]}!", show_alert=True)
         else:
             await callback.answer("⚠️ Tất cả từ khóa trong bộ này đã có trong danh sách của bạn.", show_alert=True)
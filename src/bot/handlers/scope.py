@@ -0,0 +1,154 @@
+import re
+
+from aiogram import Router, types, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy import select
+from src.database.db import AsyncSessionLocal
+from src.database.models import FilterRule, SourceConfig
+from src.common.rule_events import publish_rules_changed
+from src.common.utils import escape_markdown
+
+router = Router()
+
+SCOPE_MAX_CHANNELS = 20  # Max source channels per keyword
+SCOPE_MAX_SOURCES = 30  # Max sources listed as toggle buttons
+
+# Chat id: -100xxxxxxxxxx (channel / supergroup) or >= 6 digits, so "halving 2024" stays a keyword
+CHAT_ID_TOKEN = re.compile(r"^(?:-100\d+|-?\d{6,})$")
+
+
+async def get_owned_rule(session, rule_id: int, user_id: int):
+    rule = await session.get(FilterRule, rule_id)
+    if not rule or rule.user_id != user_id:
+        return None
+    return rule
+
+
+async def save_scope(session, rule: FilterRule, channels):
+    """Persist scope (empty = every source) and invalidate the worker rule index."""
+    rule.source_channels = sorted(set(channels)) or None
+    await session.commit()
+    await publish_rules_changed(rule.user_id)
+
+
+async def render_scope(callback: types.CallbackQuery, rule_id: int):
+    """Show the scope of 1 keyword with 1 toggle button per known source."""
+    async with AsyncSessionLocal() as session:
+        rule = await get_owned_rule(session, rule_id, callback.from_user.id)
+        if not rule:
+            await callback.answer("Từ khóa không tồn tại!", show_alert=True)
+            return
+        result = await session.execute(
+            select(SourceConfig.chat_id, SourceConfig.name)
+            .where(SourceConfig.is_active == True)
+            .order_by(SourceConfig.priority.desc(), SourceConfig.name)
+            .limit(SCOPE_MAX_SOURCES)
+        )
+        sources = result.all()
+
+    selected = set(rule.source_channels or [])
+    text = f"📡 **Nguồn cho từ khóa** `{escape_markdown(rule.keyword)}`\n\n"
+    if selected:
+        text += f"Chỉ nhận tin từ {len(selected)} nguồn đã chọn (✅).\n"
+    else:
+        text += "Đang nhận tin từ **tất cả nguồn**.\n"
+    text += "\nBấm để bật/tắt nguồn. Hoặc dùng lệnh:\n`/scope <từ khóa> <chat_id ...>` | `/scope <từ khóa> all`"
+
+    buttons = []
+    for chat_id, name in sources:
+        mark = "✅" if chat_id in selected else "▫️"
+        label = (name or str(chat_id))[:30]
+        buttons.append([InlineKeyboardButton(text=f"{mark} {label}", callback_data=f"scope_t:{rule.id}:{chat_id}")])
+    buttons.append([InlineKeyboardButton(text="🌐 Tất cả nguồn", callback_data=f"scope_all:{rule.id}")])
+    buttons.append([InlineKeyboardButton(text="⬅️ Quay lại", callback_data="list_keywords")])
+
+    await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons), parse_mode="Markdown")
+
+
+@router.callback_query(F.data.startswith("scope_kw:"))
+async def cb_scope_keyword(callback: types.CallbackQuery):
+    await render_scope(callback, int(callback.data.split(":")[1]))
+
+
+@router.callback_query(F.data.startswith("scope_t:"))
+async def cb_scope_toggle(callback: types.CallbackQuery):
+    _, rule_id, chat_id = callback.data.split(":")
+    rule_id, chat_id = int(rule_id), int(chat_id)
+
+    async with AsyncSessionLocal() as session:
+        rule = await get_owned_rule(session, rule_id, callback.from_user.id)
+        if not rule:
+            await callback.answer("Từ khóa không tồn tại!", show_alert=True)
+            return
+        channels = set(rule.source_channels or [])
+        if chat_id in channels:
+            channels.discard(chat_id)
+        elif len(channels) >= SCOPE_MAX_CHANNELS:
+            await callback.answer(f"Tối đa {SCOPE_MAX_CHANNELS} nguồn / từ khóa.", show_alert=True)
+            return
+        else:
+            channels.add(chat_id)
+        await save_scope(session, rule, channels)
+
+    await callback.answer("✅ Đã cập nhật nguồn")
+    await render_scope(callback, rule_id)
+
+
+@router.callback_query(F.data.startswith("scope_all:"))
+async def cb_scope_all(callback: types.CallbackQuery):
+    rule_id = int(callback.data.split(":")[1])
+    async with AsyncSessionLocal() as session:
+        rule = await get_owned_rule(session, rule_id, callback.from_user.id)
+        if not rule:
+            await callback.answer("Từ khóa không tồn tại!", show_alert=True)
+            return
+        await save_scope(session, rule, [])
+
+    await callback.answer("✅ Nhận tin từ tất cả nguồn")
+    await render_scope(callback, rule_id)
+
+
+@router.message(Command("scope"))
+async def cmd_scope(message: types.Message, command: CommandObject):
+    """/scope <keyword> <chat_id ...> | /scope <keyword> all"""
+    parts = (command.args or "").split()
+    if len(parts) < 2:
+        await message.answer(
+            "⚠️ Cú pháp:\n`/scope <từ khóa> <chat_id ...>` - chỉ nhận tin từ các nguồn này\n"
+            "`/scope <từ khóa> all` - nhận tin từ tất cả nguồn",
+            parse_mode="Markdown"
+        )
+        return
+
+    # Keyword may contain spaces: chat ids / 'all' are the trailing tokens
+    tail = []
+    while len(parts) > 1 and (parts[-1].lower() == "all" or CHAT_ID_TOKEN.match(parts[-1])):
+        tail.insert(0, parts.pop())
+    keyword = " ".join(parts).lower()
+
+    if not tail:
+        await message.answer("⚠️ Thiếu chat_id (số) hoặc `all`.", parse_mode="Markdown")
+        return
+
+    channels = [] if any(t.lower() == "all" for t in tail) else [int(t) for t in tail]
+    if len(set(channels)) > SCOPE_MAX_CHANNELS:
+        await message.answer(f"⚠️ Tối đa {SCOPE_MAX_CHANNELS} nguồn / từ khóa.")
+        return
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(FilterRule).where(FilterRule.user_id == message.from_user.id, FilterRule.keyword == keyword)
+        )
+        rule = result.scalars().first()
+        if not rule:
+            await message.answer(f"❌ Không tìm thấy từ khóa `{escape_markdown(keyword)}`.", parse_mode="Markdown")
+            return
+        await save_scope(session, rule, channels)
+
+    if channels:
+        await message.answer(
+            f"✅ `{escape_markdown(keyword)}` chỉ nhận tin từ {len(set(channels))} nguồn.", parse_mode="Markdown"
+        )
+    else:
+        await message.answer(f"✅ `{escape_markdown(keyword)}` nhận tin từ tất cả nguồn.", parse_mode="Markdown")
@@ -5,6 +5,7 @@ from sqlalchemy import select, delete
 from datetime import time
 from src.database.db import AsyncSessionLocal
 from src.database.models import User, UserForwardingTarget, PlanType
+from src.common.rule_events import publish_rules_changed, publish_user_changed
 
 router = Router()
 
@@ -25,6 +26,8 @@ async def on_my_chat_member(event: ChatMemberUpdated):
                 delete(UserForwardingTarget).where(UserForwardingTarget.channel_id == chat.id)
             )
             await session.commit()
+        # Owner unknown here -> full reload
+        await publish_rules_changed()
         return
 
     # If bot is added (member or admin)
@@ -78,6 +81,7 @@ async def on_my_chat_member(event: ChatMemberUpdated):
             )
             session.add(new_target)
             await session.commit()
+            await publish_user_changed(user.id)
             
             try:
                 await event.bot.send_message(chat.id, "✅ Bot đã được kết nối thành công! Tin nhắn lọc được sẽ được chuyển tiếp vào đây.")
@@ -121,6 +125,7 @@ async def cmd_settings(message: types.Message, command: CommandObject):
             user.quiet_start = None
             user.quiet_end = None
             await session.commit()
+            await publish_user_changed(user_id)
             await message.reply("✅ Đã tắt chế độ ngủ đông. Bạn sẽ nhận thông báo 24/7.")
             return
 
@@ -140,6 +145,7 @@ async def cmd_settings(message: types.Message, command: CommandObject):
             user.quiet_end = time(hour=end_hour, minute=0)
             
             await session.commit()
+            await publish_user_changed(user_id)
             await message.reply(f"✅ Đã cài đặt giờ ngủ: **{start_hour}:00** đến **{end_hour}:00**.\nBot sẽ không gửi tin nhắn trong khoảng thời gian này.", parse_mode="Markdown")
             
         except ValueError:
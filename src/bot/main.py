@@ -18,6 +18,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.exceptions import TelegramBadRequest
 from sqlalchemy import select, delete, func
 from dotenv import load_dotenv
 from typing import Callable, Dict, Any, Awaitable
@@ -26,12 +27,15 @@ from typing import Callable, Dict, Any, Awaitable
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from src.common.logger import get_logger
-from src.common.redis_client import get_redis
+from src.common.redis_client import get_redis, get_blocking_redis
 from src.common.config import settings
-from src.common.utils import escape_markdown
+from src.common.utils import escape_markdown, split_exclusions
+from src.common.metrics import start_metrics_reporter
+from src.common.rule_events import publish_rules_changed, publish_user_changed
 from src.database.db import AsyncSessionLocal
 from src.database.models import User, FilterRule, PlanType, UserForwardingTarget
-from src.bot.handlers import admin, presets, settings as bot_settings, templates
+from src.worker.query_parser import is_query, normalize_term, split_query_input
+from src.bot.handlers import admin, presets, settings as bot_settings, templates, backtest, scope
 
 load_dotenv()
 
@@ -44,9 +48,19 @@ logger = get_logger("bot")
 QUEUE_NOTIFICATIONS = "queue:notifications"
 QUEUE_PAYMENT_NOTIFICATIONS = "queue:payment_notifications"
 
+# Delivered alert refs (msg_key -> {user_id: message_id}) for async enrichment edits
+ALERT_REF_PREFIX = "alert_ref:"
+ALERT_REF_TTL = 3600
+
 # Free user limits
 FREE_MAX_KEYWORDS = 3
 
+# Max exclusion terms per keyword ("btc -giveaway -airdrop")
+MAX_EXCLUSIONS = 10
+
+# Max length of a boolean query ("ETH AND (listing OR launchpool)")
+MAX_QUERY_LENGTH = 200
+
 # Keyword Validation Config
 KEYWORD_BLACKLIST = {
     "kèo", "mua", "bán", "coin", "news", "admin", "anh em", 
@@ -63,6 +77,8 @@ dp.include_router(admin.router)
 dp.include_router(presets.router)
 dp.include_router(bot_settings.router)
 dp.include_router(templates.router)
+dp.include_router(backtest.router)
+dp.include_router(scope.router)
 
 class LoggingMiddleware(BaseMiddleware):
     async def __call__(
@@ -170,6 +186,7 @@ async def cmd_start_deep_link(message: types.Message, command: CommandObject):
             default_kw = FilterRule(user_id=user.id, keyword="$BTC", is_active=True)
             session.add(default_kw)
             await session.commit()
+        await publish_rules_changed(user.id)
 
     plan_display = "🆓 FREE"
     if user.plan_type == PlanType.VIP:
@@ -208,6 +225,7 @@ async def cmd_start(message: types.Message):
             default_kw = FilterRule(user_id=user.id, keyword="$BTC", is_active=True)
             session.add(default_kw)
             await session.commit()
+        await publish_rules_changed(user.id)
 
     plan_display = "🆓 FREE"
     if user.plan_type == PlanType.VIP:
@@ -428,8 +446,13 @@ async def callback_list_keywords(callback: CallbackQuery):
     
     for i, kw in enumerate(keywords, 1):
         status = "✅" if kw.is_active else "⏸️"
-        text += f"{i}. {status} `{kw.keyword}`\n"
-        buttons.append([InlineKeyboardButton(text=f"🗑️ Xóa: {kw.keyword[:20]}", callback_data=f"delete_kw:{kw.id}")])
+        scope_label = f" 📡 {len(kw.source_channels)} nguồn" if kw.source_channels else ""
+        exclude_label = f" 🚫 {', '.join(kw.must_not_have)}" if kw.must_not_have else ""
+        text += f"{i}. {status} `{kw.keyword}`{scope_label}{escape_markdown(exclude_label)}\n"
+        buttons.append([
+            InlineKeyboardButton(text=f"🗑️ Xóa: {kw.keyword[:20]}", callback_data=f"delete_kw:{kw.id}"),
+            InlineKeyboardButton(text="📡 Nguồn", callback_data=f"scope_kw:{kw.id}"),
+        ])
     
     buttons.append([InlineKeyboardButton(text="⬅️ Quay lại", callback_data="back_to_menu")])
     
@@ -444,6 +467,7 @@ async def callback_delete_keyword(callback: CallbackQuery):
     async with AsyncSessionLocal() as session:
         await session.execute(delete(FilterRule).where(FilterRule.id == keyword_id))
         await session.commit()
+    await publish_rules_changed(callback.from_user.id)
     
     await callback.answer("✅ Đã xóa từ khóa!")
     await callback_list_keywords(callback)
@@ -607,6 +631,46 @@ async def process_add_keyword(message: types.Message, state: FSMContext):
             current_count = result.scalar() or 0
             
             for raw_keyword in keywords:
+                # Boolean query: ETH AND (listing OR launchpool), "hidden gem" NEAR/3 $sol
+                if is_query(raw_keyword):
+                    if len(raw_keyword) > MAX_QUERY_LENGTH:
+                        failed_keywords.append(f"{escape_markdown(raw_keyword[:30])}... (Quá dài, tối đa {MAX_QUERY_LENGTH} ký tự)")
+                        continue
+                    query, error = split_query_input(raw_keyword)
+                    if error:
+                        failed_keywords.append(f"{escape_markdown(raw_keyword)} ({escape_markdown(error)})")
+                        continue
+                    if user.plan_type == PlanType.FREE and current_count >= FREE_MAX_KEYWORDS:
+                        failed_keywords.append(f"{escape_markdown(query)} (Đạt giới hạn gói FREE: tối đa {FREE_MAX_KEYWORDS} từ)")
+                        continue
+                    exists = await session.execute(
+                        select(FilterRule.id).where(
+                            FilterRule.user_id == message.from_user.id,
+                            FilterRule.keyword == query
+                        )
+                    )
+                    if exists.first():
+                        failed_keywords.append(f"{escape_markdown(query)} (Đã tồn tại)")
+                        continue
+                    session.add(FilterRule(
+                        user_id=message.from_user.id,
+                        keyword=query,
+                        query=query,
+                        is_active=True
+                    ))
+                    added_keywords.append(query)
+                    current_count += 1
+                    continue
+
+                # 0. Exclusion terms: "btc -giveaway -airdrop"
+                raw_keyword, raw_exclusions = split_exclusions(raw_keyword)
+                exclusions = []
+                for term in raw_exclusions:
+                    term = normalize_term(term)
+                    if len(term) >= 2 and term not in exclusions:
+                        exclusions.append(term)
+                exclusions = exclusions[:MAX_EXCLUSIONS]
+
                 # 1. Normalization: Lowercase & Strip
                 keyword = raw_keyword.lower().strip()
                 
@@ -649,32 +713,53 @@ async def process_add_keyword(message: types.Message, state: FSMContext):
                         FilterRule.keyword == keyword
                     )
                 )
-                if exists.scalar_one_or_none():
-                    failed_keywords.append(f"{escape_markdown(keyword)} (Đã tồn tại)")
+                existing_rule = exists.scalar_one_or_none()
+                if existing_rule:
+                    if exclusions:
+                        # Same keyword + exclusions: update the exclusion list
+                        existing_rule.must_not_have = exclusions
+                        added_keywords.append(f"{keyword} -" + " -".join(exclusions))
+                    else:
+                        failed_keywords.append(f"{escape_markdown(keyword)} (Đã tồn tại)")
                     continue
 
                 new_rule = FilterRule(
                     user_id=message.from_user.id,
                     keyword=keyword,
-                    is_active=True
+                    is_active=True,
+                    must_not_have=exclusions or None
                 )
                 session.add(new_rule)
-                added_keywords.append(keyword)
+                added_keywords.append(f"{keyword} -" + " -".join(exclusions) if exclusions else keyword)
                 current_count += 1
             
             await session.commit()
         
+        if added_keywords:
+            await publish_rules_changed(message.from_user.id)
+        
         msg = ""
         if added_keywords:
             msg += f"✅ Đã thêm {len(added_keywords)} từ khóa:\n" + "\n".join([f"- `{k}`" for k in added_keywords])
         
         if failed_keywords:
             msg += "\n\n⚠️ Không thể thêm:\n" + "\n".join([f"- {k}" for k in failed_keywords])
+        
+        # Offer a backtest so the user sees how noisy the new keyword is
+        reply_markup = get_main_keyboard()
+        backtest_buttons = [
+            [InlineKeyboardButton(text=f"📊 Backtest: {k}", callback_data=f"bt_{k}")]
+            for k in added_keywords[:3]
+            if len(f"bt_{k}".encode()) <= 64
+        ]
+        if backtest_buttons:
+            msg += "\n\n📊 Bấm Backtest để xem từ khóa khớp bao nhiêu tin/ngày trong 7 ngày qua."
+            reply_markup = InlineKeyboardMarkup(inline_keyboard=backtest_buttons + reply_markup.inline_keyboard)
             
         try:
             await message.answer(
                 msg,
-                reply_markup=get_main_keyboard(),
+                reply_markup=reply_markup,
                 parse_mode="Markdown"
             )
         except Exception as e:
@@ -714,14 +799,83 @@ async def catch_all_message(message: types.Message, state: FSMContext):
 
 
 # ============ Notification Worker ============
+def format_match_notification(msg_data: dict, keyword: str, ai_analysis: str = None) -> str:
+    """Render a keyword match alert (Markdown)."""
+    # Format notification message
+    chat_title = escape_markdown(msg_data.get("chat_title", "Unknown"))
+    text = escape_markdown(msg_data.get("text", "")[:500])  # Truncate long messages
+    message_link = msg_data.get("message_link", "")
+    
+    # Safe keyword display (remove backticks to avoid breaking markdown code block)
+    safe_keyword = keyword.replace("`", "")
+
+    # Compact Design
+    # 🔔 Chat Title | 🎯 Keyword
+    # 
+    # Content...
+    # 
+    # [Link]
+    
+    notification_text = f"🔔 *{chat_title}* | 🎯 `{safe_keyword}`\n\n"
+    notification_text += f"{text}\n\n"
+    
+    if message_link:
+        notification_text += f"[👉 Xem tin nhắn gốc]({message_link})"
+
+    if ai_analysis:
+        # Append AI analysis directly (formatted by AI Engine)
+        notification_text += f"\n\n{ai_analysis}"
+    
+    return notification_text
+
+
+async def apply_alert_enrichment(redis, notification: dict):
+    """
+    Update alerts already delivered with the enriched text from the worker.
+    Edit in place; a follow-up is sent only when the original alert no longer exists
+    (other edit errors, e.g. "message is not modified", would duplicate the alert).
+    """
+    ref_key = f"{ALERT_REF_PREFIX}{notification['msg_key']}"
+    msg_data = notification["message"]
+
+    for recipient in notification.get("recipients", []):
+        user_id = recipient["user_id"]
+        message_id = await redis.hget(ref_key, str(user_id))
+        if not message_id:
+            continue
+
+        enriched_text = format_match_notification(
+            msg_data, recipient.get("keyword", ""), recipient.get("ai_analysis")
+        )
+        try:
+            await bot.edit_message_text(
+                enriched_text, chat_id=user_id, message_id=int(message_id), parse_mode="Markdown"
+            )
+            continue
+        except TelegramBadRequest as e:
+            if "not found" not in str(e).lower():
+                logger.debug(f"Edit skipped for {user_id}: {e}")
+                continue
+        except Exception as e:
+            logger.debug(f"Edit failed for {user_id}: {e}")
+            continue
+
+        # Original alert was deleted: send the enriched version as a new message
+        try:
+            await bot.send_message(user_id, enriched_text, parse_mode="Markdown")
+        except Exception as e:
+            logger.error(f"Failed to send enrichment follow-up to {user_id}: {e}")
+
+
 async def notification_worker():
     """Background task to send notifications to users."""
     redis = await get_redis()
+    blocking_redis = await get_blocking_redis()
     logger.info("Notification Worker started...")
     
     while True:
         try:
-            result = await redis.brpop([QUEUE_NOTIFICATIONS, QUEUE_PAYMENT_NOTIFICATIONS], timeout=1)
+            result = await blocking_redis.brpop([QUEUE_NOTIFICATIONS, QUEUE_PAYMENT_NOTIFICATIONS], timeout=1)
             
             if result:
                 queue_name, data = result
@@ -790,41 +944,31 @@ Chúc bạn săn kèo thành công! 🚀
                         logger.error(f"Failed to send template report to {user_id}: {e}")
                     continue
 
+                # Handle async enrichment of an already delivered alert
+                if notification.get("type") == "ALERT_ENRICHMENT":
+                    await apply_alert_enrichment(redis, notification)
+                    continue
+
                 # Handle Keyword Match Notification (QUEUE_NOTIFICATIONS)
                 user_id = notification["user_id"]
                 msg_data = notification["message"]
                 keyword = notification["matched_keyword"]
-                
-                # Format notification message
-                chat_title = escape_markdown(msg_data.get("chat_title", "Unknown"))
-                text = escape_markdown(msg_data.get("text", "")[:500])  # Truncate long messages
-                message_link = msg_data.get("message_link", "")
                 ai_analysis = notification.get("ai_analysis")
                 
-                # Safe keyword display (remove backticks to avoid breaking markdown code block)
-                safe_keyword = keyword.replace("`", "")
-
-                # Compact Design
-                # 🔔 Chat Title | 🎯 Keyword
-                # 
-                # Content...
-                # 
-                # [Link]
-                
-                notification_text = f"🔔 *{chat_title}* | 🎯 `{safe_keyword}`\n\n"
-                notification_text += f"{text}\n\n"
-                
-                if message_link:
-                    notification_text += f"[👉 Xem tin nhắn gốc]({message_link})"
-
-                if ai_analysis:
-                    # Append AI analysis directly (formatted by AI Engine)
-                    notification_text += f"\n\n{ai_analysis}"
+                notification_text = format_match_notification(msg_data, keyword, ai_analysis)
                 
                 # 1. Send to User (DM)
                 try:
-                    await bot.send_message(user_id, notification_text, parse_mode="Markdown")
+                    sent = await bot.send_message(user_id, notification_text, parse_mode="Markdown")
                     logger.debug(f"Notification sent to {user_id}")
+                    
+                    # Remember the alert so the enrichment stage can edit it later
+                    if notification.get("enrichment_pending") and notification.get("msg_key"):
+                        ref_key = f"{ALERT_REF_PREFIX}{notification['msg_key']}"
+                        async with redis.pipeline(transaction=False) as pipe:
+                            pipe.hset(ref_key, str(user_id), sent.message_id)
+                            pipe.expire(ref_key, ALERT_REF_TTL)
+                            await pipe.execute()
                 except Exception as e:
                     logger.error(f"Failed to send notification to {user_id}: {e}")
 
@@ -926,6 +1070,9 @@ async def callback_guide_keywords(callback: CallbackQuery):
 **1. Cách nhập đúng:**
 - Nhập 1 từ: `Bitcoin`
 - Nhập nhiều từ (cách nhau dấu phẩy): `BTC, ETH, SOL`
+- Loại trừ tin chứa từ khác (thêm dấu `-`): `BTC -giveaway -airdrop`
+- Truy vấn nâng cao (toán tử viết HOA): `ETH AND (listing OR launchpool)`
+  Cụm từ: `"hidden gem"` | Gần nhau: `$SOL NEAR/3 "mainnet launch"` | Loại trừ: `NOT scam`
 - Ký tự đặc biệt cho phép: `$ # @ . -` (Ví dụ: `$BTC`, `#AI`, `ETH-USDT`)
 - Độ dài: 3 - 50 ký tự.
 
@@ -1076,6 +1223,7 @@ async def subscription_monitor():
                         user.plan_type = PlanType.FREE
                         user.expiry_date = None
                         await session.commit()
+                        await publish_user_changed(user.id)
                         continue
 
                     # 2. Handle Warning (<= 2 days)
@@ -1144,6 +1292,9 @@ async def main():
     # Start subscription monitor
     asyncio.create_task(subscription_monitor())
     
+    # Publish pool metrics to Redis
+    start_metrics_reporter()
+    
     # Get bot info
     me = await bot.get_me()
     logger.info(f"Bot started: @{me.username}")
@@ -0,0 +1,260 @@
+"""
+NEWS FEED API
+Đọc tin đã chấm điểm trong crypto_news cho user/dashboard.
+
+- GET /news/feed: lọc theo tag / source / sentiment / min_weight, keyset pagination
+  trên (created_at, id) -> không OFFSET scan; cursor là chuỗi opaque trả về ở next_cursor.
+- GET /news/top: top tin theo final_weight trong N giờ gần nhất, cache Redis TTL ngắn.
+- GET /news/search: full-text search (tsvector GIN) xếp hạng theo ts_rank_cd;
+  token dạng ticker ($BTC, #ETH) dùng trigram index trên text_summary.
+
+Mọi query đều giới hạn created_at >= since để Postgres chỉ quét partition liên quan.
+Mounted trong payment_server (cùng process uvicorn).
+"""
+import base64
+import hmac
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import and_, cast, func, or_, select
+from sqlalchemy.dialects.postgresql import JSONB
+
+from src.common.logger import get_logger
+from src.common.redis_client import get_redis
+from src.database.db import AsyncSessionLocal
+from src.database.models import CryptoNews
+
+logger = get_logger("news_api")
+
+# Header X-API-Key bắt buộc; chưa cấu hình key thì API từ chối mọi request,
+# trừ khi bật rõ ràng NEWS_API_PUBLIC=true (chỉ nên dùng trong mạng nội bộ)
+NEWS_API_KEY = os.getenv("NEWS_API_KEY")
+NEWS_API_PUBLIC = os.getenv("NEWS_API_PUBLIC", "false").lower() == "true"
+
+TOP_CACHE_PREFIX = "news_api:top:"
+TOP_CACHE_TTL = int(os.getenv("NEWS_TOP_CACHE_TTL", "30"))  # seconds
+MAX_FEED_HOURS = 24 * 30
+MAX_SEARCH_DAYS = 30
+
+# $BTC, #ETH, $1000PEPE
+TICKER_TOKEN = re.compile(r"^[$#][A-Za-z0-9]{2,15}$")
+
+router = APIRouter(prefix="/news", tags=["news"])
+
+if not NEWS_API_KEY and not NEWS_API_PUBLIC:
+    logger.warning("NEWS_API_KEY is not set: /news endpoints refuse all requests (set NEWS_API_PUBLIC=true to allow)")
+
+
+# ============ Models ============
+class NewsItem(BaseModel):
+    id: int
+    created_at: datetime
+    source_id: int
+    source_name: str
+    text_summary: str
+    final_weight: Optional[float] = None
+    sentiment: Optional[str] = None
+    urgency: Optional[str] = None
+    tags: Optional[List[str]] = None
+    occurrences: Optional[int] = None
+    message_link: Optional[str] = None
+
+
+class SearchItem(NewsItem):
+    rank: Optional[float] = None
+
+
+class FeedResponse(BaseModel):
+    items: List[NewsItem]
+    next_cursor: Optional[str] = None
+
+
+# ============ Helpers ============
+FEED_COLUMNS = (
+    CryptoNews.id,
+    CryptoNews.created_at,
+    CryptoNews.source_id,
+    CryptoNews.source_name,
+    CryptoNews.text_summary,
+    CryptoNews.final_weight,
+    CryptoNews.layer2_sentiment,
+    CryptoNews.layer2_urgency,
+    CryptoNews.tags,
+    CryptoNews.occurrences,
+    CryptoNews.message_link,
+)
+
+
+def verify_api_key(x_api_key: Optional[str]):
+    if NEWS_API_KEY:
+        if not x_api_key or not hmac.compare_digest(x_api_key, NEWS_API_KEY):
+            raise HTTPException(status_code=403, detail="Invalid API key")
+    elif not NEWS_API_PUBLIC:
+        raise HTTPException(status_code=503, detail="News API is not configured")
+
+
+def encode_cursor(created_at: datetime, news_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{news_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, news_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(news_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def to_item(row) -> NewsItem:
+    return NewsItem(
+        id=row.id,
+        created_at=row.created_at,
+        source_id=row.source_id,
+        source_name=row.source_name,
+        text_summary=row.text_summary,
+        final_weight=row.final_weight,
+        sentiment=row.layer2_sentiment,
+        urgency=row.layer2_urgency,
+        tags=row.tags,
+        occurrences=row.occurrences,
+        message_link=row.message_link,
+    )
+
+
+def apply_filters(stmt, since: datetime, tag: Optional[str], source_id: Optional[int],
+                  sentiment: Optional[str], min_weight: Optional[float]):
+    conditions = [CryptoNews.created_at >= since]
+    if tag:
+        conditions.append(cast(CryptoNews.tags, JSONB).contains([tag.upper()]))
+    if source_id is not None:
+        conditions.append(CryptoNews.source_id == source_id)
+    if sentiment:
+        conditions.append(CryptoNews.layer2_sentiment == sentiment.lower())
+    if min_weight is not None:
+        conditions.append(CryptoNews.final_weight >= min_weight)
+    return stmt.where(and_(*conditions))
+
+
+# ============ Endpoints ============
+@router.get("/feed", response_model=FeedResponse)
+async def news_feed(
+    tag: Optional[str] = None,
+    source_id: Optional[int] = None,
+    sentiment: Optional[str] = None,
+    min_weight: Optional[float] = Query(default=None, ge=0, le=100),
+    hours: int = Query(default=24, ge=1, le=MAX_FEED_HOURS),
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    x_api_key: Optional[str] = Header(None),
+):
+    """Newest first. Pass next_cursor back as cursor to get the next page."""
+    verify_api_key(x_api_key)
+
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    stmt = apply_filters(select(*FEED_COLUMNS), since, tag, source_id, sentiment, min_weight)
+
+    if cursor:
+        cursor_at, cursor_id = decode_cursor(cursor)
+        # Row-value comparison (created_at, id) < (cursor_at, cursor_id)
+        stmt = stmt.where(or_(
+            CryptoNews.created_at < cursor_at,
+            and_(CryptoNews.created_at == cursor_at, CryptoNews.id < cursor_id)
+        ))
+
+    stmt = stmt.order_by(CryptoNews.created_at.desc(), CryptoNews.id.desc()).limit(limit + 1)
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return FeedResponse(items=[to_item(row) for row in rows], next_cursor=next_cursor)
+
+
+@router.get("/top", response_model=List[NewsItem])
+async def top_news(
+    hours: int = Query(default=1, ge=1, le=24),
+    tag: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    x_api_key: Optional[str] = Header(None),
+):
+    """Highest final_weight in the last N hours (cached TOP_CACHE_TTL seconds)."""
+    verify_api_key(x_api_key)
+
+    cache_key = f"{TOP_CACHE_PREFIX}{hours}:{(tag or '').upper()}:{limit}"
+    redis = await get_redis()
+    try:
+        cached = await redis.get(cache_key)
+        if cached:
+            return json.loads(cached)
+    except Exception as e:
+        logger.debug(f"Top news cache read skipped: {e}")
+
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    stmt = (
+        apply_filters(select(*FEED_COLUMNS), since, tag, None, None, None)
+        .where(CryptoNews.final_weight.isnot(None))
+        .order_by(CryptoNews.final_weight.desc(), CryptoNews.created_at.desc())
+        .limit(limit)
+    )
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(stmt)).all()
+
+    items = jsonable_encoder([to_item(row) for row in rows])
+    try:
+        await redis.setex(cache_key, TOP_CACHE_TTL, json.dumps(items))
+    except Exception as e:
+        logger.debug(f"Top news cache write skipped: {e}")
+    return items
+
+
+@router.get("/search", response_model=List[SearchItem])
+async def search_news(
+    q: str = Query(..., min_length=2, max_length=200),
+    days: int = Query(default=7, ge=1, le=MAX_SEARCH_DAYS),
+    tag: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    x_api_key: Optional[str] = Header(None),
+):
+    """
+    Ranked search over the last N days.
+    q uses web search syntax: "exact phrase", OR, -exclude.
+    """
+    verify_api_key(x_api_key)
+
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    query = q.strip()
+
+    if TICKER_TOKEN.match(query):
+        # Trigram index keeps the $/# prefix that the tsvector parser drops
+        rank = func.similarity(CryptoNews.text_summary, query)
+        condition = CryptoNews.text_summary.ilike(f"%{query}%")
+        order = (CryptoNews.created_at.desc(),)
+    else:
+        tsquery = func.websearch_to_tsquery("simple", query)
+        rank = func.ts_rank_cd(CryptoNews.search_vector, tsquery)
+        condition = CryptoNews.search_vector.op("@@")(tsquery)
+        order = (rank.desc(), CryptoNews.created_at.desc())
+
+    stmt = (
+        apply_filters(select(*FEED_COLUMNS, rank.label("rank")), since, tag, None, None, None)
+        .where(condition)
+        .order_by(*order)
+        .limit(limit)
+    )
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(stmt)).all()
+
+    return [SearchItem(**to_item(row).model_dump(), rank=row.rank) for row in rows]
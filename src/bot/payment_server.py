@@ -27,6 +27,9 @@ from src.common.logger import get_logger
 from src.common.redis_client import get_redis
 from src.database.db import AsyncSessionLocal
 from src.database.models import User, Transaction, PlanType
+from src.common.metrics import start_metrics_reporter
+from src.common.rule_events import publish_user_changed
+from src.bot.news_api import router as news_router
 
 logger = get_logger("payment")
 
@@ -53,6 +56,15 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# News feed read API (/news/feed, /news/top)
+app.include_router(news_router)
+
+
+@app.on_event("startup")
+async def on_startup():
+    # Publish pool metrics to Redis
+    start_metrics_reporter()
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     body = await request.body()
@@ -225,6 +237,7 @@ async def process_vip_upgrade(user_id: int, transaction_id: str, amount: float)
         session.add(transaction)
         
         await session.commit()
+        await publish_user_changed(user_id)
         
         logger.info(f"Payment processed: user={user_id}, plan={new_plan}, days={total_days:.2f}, amount={amount}")
         return True
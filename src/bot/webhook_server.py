@@ -16,6 +16,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspa
 from src.common.config import settings
 from src.database.db import AsyncSessionLocal
 from src.database.models import User, PlanType
+from src.common.rule_events import publish_user_changed
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -123,6 +124,7 @@ async def sepay_webhook(payload: SePayPayload, background_tasks: BackgroundTasks
                     logger.error(f"Failed to notify referrer {referrer.id}: {e}")
 
         await session.commit()
+        await publish_user_changed(user_id)
         logger.info(f"User {user_id} upgraded to VIP until {user.expiry_date}")
 
         # 5. Notify User (Background task)
@@ -1,6 +1,7 @@
 import google.generativeai as genai
 from src.common.config import settings
 from src.common.logger import logger
+from src.common.ai_gateway import ai_gateway, AIUnavailableError
 
 class AIClient:
     def __init__(self):
@@ -45,7 +46,7 @@ class AIClient:
         """
 
         try:
-            response = await self.model.generate_content_async(prompt)
+            response = await ai_gateway.generate_content(self.model, prompt)
             text = response.text.strip()
             
             # Clean up markdown code blocks if AI ignores instructions
@@ -57,6 +58,9 @@ class AIClient:
                 text = text[:-3]
                 
             return text.strip()
+        except AIUnavailableError as e:
+            logger.warning(f"AI Template Generation skipped: {e}")
+            return "AI Service Unavailable"
         except Exception as e:
             logger.error(f"AI Template Generation failed: {e}")
             return "AI Generation Failed"
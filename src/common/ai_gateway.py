@@ -0,0 +1,235 @@
+"""
+AI GATEWAY
+Điểm đi qua duy nhất cho mọi lời gọi Gemini (worker, analyzer, strategy processor).
+
+- Token bucket dùng chung qua Redis: giới hạn tổng số request/phút của TẤT CẢ process.
+- Semaphore: giới hạn số request đang chạy đồng thời trong 1 process.
+- Timeout cho từng lời gọi (bao gồm cả thời gian chờ slot).
+- Circuit breaker: lỗi liên tiếp (timeout, 429, 5xx) -> mở mạch, mọi lời gọi fail ngay
+  để caller dùng fallback (_default_scoring, raw text...) cho tới khi upstream hồi phục.
+  Trạng thái "open" được chia sẻ qua Redis để các process khác cùng chuyển sang fallback.
+"""
+import asyncio
+import time
+from typing import Any, Optional
+
+from src.common.config import settings
+from src.common.logger import get_logger
+from src.common.redis_client import get_redis
+
+logger = get_logger("ai_gateway")
+
+BUCKET_KEY = "ai_gateway:bucket"
+CIRCUIT_KEY = "ai_gateway:circuit_open"
+
+# Token bucket atomic (refill theo thời gian thực, 1 token / request)
+# KEYS[1] = bucket key | ARGV = rate (token/s), capacity, now
+# Trả về 0 nếu lấy được token, ngược lại số giây cần chờ.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+# Khoảng thời gian cache trạng thái circuit đọc từ Redis (tránh 1 round-trip mỗi lời gọi)
+CIRCUIT_SYNC_INTERVAL = 1.0
+
+
+class AIUnavailableError(Exception):
+    """AI tạm thời không dùng được (circuit open, hết token, timeout). Caller dùng fallback."""
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Lỗi do upstream (timeout, mất kết nối, 429, 5xx) -> tính vào circuit breaker.
+    400 / safety block / prompt lỗi là lỗi của request, upstream vẫn sống.
+    """
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # google.api_core exceptions: HTTP status in .code (grpc errors expose a method instead)
+    code = getattr(error, "code", None)
+    if callable(code):
+        code = None
+    if code is None:
+        code = getattr(error, "status_code", None)
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        return False
+    return code == 429 or code >= 500
+
+
+class AIGateway:
+    """Rate limit + concurrency cap + timeout + circuit breaker cho Gemini."""
+
+    def __init__(self):
+        self._semaphore = asyncio.Semaphore(max(1, settings.AI_MAX_CONCURRENCY))
+        self._rate = max(settings.AI_RATE_PER_MINUTE, 1) / 60.0
+        self._capacity = max(settings.AI_BURST, 1)
+        self._script = None
+
+        # Circuit breaker state (local)
+        self._failures = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._remote_checked_at = 0.0
+
+        # Stats
+        self.calls = 0
+        self.failures = 0
+        self.short_circuited = 0
+
+    # ============ Circuit Breaker ============
+    async def _sync_remote_circuit(self):
+        """Đọc trạng thái open do process khác set (cache CIRCUIT_SYNC_INTERVAL giây)."""
+        now = time.monotonic()
+        if now - self._remote_checked_at < CIRCUIT_SYNC_INTERVAL:
+            return
+        self._remote_checked_at = now
+        try:
+            redis = await get_redis()
+            ttl = await redis.pttl(CIRCUIT_KEY)
+            if ttl and ttl > 0:
+                self._open_until = max(self._open_until, now + ttl / 1000)
+        except Exception as e:
+            logger.debug(f"Circuit sync skipped (Redis error): {e}")
+
+    async def is_available(self) -> bool:
+        """True nếu circuit đang đóng (hoặc đã hết cooldown, cho phép probe)."""
+        await self._sync_remote_circuit()
+        return time.monotonic() >= self._open_until
+
+    async def _before_call(self) -> bool:
+        """Raise if the circuit refuses the call. Returns True if this call is the half-open probe."""
+        if not await self.is_available():
+            self.short_circuited += 1
+            raise AIUnavailableError("AI circuit is open")
+        # Half-open: sau cooldown chỉ cho đúng 1 request thăm dò
+        if self._failures >= settings.AI_BREAKER_FAILURES:
+            if self._probe_in_flight:
+                self.short_circuited += 1
+                raise AIUnavailableError("AI circuit is half-open (probe in flight)")
+            self._probe_in_flight = True
+            return True
+        return False
+
+    async def _record_success(self):
+        if self._failures >= settings.AI_BREAKER_FAILURES:
+            logger.info("✅ AI upstream recovered. Circuit closed.")
+            try:
+                redis = await get_redis()
+                await redis.delete(CIRCUIT_KEY)
+            except Exception:
+                pass
+        self._failures = 0
+
+    async def _record_failure(self, error: BaseException):
+        self.failures += 1
+        if not is_upstream_failure(error):
+            return
+        self._failures += 1
+        if self._failures < settings.AI_BREAKER_FAILURES:
+            return
+
+        cooldown = settings.AI_BREAKER_COOLDOWN
+        self._open_until = time.monotonic() + cooldown
+        logger.warning(
+            f"🔌 AI circuit OPEN for {cooldown}s after {self._failures} consecutive failures "
+            f"(last: {type(error).__name__}: {error})"
+        )
+        try:
+            redis = await get_redis()
+            await redis.set(CIRCUIT_KEY, "1", ex=cooldown)
+        except Exception:
+            pass
+
+    # ============ Rate Limit ============
+    async def _acquire_token(self, deadline: float):
+        """Lấy 1 token từ bucket dùng chung. Fail-open nếu Redis lỗi."""
+        while True:
+            try:
+                redis = await get_redis()
+                if self._script is None:
+                    self._script = redis.register_script(TOKEN_BUCKET_LUA)
+                wait = float(await self._script(keys=[BUCKET_KEY], args=[self._rate, self._capacity, time.time()]))
+            except Exception as e:
+                logger.debug(f"Token bucket skipped (Redis error): {e}")
+                return
+
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise AIUnavailableError("AI rate limit exceeded")
+            await asyncio.sleep(wait)
+
+    # ============ Public API ============
+    async def generate_content(self, model, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Gọi model.generate_content_async(*args, **kwargs) qua gateway.
+        Raise AIUnavailableError khi không được phép gọi / timeout; caller tự fallback.
+        """
+        if model is None:
+            raise AIUnavailableError("AI model is not configured")
+
+        probe = await self._before_call()
+
+        call_timeout = timeout or settings.AI_CALL_TIMEOUT
+        queue_deadline = time.monotonic() + settings.AI_QUEUE_TIMEOUT
+        acquired = False
+        try:
+            await self._acquire_token(queue_deadline)
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(),
+                    timeout=max(0.0, queue_deadline - time.monotonic())
+                )
+                acquired = True
+            except asyncio.TimeoutError:
+                raise AIUnavailableError("AI concurrency limit reached")
+
+            self.calls += 1
+            try:
+                response = await asyncio.wait_for(
+                    model.generate_content_async(*args, **kwargs),
+                    timeout=call_timeout
+                )
+            except asyncio.TimeoutError as e:
+                await self._record_failure(e)
+                raise AIUnavailableError(f"AI call timed out after {call_timeout}s")
+            except Exception as e:
+                await self._record_failure(e)
+                raise
+
+            await self._record_success()
+            return response
+        finally:
+            # Probe kết thúc bằng mọi đường (kể cả CancelledError): cho phép probe tiếp theo
+            if probe:
+                self._probe_in_flight = False
+            if acquired:
+                self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "circuit_open": time.monotonic() < self._open_until,
+        }
+
+
+# Singleton instance (1 gateway / process)
+ai_gateway = AIGateway()
@@ -0,0 +1,77 @@
+"""
+METRICS REPORTER
+Mỗi process định kỳ ghi snapshot metrics vào Redis để admin xem tổng thể 6 process pm2:
+    metrics:{name}:{service} (hash, TTL = 3 x METRICS_INTERVAL)
+
+Module nào có metrics thì register_collector(name, fn) lúc import (fn trả về dict số);
+main() của mỗi service gọi start_metrics_reporter() một lần.
+"""
+import asyncio
+from typing import Callable, Dict, Optional
+
+from src.common.config import settings
+from src.common.logger import get_logger
+
+logger = get_logger("metrics")
+
+METRICS_KEY_PREFIX = "metrics:"
+
+_collectors: Dict[str, Callable[[], dict]] = {}
+_reporter_task: Optional[asyncio.Task] = None
+
+
+def register_collector(name: str, collector: Callable[[], dict]):
+    """Register a sync callable returning a flat dict of numbers."""
+    _collectors[name] = collector
+
+
+async def publish_metrics(service: str = None):
+    """Write one snapshot of every registered collector."""
+    from src.common.redis_client import get_redis  # redis_client registers a collector here
+
+    service = service or settings.SERVICE_NAME
+    redis = await get_redis()
+    ttl = max(settings.METRICS_INTERVAL * 3, 30)
+    pipe = redis.pipeline(transaction=False)
+    for name, collector in _collectors.items():
+        try:
+            values = collector()
+        except Exception as e:
+            logger.debug(f"Metrics collector {name} failed: {e}")
+            continue
+        if not values:
+            continue
+        key = f"{METRICS_KEY_PREFIX}{name}:{service}"
+        pipe.hset(key, mapping={k: str(v) for k, v in values.items()})
+        pipe.expire(key, ttl)
+    await pipe.execute()
+
+
+async def metrics_reporter():
+    logger.info(f"📈 Metrics reporter started (service={settings.SERVICE_NAME}, every {settings.METRICS_INTERVAL}s)")
+    while True:
+        try:
+            await publish_metrics()
+        except Exception as e:
+            logger.debug(f"Metrics publish skipped: {e}")
+        await asyncio.sleep(settings.METRICS_INTERVAL)
+
+
+def start_metrics_reporter():
+    """Start the background reporter once per process."""
+    global _reporter_task
+    if _reporter_task is None or _reporter_task.done():
+        _reporter_task = asyncio.create_task(metrics_reporter())
+    return _reporter_task
+
+
+async def get_metrics(name: str) -> Dict[str, dict]:
+    """Latest snapshot of one metric group for every live service: {service: {field: value}}."""
+    from src.common.redis_client import get_redis
+
+    redis = await get_redis()
+    prefix = f"{METRICS_KEY_PREFIX}{name}:"
+    result = {}
+    async for key in redis.scan_iter(match=f"{prefix}*", count=100):
+        result[key[len(prefix):]] = await redis.hgetall(key)
+    return result
@@ -1,19 +1,98 @@
+"""
+Redis client factory.
+Hai pool tách biệt trong mỗi process:
+- get_redis(): lệnh thường (get/set/lpush...), socket timeout + BlockingConnectionPool có giới hạn.
+- get_blocking_redis(): consumer blocking (brpop, pubsub), không socket timeout để brpop(timeout=0)
+  không bị cắt; 1 lệnh treo ở đây không chiếm connection của lệnh thường.
+Cả hai đều retry với exponential backoff khi mất kết nối (chỉ ConnectionError: TimeoutError
+không retry vì lệnh có thể đã chạy trên server, vd LPUSH / INCR bị lặp) và health check định kỳ.
+hiredis được redis-py dùng tự động nếu đã cài (pip install hiredis).
+"""
 import os
 import redis.asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError
 from dotenv import load_dotenv
 
+from src.common.config import settings
+from src.common.metrics import register_collector
+
 load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+
+def create_pool(max_connections: int, socket_timeout) -> redis.BlockingConnectionPool:
+    """Build a bounded pool with timeouts, retry/backoff and health checks."""
+    kwargs = {}
+    if settings.REDIS_PROTOCOL == 3:
+        kwargs["protocol"] = 3
+
+    return redis.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        decode_responses=True,
+        max_connections=max_connections,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        # Retry() defaults to (ConnectionError, TimeoutError): narrow both lists
+        retry=Retry(
+            ExponentialBackoff(cap=settings.REDIS_RETRY_BACKOFF_CAP),
+            settings.REDIS_RETRY_ATTEMPTS,
+            supported_errors=(ConnectionError,),
+        ),
+        retry_on_error=[ConnectionError],
+        **kwargs
+    )
+
+
 class RedisClient:
     _instance = None
+    _blocking_instance = None
 
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
-            cls._instance = redis.from_url(REDIS_URL, decode_responses=True)
+            pool = create_pool(settings.REDIS_MAX_CONNECTIONS, settings.REDIS_SOCKET_TIMEOUT)
+            cls._instance = redis.Redis(connection_pool=pool)
         return cls._instance
 
+    @classmethod
+    def get_blocking_instance(cls):
+        if cls._blocking_instance is None:
+            pool = create_pool(settings.REDIS_BLOCKING_MAX_CONNECTIONS, None)
+            cls._blocking_instance = redis.Redis(connection_pool=pool)
+        return cls._blocking_instance
+
+    @staticmethod
+    def _pool_stats(client) -> dict:
+        if client is None:
+            return {}
+        pool = client.connection_pool
+        # Private redis-py attributes: missing in some versions -> report 0 instead of failing
+        in_use = len(getattr(pool, "_in_use_connections", None) or ())
+        idle = len([c for c in (getattr(pool, "_available_connections", None) or ()) if c is not None])
+        return {"in_use": in_use, "idle": idle, "max": getattr(pool, "max_connections", 0) or 0}
+
+    @classmethod
+    def stats(cls) -> dict:
+        stats = {}
+        for name, client in (("cmd", cls._instance), ("blocking", cls._blocking_instance)):
+            for field, value in cls._pool_stats(client).items():
+                stats[f"{name}_{field}"] = value
+        return stats
+
+
 async def get_redis():
     return RedisClient.get_instance()
+
+
+async def get_blocking_redis():
+    """Client for brpop / pubsub consumers (separate pool, no socket timeout)."""
+    return RedisClient.get_blocking_instance()
+
+
+register_collector("redis_pool", RedisClient.stats)
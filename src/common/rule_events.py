@@ -0,0 +1,32 @@
+"""
+RULE INDEX INVALIDATION
+Worker giữ rule index + entitlement của user trong RAM (src/worker/rule_index.py).
+Bot / payment / scheduler gọi các hàm dưới đây sau khi commit để worker cập nhật ngay:
+- publish_rules_changed(): thêm/xóa/bật/tắt keyword -> worker reload toàn bộ rule
+- publish_user_changed(user_id): đổi gói, hết hạn, quiet mode, forward target -> reload 1 user
+"""
+import json
+
+from src.common.logger import get_logger
+from src.common.redis_client import get_redis
+
+logger = get_logger("rule_events")
+
+RULE_INDEX_CHANNEL = "rule_index:invalidate"
+
+
+async def _publish(payload: dict):
+    try:
+        redis = await get_redis()
+        await redis.publish(RULE_INDEX_CHANNEL, json.dumps(payload))
+    except Exception as e:
+        # Worker still reloads periodically (RULE_INDEX_MAX_AGE)
+        logger.warning(f"Failed to publish rule index invalidation {payload}: {e}")
+
+
+async def publish_rules_changed(user_id: int = None):
+    await _publish({"scope": "rules", "user_id": user_id})
+
+
+async def publish_user_changed(user_id: int):
+    await _publish({"scope": "user", "user_id": user_id})
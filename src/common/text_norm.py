@@ -0,0 +1,99 @@
+"""
+TEXT NORMALIZATION - Chuẩn hóa văn bản 1 lần / tin nhắn
+Ingestor gọi normalize() và gửi kèm kết quả trong envelope (message_data["norm"]);
+worker / analyzer / backtest dùng lại qua get_norm() thay vì tự lowercase / re.sub / hash.
+
+- lower:  lowercase, ký tự ngoài [chữ, số, _, $, #, @, ., -] -> khoảng trắng, gộp khoảng trắng
+          (cùng kết quả với 2 lượt re.sub cũ nhưng bằng 1 lượt str.translate)
+- folded: lower bỏ dấu tiếng Việt ("đầu tư" -> "dau tu"), là dạng dùng để match từ khóa
+- hash:   content_hash dedup (sha256 của text lowercase gộp khoảng trắng, giữ định nghĩa cũ
+          để khớp news_hashes đã lưu)
+- tokens: folded.split()
+"""
+import hashlib
+import unicodedata
+from typing import Dict
+
+NORM_KEY = "norm"
+
+_KEEP_CHARS = frozenset("$#@.-_")
+
+
+class _CleanTable(dict):
+    """str.translate table (lowercase + clean), filled lazily per code point."""
+
+    def __missing__(self, code: int) -> str:
+        ch = chr(code)
+        if ch.isalnum() or ch in _KEEP_CHARS:
+            value = ch.lower()
+        elif unicodedata.combining(ch):
+            value = ch  # Dấu rời (text dạng NFD), fold() sẽ bỏ
+        else:
+            value = " "
+        self[code] = value
+        return value
+
+
+class _FoldTable(dict):
+    """str.translate table removing diacritics of Latin letters, filled lazily."""
+
+    def __missing__(self, code: int) -> str:
+        ch = chr(code)
+        if ch in "đĐ":
+            value = "d"
+        elif unicodedata.combining(ch):
+            value = ""
+        else:
+            base = unicodedata.normalize("NFD", ch)[0]
+            # Chỉ fold về ASCII (tránh tách Hangul, ký tự CJK...)
+            value = base if base != ch and base.isascii() else ch
+        self[code] = value
+        return value
+
+
+_CLEAN_TABLE = _CleanTable()
+_FOLD_TABLE = _FoldTable()
+
+
+def clean_lower(text: str) -> str:
+    """Lowercase + keep word chars and $ # @ . - + collapse whitespace."""
+    if not text:
+        return ""
+    return " ".join(text.translate(_CLEAN_TABLE).split())
+
+
+def fold(text: str) -> str:
+    """Remove Vietnamese / Latin diacritics ("đầu tư" -> "dau tu")."""
+    return text.translate(_FOLD_TABLE)
+
+
+def content_hash(text: str) -> str:
+    """SHA256 of lowercase, whitespace-collapsed text (dedup key of crypto_news)."""
+    return hashlib.sha256(" ".join((text or "").lower().split()).encode()).hexdigest()
+
+
+def normalize(text: str) -> Dict:
+    lower = clean_lower(text)
+    folded = fold(lower)
+    return {
+        "lower": lower,
+        "folded": folded,
+        "hash": content_hash(text),
+        "tokens": folded.split(),
+    }
+
+
+def get_norm(message_data: dict, refresh: bool = False) -> Dict:
+    """Normalized forms carried in the envelope; computed once on first touch if missing."""
+    norm = message_data.get(NORM_KEY)
+    if norm is None or refresh:
+        norm = normalize(message_data.get("text", ""))
+        message_data[NORM_KEY] = norm
+    return norm
+
+
+def strip_norm(message_data: dict) -> dict:
+    """Copy without the normalized forms (for payloads stored / sent downstream)."""
+    if NORM_KEY not in message_data:
+        return message_data
+    return {k: v for k, v in message_data.items() if k != NORM_KEY}
@@ -29,3 +29,17 @@ def escape_markdown(text: str) -> str:
     if not text:
         return ""
     return text.replace("_", "\\_").replace("*", "\\*").replace("[", "\\[").replace("`", "\\`")
+
+
+def split_exclusions(text: str) -> tuple:
+    """
+    Tách từ loại trừ khỏi input từ khóa: "btc -giveaway -airdrop" -> ("btc", ["giveaway", "airdrop"]).
+    Chỉ token bắt đầu bằng '-' mới là loại trừ ("eth-usdt" giữ nguyên).
+    """
+    keyword_parts, exclusions = [], []
+    for token in text.split():
+        if len(token) > 1 and token.startswith("-"):
+            exclusions.append(token[1:])
+        else:
+            keyword_parts.append(token)
+    return " ".join(keyword_parts), exclusions
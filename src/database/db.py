@@ -1,8 +1,14 @@
 import os
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 
+from src.common.config import settings
+from src.common.metrics import register_collector
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -10,12 +16,80 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set in .env file")
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """QueuePool that tracks how many callers wait for a connection and for how long."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiters = 0
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        # Fast path: a connection is idle or we may open a new one -> not a wait
+        if self._pool.qsize() or self._max_overflow < 0 or self._overflow < self._max_overflow:
+            return super()._do_get()
+
+        self.waiters += 1
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.waiters -= 1
+            self.wait_count += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "idle": self.checkedin(),
+            "waiters": self.waiters,
+            "wait_count": self.wait_count,
+            "wait_avg_ms": round(self.wait_time_total / self.wait_count * 1000, 2) if self.wait_count else 0.0,
+            "wait_max_ms": round(self.wait_time_max * 1000, 2),
+            "timeouts": self.timeouts,
+        }
+
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    future=True,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    # SQLAlchemy's prepared statement cache + asyncpg's own statement cache (both 0 behind pgbouncer)
+    connect_args={
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    },
+)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+
+def get_pool_stats() -> dict:
+    """Connection pool metrics for this process (see src/common/metrics.py)."""
+    return engine.pool.stats()
+
+
+register_collector("db_pool", get_pool_stats)
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
@@ -1,4 +1,5 @@
 from sqlalchemy import Column, BigInteger, String, Boolean, DateTime, ForeignKey, Numeric, Integer, Time, Text, JSON, Float, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 import enum
@@ -84,6 +85,9 @@ class FilterRule(Base):
     user_id = Column(BigInteger, ForeignKey("users.id"), nullable=False)
     keyword = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
+    source_channels = Column(JSON, nullable=True)  # [chat_id, ...], NULL = mọi nguồn
+    must_not_have = Column(JSON, nullable=True)  # Từ loại trừ ["giveaway", ...]
+    query = Column(Text, nullable=True)  # Truy vấn AND/OR/NOT/NEAR dạng chuẩn hóa (query_parser), NULL = keyword đơn
 
     user = relationship("User", back_populates="rules")
 
@@ -112,18 +116,23 @@ class CryptoNews(Base):
     """
     Main news table with dedup via content_hash.
     Stores compressed text to reduce DB size.
+    
+    Partitioned weekly by created_at (see migration 003 / news_partitions.py).
+    content_hash uniqueness across partitions is enforced by NewsHash.
     """
     __tablename__ = "crypto_news"
     __table_args__ = (
+        Index('idx_crypto_news_content_hash', 'content_hash'),
         Index('idx_crypto_news_source_id', 'source_id'),
         Index('idx_crypto_news_created_at', 'created_at'),
         Index('idx_crypto_news_final_weight', 'final_weight'),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
     
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     
     # Deduplication: content_hash = SHA256(normalized_text)
-    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    content_hash = Column(String(64), nullable=False)
     
     # Source info
     source_id = Column(BigInteger, nullable=False)  # Telegram chat_id
@@ -152,8 +161,11 @@ class CryptoNews(Base):
     image_path = Column(String, nullable=True)
     tags = Column(JSON, default=[])  # ["ONCHAIN", "SIGNAL", ...]
     
-    # Tracking
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Full-text search: to_tsvector('simple', text), GIN indexed (migration 005)
+    search_vector = Column(TSVECTOR, nullable=True)
+    
+    # Tracking (partition key, part of the primary key)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=True)
     first_seen_at = Column(DateTime(timezone=True), server_default=func.now())
     last_seen_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     occurrences = Column(Integer, default=1)  # How many times seen (dedup counter)
@@ -180,8 +192,8 @@ class NewsDuplicate(Base):
     # Hash of content
     content_hash = Column(String(64), nullable=False, index=True)
     
-    # Reference to "canonical" news record
-    first_news_id = Column(BigInteger, ForeignKey("crypto_news.id"), nullable=False)
+    # Reference to "canonical" news record (crypto_news.id or news_archive.id, no FK: partitioned)
+    first_news_id = Column(BigInteger, nullable=False)
     
     # Duplicate instance info
     source_id = Column(BigInteger, nullable=False)
@@ -194,6 +206,21 @@ class NewsDuplicate(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class NewsHash(Base):
+    """
+    Cross-partition dedup for crypto_news.
+    One row per content_hash -> canonical news (id + created_at for partition pruning).
+    """
+    __tablename__ = "news_hashes"
+    __table_args__ = (
+        Index('idx_news_hashes_created_at', 'created_at'),
+    )
+    
+    content_hash = Column(String(64), primary_key=True)
+    news_id = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
 class NewsArchive(Base):
     """
     Archive old news (> 7 days) in compressed format.
@@ -0,0 +1,70 @@
+"""
+ALBUM COALESCING - Gộp album (grouped media) thành 1 envelope
+Album Telegram đến dưới dạng nhiều NewMessage cùng grouped_id, thường chỉ 1 tin có caption.
+Trước đây mỗi ảnh là 1 entry trong queue -> tải ảnh, OCR, match, alert lặp N lần.
+- Tin có grouped_id được giữ theo (chat_id, grouped_id); mỗi phần mới dời hạn thêm
+  ALBUM_WINDOW giây (tối đa ALBUM_MAX_WAIT kể từ phần đầu), hết hạn thì publish 1 lần.
+- Envelope: caption của album + image_paths (chỉ ALBUM_OCR_MAX_IMAGES ảnh đầu, phần được OCR;
+  các phần khác chỉ là tham chiếu trong album_ids), id = message id nhỏ nhất
+  (ổn định nếu album được lấy lại khi catch-up -> push idempotent vẫn đúng).
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from src.common.logger import get_logger
+
+logger = get_logger("albums")
+
+ALBUM_WINDOW = float(os.getenv("ALBUM_WINDOW", "0.8"))  # seconds of silence that closes an album
+ALBUM_MAX_WAIT = float(os.getenv("ALBUM_MAX_WAIT", "3"))  # seconds, hard cap from the first part
+
+
+class _PendingAlbum:
+    __slots__ = ("messages", "backfill", "first_at", "timer")
+
+    def __init__(self, backfill: bool, first_at: float):
+        self.messages: List = []
+        self.backfill = backfill
+        self.first_at = first_at
+        self.timer = None
+
+
+class AlbumCoalescer:
+    """Buffers grouped messages and hands each complete album to publish(messages, backfill)."""
+
+    def __init__(self, publish: Callable[[List, bool], Awaitable]):
+        self.publish = publish
+        self._pending: Dict[Tuple[int, int], _PendingAlbum] = {}
+
+    def add(self, message, backfill: bool = False):
+        loop = asyncio.get_running_loop()
+        key = (message.chat_id, message.grouped_id)
+        album = self._pending.get(key)
+        if album is None:
+            album = self._pending[key] = _PendingAlbum(backfill, loop.time())
+        album.messages.append(message)
+
+        # Debounce: close ALBUM_WINDOW after the last part, never later than ALBUM_MAX_WAIT
+        if album.timer is not None:
+            album.timer.cancel()
+        delay = min(ALBUM_WINDOW, max(0.0, album.first_at + ALBUM_MAX_WAIT - loop.time()))
+        album.timer = loop.call_later(delay, lambda: asyncio.create_task(self._flush(key)))
+
+    async def _flush(self, key: Tuple[int, int]):
+        album = self._pending.pop(key, None)
+        if album is None:
+            return
+        messages = sorted(album.messages, key=lambda m: m.id)
+        logger.debug(f"Album {key[1]} in {key[0]}: {len(messages)} parts")
+        try:
+            await self.publish(messages, album.backfill)
+        except Exception as e:
+            logger.error(f"Failed to publish album {key[1]} from {key[0]}: {e}")
+
+    async def flush_all(self):
+        """Publish every pending album now (shutdown)."""
+        for key, album in list(self._pending.items()):
+            if album.timer is not None:
+                album.timer.cancel()
+            await self._flush(key)
@@ -0,0 +1,196 @@
+"""
+BACKFILL - Kéo lịch sử cho nguồn mới thêm
+Nguồn mới (manage_sources.py / seed_sources*.py) chưa có lịch sử trong template buffer
+và crypto_news cho tới khi có bài mới. Backfill lấy N tin gần nhất hoặc D ngày gần nhất:
+- Script (scripts/backfill_sources.py) chỉ tạo job: hash backfill:{chat_id} + queue:backfill.
+  Ingestor chạy job bằng chính client của nó (không mở session Telethon thứ 2).
+- Lấy theo trang BACKFILL_PAGE_SIZE tin (mới -> cũ), mỗi trang là 1 request đi qua
+  OutboundGuard (flood wait, ngân sách / giờ, pacing) + ngân sách riêng max_requests / job.
+- Tiến độ (offset_id, fetched, requests) lưu sau mỗi trang -> restart / hết ngân sách thì
+  chạy tiếp từ trang kế (resume_pending() khi ingestor khởi động).
+- Tin được đẩy vào queue:raw_messages như tin live với cờ "backfill": worker chỉ buffer
+  cho template (theo ngày gốc của tin) và analyzer lưu crypto_news, không gửi alert.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from src.common.logger import get_logger
+from src.common.redis_client import get_redis, get_blocking_redis
+
+logger = get_logger("backfill")
+
+QUEUE_BACKFILL = "queue:backfill"
+BACKFILL_KEY_PREFIX = "backfill:"
+BACKFILL_PAGE_SIZE = 100  # Telegram max per GetHistory request
+BACKFILL_MAX_REQUESTS = int(os.getenv("BACKFILL_MAX_REQUESTS", "50"))  # Default budget per job
+BACKFILL_RETRY_DELAY = int(os.getenv("BACKFILL_RETRY_DELAY", "300"))  # seconds, when out of budget
+BACKFILL_TTL = 30 * 86400
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_PAUSED = "paused"  # Hourly budget / flood wait, retried after BACKFILL_RETRY_DELAY
+STATUS_DONE = "done"
+STATUS_BUDGET = "budget_exhausted"  # max_requests reached before limit / since
+STATUS_FAILED = "failed"  # get_messages raised (private / unresolvable chat...), see "error"
+PENDING_STATUSES = (STATUS_QUEUED, STATUS_RUNNING, STATUS_PAUSED)
+
+
+def job_key(chat_id: int) -> str:
+    return f"{BACKFILL_KEY_PREFIX}{chat_id}"
+
+
+async def enqueue_backfill(chat_id: int, limit: int = 0, days: int = 0,
+                           max_requests: int = BACKFILL_MAX_REQUESTS, restart: bool = False) -> str:
+    """
+    Create (or resume) a backfill job. limit = last N messages, days = last D days (0 = unbounded,
+    at least one of them should be set). Returns the job status.
+    """
+    redis = await get_redis()
+    key = job_key(chat_id)
+    state = await redis.hgetall(key)
+    if state and not restart:
+        if state.get("status") in PENDING_STATUSES:
+            return state["status"]
+        if state.get("status") in (STATUS_BUDGET, STATUS_FAILED):
+            # Same job, fresh budget: continue from the saved offset
+            await redis.hset(key, mapping={"status": STATUS_QUEUED, "requests": 0, "max_requests": max_requests})
+            await redis.hdel(key, "error")
+            await redis.lpush(QUEUE_BACKFILL, chat_id)
+            return STATUS_QUEUED
+
+    since_ts = int(time.time()) - days * 86400 if days else 0
+    await redis.hset(key, mapping={
+        "chat_id": chat_id,
+        "limit": limit,
+        "since_ts": since_ts,
+        "max_requests": max_requests,
+        "offset_id": 0,
+        "fetched": 0,
+        "pushed": 0,
+        "requests": 0,
+        "status": STATUS_QUEUED,
+        "updated_at": int(time.time()),
+    })
+    await redis.expire(key, BACKFILL_TTL)
+    await redis.lpush(QUEUE_BACKFILL, chat_id)
+    return STATUS_QUEUED
+
+
+async def get_backfill_jobs() -> List[Dict]:
+    redis = await get_redis()
+    jobs = []
+    async for key in redis.scan_iter(match=f"{BACKFILL_KEY_PREFIX}*", count=100):
+        state = await redis.hgetall(key)
+        if state:
+            jobs.append(state)
+    return sorted(jobs, key=lambda s: int(s.get("updated_at", 0)), reverse=True)
+
+
+class BackfillRunner:
+    """Runs backfill jobs one at a time inside the ingestor."""
+
+    def __init__(self, client, outbound, ingest: Callable[..., Awaitable]):
+        self.client = client
+        self.outbound = outbound
+        self.ingest = ingest  # ingest_message(message, backfill=True)
+
+    async def resume_pending(self):
+        """Re-queue jobs interrupted by a restart (progress is kept in their hash)."""
+        redis = await get_redis()
+        resumed = 0
+        for state in await get_backfill_jobs():
+            if state.get("status") in (STATUS_RUNNING, STATUS_PAUSED):
+                await redis.lpush(QUEUE_BACKFILL, state["chat_id"])
+                resumed += 1
+        if resumed:
+            logger.info(f"Resumed {resumed} backfill jobs")
+
+    async def run(self):
+        await self.resume_pending()
+        blocking_redis = await get_blocking_redis()
+        while True:
+            try:
+                _, chat_id = await blocking_redis.brpop(QUEUE_BACKFILL, timeout=0)
+                await self.process(int(chat_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Backfill error: {e}")
+                await asyncio.sleep(5)
+
+    async def _requeue_later(self, chat_id: int):
+        await asyncio.sleep(BACKFILL_RETRY_DELAY)
+        redis = await get_redis()
+        await redis.lpush(QUEUE_BACKFILL, chat_id)
+
+    async def process(self, chat_id: int):
+        redis = await get_redis()
+        key = job_key(chat_id)
+        state = await redis.hgetall(key)
+        if not state or state.get("status") not in PENDING_STATUSES:
+            return
+
+        limit = int(state["limit"])
+        since_ts = int(state["since_ts"])
+        max_requests = int(state["max_requests"])
+        offset_id = int(state["offset_id"])
+        fetched = int(state["fetched"])
+        pushed = int(state["pushed"])
+        requests = int(state["requests"])
+        logger.info(f"Backfill {chat_id}: limit={limit or '-'} since_ts={since_ts or '-'} "
+                    f"from offset_id={offset_id or 'latest'} ({fetched} fetched)")
+        await redis.hset(key, "status", STATUS_RUNNING)
+
+        finished = False
+        while requests < max_requests:
+            page_size = min(BACKFILL_PAGE_SIZE, limit - fetched) if limit else BACKFILL_PAGE_SIZE
+            if page_size <= 0:
+                finished = True
+                break
+
+            try:
+                page = await self.outbound.call(
+                    lambda: self.client.get_messages(chat_id, limit=page_size, offset_id=offset_id),
+                    name="backfill"
+                )
+            except Exception as e:
+                # Private / unresolvable chat etc.: record it instead of staying "running" forever
+                await redis.hset(key, mapping={
+                    "status": STATUS_FAILED, "error": str(e)[:500], "offset_id": offset_id,
+                    "fetched": fetched, "pushed": pushed, "requests": requests, "updated_at": int(time.time()),
+                })
+                logger.error(f"Backfill {chat_id} failed ({fetched} fetched): {e}")
+                return
+            if page is None:
+                # Out of hourly budget / flood wait: keep progress, retry later
+                await redis.hset(key, mapping={"status": STATUS_PAUSED, "updated_at": int(time.time())})
+                asyncio.create_task(self._requeue_later(chat_id))
+                logger.info(f"Backfill {chat_id} paused ({fetched} fetched), retry in {BACKFILL_RETRY_DELAY}s")
+                return
+
+            requests += 1
+            if not page:
+                finished = True
+                break
+
+            # Newest -> oldest; keep what is inside the time window
+            batch = [m for m in page if not since_ts or m.date.timestamp() >= since_ts]
+            for message in reversed(batch):
+                await self.ingest(message, backfill=True)
+            pushed += len(batch)
+            fetched += len(page)
+            offset_id = page[-1].id
+
+            await redis.hset(key, mapping={
+                "offset_id": offset_id, "fetched": fetched, "pushed": pushed,
+                "requests": requests, "updated_at": int(time.time()),
+            })
+            if len(batch) < len(page) or len(page) < page_size:
+                finished = True
+                break
+
+        status = STATUS_DONE if finished else STATUS_BUDGET
+        await redis.hset(key, mapping={"status": status, "requests": requests, "updated_at": int(time.time())})
+        logger.info(f"Backfill {chat_id} {status}: {pushed} messages pushed, {requests} requests")
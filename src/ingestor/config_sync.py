@@ -0,0 +1,191 @@
+"""
+INGESTOR CONFIG SYNC - Blacklist + source config giữ trong RAM, cập nhật theo push
+Trước đây refresh_config_loop reload toàn bộ 2 bảng mỗi 5 phút (kênh spam mới bị
+blacklist vẫn lọt tối đa 5 phút). Giờ:
+- Trigger Postgres (migration 009) gửi NOTIFY 'ingestor_config' cho mỗi dòng thay đổi
+  (kể cả sửa tay bằng SQL); listener áp dụng từng thay đổi vào blacklist / sources.
+- Khi (re)connect listener: reload toàn bộ (có thể đã lỡ event).
+- Reconcile định kỳ CONFIG_RECONCILE_INTERVAL: so checksum tính trong DB với checksum
+  của dữ liệu trong RAM, chỉ reload bảng nào lệch.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Set
+
+import asyncpg
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+
+from src.common.logger import get_logger
+from src.database.db import AsyncSessionLocal, DATABASE_URL
+from src.database.models import BlacklistedChannel, SourceConfig
+
+logger = get_logger("config_sync")
+
+CONFIG_CHANNEL = "ingestor_config"
+CONFIG_RECONCILE_INTERVAL = int(os.getenv("CONFIG_RECONCILE_INTERVAL", "600"))  # seconds
+LISTENER_CHECK_INTERVAL = 5  # seconds
+
+# Same text on both sides: chat_id:priority:tags(json) joined by ',' in chat_id order.
+# jsonb::text of a list of strings == json.dumps(..., ensure_ascii=False)
+_SOURCES_CHECKSUM_SQL = text("""
+    SELECT md5(coalesce(string_agg(
+        chat_id::text || ':' || coalesce(priority::text, '') || ':' || coalesce(tags::jsonb::text, 'null'),
+        ',' ORDER BY chat_id
+    ), ''))
+    FROM source_configs
+""")
+# Same text on both sides: channel ids joined by ',' in numeric order (count + sum missed offsetting changes)
+_BLACKLIST_CHECKSUM_SQL = text(
+    "SELECT md5(coalesce(string_agg(channel_id::text, ',' ORDER BY channel_id), '')) FROM blacklisted_channels"
+)
+
+
+def _source_entry(tags, priority) -> Dict:
+    return {"tags": tags, "priority": priority}
+
+
+class IngestorConfig:
+    """Blacklisted chat ids + {chat_id: {"tags", "priority"}}, mutated in place."""
+
+    def __init__(self):
+        self.blacklist: Set[int] = set()
+        self.sources: Dict[int, Dict] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._reconciler: Optional[asyncio.Task] = None
+
+    # ============ Full loads ============
+    async def load_blacklist(self):
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(select(BlacklistedChannel.channel_id))
+                ids = set(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Failed to load blacklist: {e}")
+            return
+        self.blacklist.clear()
+        self.blacklist.update(ids)
+        logger.info(f"Loaded {len(self.blacklist)} blacklisted channels.")
+
+    async def load_sources(self):
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(SourceConfig.chat_id, SourceConfig.tags, SourceConfig.priority)
+                )
+                rows = result.all()
+        except Exception as e:
+            logger.error(f"Failed to load source configs: {e}")
+            return
+        self.sources.clear()
+        self.sources.update({chat_id: _source_entry(tags, priority) for chat_id, tags, priority in rows})
+        logger.info(f"Loaded {len(self.sources)} source configs.")
+
+    async def load(self):
+        await self.load_blacklist()
+        await self.load_sources()
+
+    # ============ Incremental updates ============
+    def apply(self, event: Dict):
+        """Apply 1 NOTIFY payload (see migration 009)."""
+        table, op = event.get("table"), event.get("op")
+        new_id, old_id = event.get("id"), event.get("old_id")
+
+        if table == "blacklisted_channels":
+            if op == "TRUNCATE":
+                self.blacklist.clear()
+                return
+            if old_id is not None and old_id != new_id:
+                self.blacklist.discard(old_id)
+            if new_id is not None:
+                self.blacklist.add(new_id)
+            logger.info(f"Blacklist {op.lower()}: {new_id if new_id is not None else old_id}")
+
+        elif table == "source_configs":
+            if op == "TRUNCATE":
+                self.sources.clear()
+                return
+            if old_id is not None and old_id != new_id:
+                self.sources.pop(old_id, None)
+            if new_id is not None:
+                self.sources[new_id] = _source_entry(event.get("tags"), event.get("priority"))
+            logger.debug(f"Source config {op.lower()}: {new_id if new_id is not None else old_id}")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            self.apply(json.loads(payload))
+        except Exception as e:
+            logger.warning(f"Bad config notification {payload!r}: {e}")
+
+    async def listen(self):
+        """LISTEN ingestor_config on a dedicated connection; reconnects + full reload on error."""
+        dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                await conn.add_listener(CONFIG_CHANNEL, self._on_notify)
+                # Anything may have changed while we were not listening
+                await self.load()
+                logger.info(f"Listening for config changes on '{CONFIG_CHANNEL}'")
+                while not conn.is_closed():
+                    await asyncio.sleep(LISTENER_CHECK_INTERVAL)
+                logger.warning("Config listener connection closed, reconnecting...")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Config listener error, reconnecting: {e}")
+                await asyncio.sleep(LISTENER_CHECK_INTERVAL)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    try:
+                        await conn.close()
+                    except Exception:
+                        pass
+
+    # ============ Reconciliation ============
+    def _blacklist_checksum(self) -> str:
+        return hashlib.md5(",".join(str(chat_id) for chat_id in sorted(self.blacklist)).encode()).hexdigest()
+
+    def _sources_checksum(self) -> str:
+        body = ",".join(
+            f"{chat_id}:{'' if cfg['priority'] is None else cfg['priority']}:"
+            f"{json.dumps(cfg['tags'], ensure_ascii=False)}"
+            for chat_id, cfg in sorted(self.sources.items())
+        )
+        return hashlib.md5(body.encode()).hexdigest()
+
+    async def reconcile(self):
+        """Reload only the tables whose DB checksum differs from the in-memory copy."""
+        try:
+            async with AsyncSessionLocal() as session:
+                blacklist_md5 = (await session.execute(_BLACKLIST_CHECKSUM_SQL)).scalar()
+                sources_md5 = (await session.execute(_SOURCES_CHECKSUM_SQL)).scalar()
+        except Exception as e:
+            logger.warning(f"Config reconcile failed: {e}")
+            return
+
+        if blacklist_md5 != self._blacklist_checksum():
+            logger.warning("Blacklist out of sync (missed notification?), reloading")
+            await self.load_blacklist()
+        if sources_md5 != self._sources_checksum():
+            logger.warning("Source configs out of sync (missed notification?), reloading")
+            await self.load_sources()
+
+    async def reconcile_loop(self):
+        while True:
+            await asyncio.sleep(CONFIG_RECONCILE_INTERVAL)
+            await self.reconcile()
+
+    def start(self):
+        """Start listener + reconciler tasks (the listener does the initial full load)."""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self.listen())
+        if self._reconciler is None or self._reconciler.done():
+            self._reconciler = asyncio.create_task(self.reconcile_loop())
+
+
+# Singleton instance
+ingestor_config = IngestorConfig()
@@ -2,6 +2,12 @@
 INGESTOR SERVICE - The Ear
 Lắng nghe tin nhắn từ Telegram Channels/Groups và đẩy vào Redis Queue.
 With Smart Protection: Rate limiting, Flood detection, Account health monitoring.
+Protection chỉ áp dụng cho request gửi lên Telegram (get_chat, tải ảnh, join) qua OutboundGuard;
+update nhận về được đẩy thẳng vào queue, không delay / drop.
+Restart: checkpoint message id / chat + catch-up tin bị lỡ (catchup.py); push idempotent
+theo (chat_id, message id).
+Backfill lịch sử cho nguồn mới: job trong queue:backfill (backfill.py), tin đẩy kèm cờ "backfill".
+Album (grouped media) gộp thành 1 envelope: caption + image_paths (albums.py).
 """
 import os
 import asyncio
@@ -9,22 +15,25 @@ import json
 import sys
 
 from telethon import TelegramClient, events
-from telethon.errors import SessionPasswordNeededError, FloodWaitError
+from telethon.errors import SessionPasswordNeededError
 from telethon.tl.functions.channels import JoinChannelRequest
 from dotenv import load_dotenv
-from datetime import datetime, timezone
-from sqlalchemy import select
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+from src.common.config import settings
 from src.common.logger import get_logger
 from src.common.redis_client import get_redis
-from src.common.utils import safe_execution
-from src.database.db import AsyncSessionLocal
-from src.database.models import BlacklistedChannel, SourceConfig
+from src.common.metrics import start_metrics_reporter
+from src.common.text_norm import NORM_KEY, normalize
+from src.ingestor.config_sync import ingestor_config
+from src.ingestor.catchup import Checkpoints, catch_up
+from src.ingestor.backfill import BackfillRunner
+from src.ingestor.session_store import BufferedSession
+from src.ingestor.albums import AlbumCoalescer
 from src.ingestor.protection import (
-    RateLimiter, FloodWaitHandler, BehaviorRandomizer, AccountHealthMonitor
+    RateLimiter, FloodWaitHandler, OutboundGuard, AccountHealthMonitor
 )
 
 load_dotenv()
@@ -44,38 +53,36 @@ logger = get_logger("ingestor")
 # Queue name
 QUEUE_RAW_MESSAGES = "queue:raw_messages"
 
+# Idempotent push: (chat_id, message id) is pushed at most once.
+# Per-chat bitmaps of INGESTED_BLOCK_BITS message ids (ingested:{chat_id}:{id // block}, 1KB),
+# not 1 key per message: a chat has 1-2 live blocks, idle ones expire after INGESTED_TTL.
+INGESTED_TTL = 2 * 86400
+INGESTED_BLOCK_BITS = 8192
+# KEYS = [bitmap block, queue] | ARGV = [payload, bit offset, ttl]
+PUSH_ONCE_SCRIPT = """
+if redis.call('SETBIT', KEYS[1], ARGV[2], 1) == 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
 # Protection modules
 rate_limiter: RateLimiter = None
 flood_handler: FloodWaitHandler = None
+outbound: OutboundGuard = None
 health_monitor: AccountHealthMonitor = None
+checkpoints = Checkpoints(SESSION_PHONE)
 
+# Blacklist / source configs: ingestor_config (push-updated, see config_sync.py)
 
-# Rate Limiting
-MAX_JOINS_PER_DAY = 20
-
-# Blacklist cache
-BLACKLISTED_CHANNELS = set()
-
-# Source Config Cache
-SOURCE_CONFIGS = {} # {chat_id: {"tag": "...", "priority": 1}}
+# Chat title cache (tránh get_chat lặp lại cho mỗi tin)
+CHAT_TITLES = {}  # {chat_id: title}
 
-# Create client
-client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
-
-async def load_source_configs():
-    """Load source configs from DB."""
-    global SOURCE_CONFIGS
-    try:
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(select(SourceConfig))
-            configs = result.scalars().all()
-            SOURCE_CONFIGS = {
-                cfg.chat_id: {"tags": cfg.tags, "priority": cfg.priority} 
-                for cfg in configs
-            }
-            logger.info(f"Loaded {len(SOURCE_CONFIGS)} source configs.")
-    except Exception as e:
-        logger.error(f"Failed to load source configs: {e}")
+# Create client (session in memory, flushed to the .session file on a timer, see session_store.py)
+session = BufferedSession(SESSION_NAME)
+client = TelegramClient(session, API_ID, API_HASH)
 
 async def health_check_loop():
     """
@@ -95,173 +102,197 @@ async def health_check_loop():
             elif health["status"] == "warning":
                 logger.warning(f"⚠️ Account health warning: {health['issues']}")
 
-async def load_blacklist():
-    """Load blacklisted channels from DB."""
-    global BLACKLISTED_CHANNELS
-    try:
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(select(BlacklistedChannel.channel_id))
-            BLACKLISTED_CHANNELS = set(result.scalars().all())
-            logger.info(f"Loaded {len(BLACKLISTED_CHANNELS)} blacklisted channels.")
-    except Exception as e:
-        logger.error(f"Failed to load blacklist: {e}")
-
-async def refresh_config_loop():
-    """Periodically refresh configurations."""
-    while True:
-        await asyncio.sleep(300)  # Refresh every 5 minutes
-        logger.info("Refreshing configurations...")
-        await load_blacklist()
-        await load_source_configs()
-
 async def join_channel(link: str):
     """
     Join a channel/group with Rate Limiting and FloodWait protection.
     """
-    redis = await get_redis()
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    key = f"daily_joins:{today}"
-    
-    # Check Rate Limit
-    current_joins = await redis.get(key)
-    current_joins = int(current_joins) if current_joins else 0
-    
-    if current_joins >= MAX_JOINS_PER_DAY:
-        logger.warning(f"Rate Limit Reached: Cannot join {link}. Max {MAX_JOINS_PER_DAY} joins/day.")
-        return
-
+    logger.info(f"Attempting to join: {link}")
     try:
-        logger.info(f"Attempting to join: {link}")
-        # Use safe_execution to handle FloodWait automatically
-        await safe_execution(client, JoinChannelRequest(link))
-        
-        # Update Counter
-        await redis.incr(key)
-        await redis.expire(key, 86400) # 24h TTL
-        logger.info(f"Successfully joined {link}. Daily joins: {current_joins + 1}/{MAX_JOINS_PER_DAY}")
-        
+        result = await outbound.call(lambda: client(JoinChannelRequest(link)), name="join", join=True)
     except Exception as e:
         logger.error(f"Failed to join {link}: {e}")
+        return
+
+    if result is None:
+        logger.warning(f"Join skipped (rate limit / flood wait): {link}")
+    else:
+        logger.info(f"Successfully joined {link}.")
+
+async def get_chat_title(message) -> str:
+    """Title from the entity shipped with the update, then the local cache; get_chat only on a miss."""
+    chat = message.chat
+    if chat is None:
+        title = CHAT_TITLES.get(message.chat_id)
+        if title is not None:
+            return title
+        try:
+            chat = await outbound.call(message.get_chat, name="get_chat")
+        except Exception as e:
+            logger.debug(f"get_chat failed for {message.chat_id}: {e}")
+            chat = None
+        if chat is None:
+            return "Unknown"
+    title = getattr(chat, 'title', None) or 'Unknown'
+    CHAT_TITLES[message.chat_id] = title
+    return title
+
+async def push_once(message_data: dict) -> bool:
+    """LPUSH to the raw queue unless this (chat_id, message id) was already pushed."""
+    redis = await get_redis()
+    block, offset = divmod(message_data["id"], INGESTED_BLOCK_BITS)
+    key = f"ingested:{message_data['chat_id']}:{block}"
+    pushed = await redis.eval(
+        PUSH_ONCE_SCRIPT, 2, key, QUEUE_RAW_MESSAGES,
+        json.dumps(message_data, ensure_ascii=False), offset, INGESTED_TTL
+    )
+    return bool(pushed)
 
 @client.on(events.NewMessage)
 async def message_handler(event):
     """
     Xử lý mỗi tin nhắn mới từ bất kỳ chat nào.
-    WITH PROTECTION: Rate limiting, delay simulation, flood detection.
+    Update đã nhận về: không delay / rate limit; chỉ get_chat / tải ảnh đi qua OutboundGuard.
     """
-    # ============ PROTECTION: Rate Limiting ============
-    if not await rate_limiter.check_message_rate():
-        logger.warning("Skipping message due to rate limit")
+    await ingest_message(event.message)
+
+async def ingest_message(message, backfill: bool = False):
+    """
+    Live update hoặc tin lấy lại khi catch-up / backfill (telethon Message) -> queue:raw_messages.
+    backfill=True: không tải ảnh, envelope có cờ "backfill" (worker không gửi alert).
+    Album (grouped_id): gộp qua AlbumCoalescer, publish 1 lần cho cả album.
+    """
+    # Check blacklist first, before any other work
+    if message.chat_id in ingestor_config.blacklist:
         return
-    
-    # ============ PROTECTION: Add Human-like Delay ============
-    delay = await rate_limiter.get_message_delay()
-    logger.debug(f"⏳ Waiting {delay:.1f}s before processing message...")
-    await asyncio.sleep(delay)
-    
-    # Record this message
-    await rate_limiter.record_message()
-    
-    # DEBUG: Print everything
-    chat_title = "Unknown"
-    try:
-        chat = await event.get_chat()
-        chat_title = getattr(chat, 'title', 'Unknown')
-    except:
-        pass
-    
-    print(f"DEBUG: Received message: {event.text[:50] if event.text else 'Media'} from {event.chat_id} ({chat_title})")
-    logger.debug(f"Ingested: [{chat_title}] {event.text[:50] if event.text else 'Media'}...")
 
     try:
-        # Check blacklist
-        if event.chat_id in BLACKLISTED_CHANNELS:
-            logger.debug(f"Ignored message from blacklisted channel: {event.chat_id}")
-            return
-
         # Prevent Infinite Loop: Ignore messages from the Bot itself
-        if event.sender_id == BOT_ID:
+        if message.sender_id == BOT_ID:
             logger.debug(f"Ignored message from Bot ({BOT_ID}) to prevent loop.")
             return
 
         # Bỏ qua tin nhắn từ chính mình (Ingestor account)
-        if event.out:
+        if message.out:
             return
         
         # Bỏ qua tin nhắn private (chỉ lắng nghe groups/channels)
-        if event.is_private:
+        if message.is_private:
             return
-        
-        # Check for media (Photo)
-        image_path = None
-        # Check if image scanning is disabled
-        inactive_img = os.getenv("INACTIVE_IMG", "False").lower() in ("true", "1", "yes")
-        
-        if event.photo and not inactive_img:
-            try:
-                # Create temp directory
-                temp_dir = os.path.join(os.getcwd(), "temp_images")
-                os.makedirs(temp_dir, exist_ok=True)
-                
-                # Download photo
-                file_path = os.path.join(temp_dir, f"{event.chat_id}_{event.id}.jpg")
-                await event.download_media(file=file_path)
-                image_path = file_path
-                logger.debug(f"Downloaded photo: {image_path}")
-            except Exception as e:
-                logger.error(f"Failed to download photo: {e}")
-
-        # Bỏ qua nếu không có text VÀ không có ảnh
-        if not event.text and not image_path:
+
+        if message.grouped_id:
+            albums.add(message, backfill)
             return
-        
-        # Lấy thông tin chat
-        chat = await event.get_chat()
-        chat_title = getattr(chat, 'title', 'Unknown')
-        
-        # Tagging Logic
-        source_config = SOURCE_CONFIGS.get(event.chat_id)
-        tags = ["NORMAL"]
-        priority = 1
-        if source_config:
-            tags = source_config.get("tags", ["NORMAL"])
-            # Ensure tags is a list
-            if not isinstance(tags, list):
-                tags = [tags] if tags else ["NORMAL"]
-                
-            priority = source_config.get("priority", 1)
-            logger.debug(f"Tagged message from {event.chat_id} as {tags} (Priority: {priority})")
-
-        # Serialize message data
-        message_data = {
-            "id": event.id,
-            "chat_id": event.chat_id,
-            "chat_title": chat_title,
-            "text": event.text or "",  # Ensure text is not None
-            "date": event.date.isoformat(),
-            "sender_id": event.sender_id,
-            "message_link": f"https://t.me/c/{str(event.chat_id)[4:]}/{event.id}" if str(event.chat_id).startswith("-100") else None,
-            "image_path": image_path,
-            "tags": tags,
-            "priority": priority
-        }
-        
-        # Push to Redis Queue
-        redis = await get_redis()
-        await redis.lpush(QUEUE_RAW_MESSAGES, json.dumps(message_data, ensure_ascii=False))
-        
-        logger.debug(f"Ingested: [{chat_title}] {event.text[:50]}...")
+
+        await publish_messages([message], backfill)
         
     except Exception as e:
         logger.error(f"Error processing message: {e}")
 
+async def download_photo(message):
+    """Download 1 photo to temp_images (outbound call). Returns the path or None."""
+    try:
+        # Create temp directory
+        temp_dir = os.path.join(os.getcwd(), "temp_images")
+        os.makedirs(temp_dir, exist_ok=True)
+        
+        # Download photo
+        file_path = os.path.join(temp_dir, f"{message.chat_id}_{message.id}.jpg")
+        image_path = await outbound.call(
+            lambda: message.download_media(file=file_path), name="download_media", download=True
+        )
+        if image_path:
+            logger.debug(f"Downloaded photo: {image_path}")
+        return image_path
+    except Exception as e:
+        logger.error(f"Failed to download photo: {e}")
+        return None
+
+async def publish_messages(messages: list, backfill: bool = False):
+    """1 tin thường hoặc các phần của 1 album (sorted by id) -> 1 envelope."""
+    first = messages[0]
+    # Caption: usually only one part of an album carries text
+    caption = next((m for m in messages if m.text), first)
+    text = caption.text or ""
+
+    # Check for media (Photo)
+    image_paths = []
+    # Check if image scanning is disabled
+    inactive_img = os.getenv("INACTIVE_IMG", "False").lower() in ("true", "1", "yes")
+    
+    if not inactive_img and not backfill:
+        # Only the photos the worker OCRs; other album parts stay references (album_ids)
+        photos = [m for m in messages if m.photo][:settings.ALBUM_OCR_MAX_IMAGES]
+        for message in photos:
+            image_path = await download_photo(message)
+            if image_path:
+                image_paths.append(image_path)
+
+    # Ảnh không tải (INACTIVE_IMG / hết ngân sách / flood wait / lỗi) vẫn push, kèm cờ has_media
+    has_media = any(m.photo for m in messages)
+
+    # Bỏ qua nếu không có text VÀ không có ảnh (backfill không tải ảnh: cần text)
+    if not text and (backfill or not has_media):
+        mark_seen(messages)
+        return
+    
+    # Lấy thông tin chat
+    chat_title = await get_chat_title(caption)
+    logger.debug(f"Ingested: [{chat_title}] {text[:50] if text else 'Media'}...")
+    
+    # Tagging Logic
+    source_config = ingestor_config.sources.get(first.chat_id)
+    tags = ["NORMAL"]
+    priority = 1
+    if source_config:
+        tags = source_config.get("tags", ["NORMAL"])
+        # Ensure tags is a list
+        if not isinstance(tags, list):
+            tags = [tags] if tags else ["NORMAL"]
+            
+        priority = source_config.get("priority", 1)
+        logger.debug(f"Tagged message from {first.chat_id} as {tags} (Priority: {priority})")
+
+    # Serialize message data (album: id / link of its first part, stable for push_once)
+    message_data = {
+        "id": first.id,
+        "chat_id": first.chat_id,
+        "chat_title": chat_title,
+        "text": text,  # Ensure text is not None
+        "date": first.date.isoformat(),
+        "sender_id": caption.sender_id,
+        "message_link": f"https://t.me/c/{str(first.chat_id)[4:]}/{first.id}" if str(first.chat_id).startswith("-100") else None,
+        "image_path": image_paths[0] if image_paths else None,
+        "has_media": has_media,
+        "tags": tags,
+        "priority": priority
+    }
+    if len(messages) > 1:
+        message_data["image_paths"] = image_paths
+        message_data["album_ids"] = [m.id for m in messages]
+    if backfill:
+        message_data["backfill"] = True
+    # Normalize once here; worker / analyzer reuse it (see text_norm)
+    message_data[NORM_KEY] = normalize(message_data["text"])
+    
+    # Push to Redis Queue
+    if not await push_once(message_data):
+        logger.debug(f"Already ingested: {first.chat_id}/{first.id}")
+    mark_seen(messages)
+
+def mark_seen(messages: list):
+    """Advance the catch-up checkpoint only once messages are handled (pushed or deliberately skipped)."""
+    for message in messages:
+        checkpoints.record(message.chat_id, message.id)
+
+# Album parts -> publish_messages() once per album
+albums = AlbumCoalescer(publish_messages)
+
 
 async def main():
     """Main entry point for Ingestor Service."""
-    global rate_limiter, flood_handler, health_monitor
+    global rate_limiter, flood_handler, outbound, health_monitor
     
-    await load_blacklist()
-    await load_source_configs()
+    await ingestor_config.load()
     logger.info("=" * 50)
     logger.info("INGESTOR SERVICE - Starting with Account Protection...")
     logger.info("=" * 50)
@@ -269,10 +300,14 @@ async def main():
     # ============ PROTECTION: Initialize Modules ============
     rate_limiter = RateLimiter(SESSION_PHONE)
     flood_handler = FloodWaitHandler(SESSION_PHONE)
+    outbound = OutboundGuard(rate_limiter, flood_handler)
     health_monitor = AccountHealthMonitor(client, SESSION_PHONE)
     
     await rate_limiter.init()
-    logger.info(f"✅ Rate Limiter initialized (warm-up mode)")
+    logger.info(f"✅ Rate Limiter initialized (warm-up mode, outbound calls only)")
+
+    # Before the client starts: catch-up needs checkpoints not yet moved by live updates
+    await checkpoints.load()
     
     # Ensure sessions directory exists
     os.makedirs("sessions", exist_ok=True)
@@ -280,6 +315,7 @@ async def main():
     try:
         # Connect to Telegram
         await client.start()
+        session.start()
         
         me = await client.get_me()
         logger.info(f"Logged in as: {me.first_name} (@{me.username})")
@@ -303,8 +339,19 @@ async def main():
         # ============ PROTECTION: Start Health Check Loop ============
         asyncio.create_task(health_check_loop())
         
-        # Start config refresh loop
-        asyncio.create_task(refresh_config_loop())
+        # Blacklist / source config changes: LISTEN/NOTIFY + periodic checksum reconcile
+        # (the listener reloads once more after LISTEN to cover changes made in between)
+        ingestor_config.start()
+        
+        # Publish pool metrics to Redis
+        start_metrics_reporter()
+
+        # Messages posted while we were down (live updates already flow in parallel)
+        checkpoints.start()
+        asyncio.create_task(catch_up(client, checkpoints, flood_handler, ingest_message))
+
+        # History of newly added sources (jobs from scripts/backfill_sources.py)
+        asyncio.create_task(BackfillRunner(client, outbound, ingest_message).run())
         
         logger.info("🛡️ Ingestor is running with smart protection. Waiting for messages...")
         
@@ -316,6 +363,11 @@ async def main():
     except Exception as e:
         logger.error(f"Ingestor error: {e}")
         raise
+    finally:
+        await rate_limiter.flush()
+        await albums.flush_all()
+        await checkpoints.flush()
+        await session.flush()
 
 
 if __name__ == '__main__':
@@ -7,7 +7,7 @@ import random
 import json
 import os
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict
+from typing import Any, Awaitable, Callable, Optional, Dict
 from telethon.errors import FloodWaitError, AuthKeyUnregisteredError, UnauthorizedError
 from dotenv import load_dotenv
 
@@ -19,24 +19,47 @@ load_dotenv()
 logger = get_logger("protection")
 
 # ============ CONFIG ============
+# Giới hạn chỉ áp dụng cho request GỬI LÊN Telegram (get_chat, tải media, join).
+# Tin nhắn nhận về qua update không bị delay / drop: xử lý local không tốn API call.
 # Warm-up: Gradually increase activity (optimized for better throughput)
 WARM_UP_DAYS = int(os.getenv("WARM_UP_DAYS", "7"))
+
+
+def _env_renamed(name: str, old_name: str, default: str) -> str:
+    """Read env `name`; fall back to the pre-rename `old_name` with a deprecation warning."""
+    value = os.getenv(name)
+    if value is not None:
+        return value
+    value = os.getenv(old_name)
+    if value is not None:
+        logger.warning(f"{old_name} is deprecated (it now limits outbound API calls): rename it to {name}")
+        return value
+    return default
+
+
 WARM_UP_SCHEDULE = {
-    0: {"max_messages_per_hour": int(os.getenv("WARM0_MAX_MSG_H", "50")), "max_joins_per_day": int(os.getenv("WARM0_MAX_J", "5"))},
-    1: {"max_messages_per_hour": int(os.getenv("WARM1_MAX_MSG_H", "80")), "max_joins_per_day": int(os.getenv("WARM1_MAX_J", "8"))},
-    2: {"max_messages_per_hour": int(os.getenv("WARM2_MAX_MSG_H", "120")), "max_joins_per_day": int(os.getenv("WARM2_MAX_J", "12"))},
-    3: {"max_messages_per_hour": int(os.getenv("WARM3_MAX_MSG_H", "150")), "max_joins_per_day": int(os.getenv("WARM3_MAX_J", "15"))},
-    4: {"max_messages_per_hour": int(os.getenv("WARM4_MAX_MSG_H", "180")), "max_joins_per_day": int(os.getenv("WARM4_MAX_J", "20"))},
-    5: {"max_messages_per_hour": int(os.getenv("WARM5_MAX_MSG_H", "200")), "max_joins_per_day": int(os.getenv("WARM5_MAX_J", "25"))},
-    6: {"max_messages_per_hour": int(os.getenv("WARM6_MAX_MSG_H", "250")), "max_joins_per_day": int(os.getenv("WARM6_MAX_J", "30"))},
+    0: {"max_calls_per_hour": int(_env_renamed("WARM0_MAX_CALLS_H", "WARM0_MAX_MSG_H", "50")), "max_joins_per_day": int(os.getenv("WARM0_MAX_J", "5"))},
+    1: {"max_calls_per_hour": int(_env_renamed("WARM1_MAX_CALLS_H", "WARM1_MAX_MSG_H", "80")), "max_joins_per_day": int(os.getenv("WARM1_MAX_J", "8"))},
+    2: {"max_calls_per_hour": int(_env_renamed("WARM2_MAX_CALLS_H", "WARM2_MAX_MSG_H", "120")), "max_joins_per_day": int(os.getenv("WARM2_MAX_J", "12"))},
+    3: {"max_calls_per_hour": int(_env_renamed("WARM3_MAX_CALLS_H", "WARM3_MAX_MSG_H", "150")), "max_joins_per_day": int(os.getenv("WARM3_MAX_J", "15"))},
+    4: {"max_calls_per_hour": int(_env_renamed("WARM4_MAX_CALLS_H", "WARM4_MAX_MSG_H", "180")), "max_joins_per_day": int(os.getenv("WARM4_MAX_J", "20"))},
+    5: {"max_calls_per_hour": int(_env_renamed("WARM5_MAX_CALLS_H", "WARM5_MAX_MSG_H", "200")), "max_joins_per_day": int(os.getenv("WARM5_MAX_J", "25"))},
+    6: {"max_calls_per_hour": int(_env_renamed("WARM6_MAX_CALLS_H", "WARM6_MAX_MSG_H", "250")), "max_joins_per_day": int(os.getenv("WARM6_MAX_J", "30"))},
 }
 
-# Message Processing Delays (configurable for tuning)
-MIN_MESSAGE_DELAY = float(os.getenv("MIN_MESSAGE_DELAY", "1"))  # seconds (reduced from 5)
-MAX_MESSAGE_DELAY = float(os.getenv("MAX_MESSAGE_DELAY", "4"))  # seconds (reduced from 15)
-PAUSE_INTERVAL = int(os.getenv("PAUSE_INTERVAL", "0"))  # No forced pause loop
-PAUSE_PROB = float(os.getenv("PAUSE_PROB", "0.02"))  # 2% chance (reduced from 10%)
-PAUSE_DURATION = (int(os.getenv("PAUSE_MIN", "60")), int(os.getenv("PAUSE_MAX", "120")))  # 1-2 min (reduced)
+# Outbound Call Pacing: khoảng cách tối thiểu giữa 2 API call liên tiếp (random, human-like).
+# Call thưa thì không phải chờ; chỉ giãn khi có nhiều call dồn dập.
+MIN_CALL_INTERVAL = float(_env_renamed("MIN_CALL_DELAY", "MIN_MESSAGE_DELAY", "1"))  # seconds
+MAX_CALL_INTERVAL = float(_env_renamed("MAX_CALL_DELAY", "MAX_MESSAGE_DELAY", "4"))  # seconds
+
+# Tải media (ảnh cho OCR): ngân sách / giờ và pacing riêng, không xếp hàng sau get_chat / join
+# (trước đây N ảnh dồn dập phải chờ ~N x 2.5s trong pace() chung, trên đường push của tin)
+MAX_DOWNLOADS_PER_HOUR = int(os.getenv("MAX_DOWNLOADS_PER_HOUR", "300"))
+MIN_DOWNLOAD_INTERVAL = float(os.getenv("MIN_DOWNLOAD_INTERVAL", "0.2"))  # seconds
+MAX_DOWNLOAD_INTERVAL = float(os.getenv("MAX_DOWNLOAD_INTERVAL", "0.6"))  # seconds
+
+# Counters giữ trong process, ghi ra Redis định kỳ (không tốn round-trip / call)
+COUNTER_FLUSH_INTERVAL = int(os.getenv("COUNTER_FLUSH_INTERVAL", "30"))  # seconds
 
 # Flood Detection
 FLOOD_BACKOFF_MULTIPLIER = float(os.getenv("FLOOD_BACKOFF_MULTIPLIER", "1.5"))
@@ -48,25 +71,31 @@ HEALTH_CHECK_INTERVAL = int(os.getenv("HEALTH_CHECK_INTERVAL", str(12 * 3600)))
 # ============ DEBUG LOGGING ============
 logger.info("=" * 60)
 logger.info("PROTECTION CONFIG LOADED FROM ENV:")
-logger.info(f"  WARM0_MAX_MSG_H: {WARM_UP_SCHEDULE[0]['max_messages_per_hour']}")
-logger.info(f"  WARM6_MAX_MSG_H: {WARM_UP_SCHEDULE[6]['max_messages_per_hour']}")
-logger.info(f"  MIN_MESSAGE_DELAY: {MIN_MESSAGE_DELAY}s")
-logger.info(f"  MAX_MESSAGE_DELAY: {MAX_MESSAGE_DELAY}s")
-logger.info(f"  PAUSE_PROB: {PAUSE_PROB}")
-logger.info(f"  PAUSE_DURATION: {PAUSE_DURATION}")
+logger.info(f"  WARM0_MAX_CALLS_H: {WARM_UP_SCHEDULE[0]['max_calls_per_hour']}")
+logger.info(f"  WARM6_MAX_CALLS_H: {WARM_UP_SCHEDULE[6]['max_calls_per_hour']}")
+logger.info(f"  CALL_INTERVAL: {MIN_CALL_INTERVAL}-{MAX_CALL_INTERVAL}s")
+logger.info(f"  DOWNLOADS: {MAX_DOWNLOADS_PER_HOUR}/h, {MIN_DOWNLOAD_INTERVAL}-{MAX_DOWNLOAD_INTERVAL}s")
+logger.info(f"  COUNTER_FLUSH_INTERVAL: {COUNTER_FLUSH_INTERVAL}s")
 logger.info("=" * 60)
 
 
 class RateLimiter:
-    """Intelligent rate limiting based on account age and warm-up schedule."""
+    """
+    Rate limiting of outbound Telegram API calls based on account age and warm-up schedule.
+    Counters are kept in-process and flushed to Redis every COUNTER_FLUSH_INTERVAL.
+    """
     
     def __init__(self, session_name: str):
         self.session_name = session_name
         self.session_key = f"session_info:{session_name}"
-        self.last_message_time = {}
+        self.counts: Dict[str, int] = {}  # Redis key -> count (loaded + local)
+        self.pending: Dict[str, int] = {}  # Redis key -> increments not flushed yet
+        self.next_call_at = 0.0  # Loop time of the next allowed call
+        self.next_download_at = 0.0  # Same, for media downloads (separate lane)
+        self._flush_task: Optional[asyncio.Task] = None
         
     async def init(self):
-        """Initialize or load session info from Redis."""
+        """Initialize or load session info and current counters from Redis."""
         redis = await get_redis()
         session_info = await redis.get(self.session_key)
         
@@ -84,6 +113,14 @@ class RateLimiter:
             }
             await self.save()
             logger.info("New session initialized")
+
+        # Keep budgets across restarts
+        keys = [self._calls_key(), self._joins_key(), self._downloads_key()]
+        for key, value in zip(keys, await redis.mget(keys)):
+            self.counts[key] = int(value) if value else 0
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush_loop())
     
     async def save(self):
         """Save session info to Redis."""
@@ -101,61 +138,74 @@ class RateLimiter:
         age_days = await self.get_account_age()
         schedule_day = min(age_days, WARM_UP_DAYS - 1)
         return WARM_UP_SCHEDULE[schedule_day]
-    
-    async def check_message_rate(self) -> bool:
-        """
-        Check if we can process another message.
-        Returns True if OK, False if rate limit reached.
-        """
-        redis = await get_redis()
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        hour = datetime.now(timezone.utc).hour
-        hour_key = f"messages:{self.session_name}:{today}:{hour}"
-        
+
+    # ============ In-process counters ============
+    def _calls_key(self) -> str:
+        now = datetime.now(timezone.utc)
+        return f"api_calls:{self.session_name}:{now.strftime('%Y-%m-%d')}:{now.hour}"
+
+    def _joins_key(self) -> str:
+        return f"joins:{self.session_name}:{datetime.now(timezone.utc).strftime('%Y-%m-%d')}"
+
+    def _downloads_key(self) -> str:
+        now = datetime.now(timezone.utc)
+        return f"downloads:{self.session_name}:{now.strftime('%Y-%m-%d')}:{now.hour}"
+
+    def _count(self, key: str) -> int:
+        return self.counts.get(key, 0)
+
+    def _record(self, key: str):
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.pending[key] = self.pending.get(key, 0) + 1
+
+    async def flush(self):
+        """Write pending increments to Redis (1 pipeline) and drop counters of past windows."""
+        if self.pending:
+            pending, self.pending = self.pending, {}
+            try:
+                redis = await get_redis()
+                async with redis.pipeline(transaction=False) as pipe:
+                    for key, delta in pending.items():
+                        pipe.incrby(key, delta)
+                        pipe.expire(key, 86400 if key.startswith("joins:") else 3600)
+                    await pipe.execute()
+            except Exception as e:
+                # Retry on next flush
+                for key, delta in pending.items():
+                    self.pending[key] = self.pending.get(key, 0) + delta
+                logger.warning(f"Failed to flush rate counters: {e}")
+
+        current = {self._calls_key(), self._joins_key(), self._downloads_key()}
+        for key in list(self.counts):
+            if key not in current and key not in self.pending:
+                del self.counts[key]
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(COUNTER_FLUSH_INTERVAL)
+            await self.flush()
+
+    # ============ Outbound budget ============
+    async def check_call_rate(self) -> bool:
+        """Check if we can make another outbound API call this hour."""
         limits = await self.get_limits()
-        current_count = await redis.get(hour_key)
-        current_count = int(current_count) if current_count else 0
-        
-        if current_count >= limits["max_messages_per_hour"]:
+        current_calls = self._count(self._calls_key())
+        if current_calls >= limits["max_calls_per_hour"]:
             logger.warning(
-                f"⚠️ Message rate limit reached: {current_count}/"
-                f"{limits['max_messages_per_hour']} per hour"
+                f"⚠️ API call rate limit reached: {current_calls}/"
+                f"{limits['max_calls_per_hour']} per hour"
             )
             return False
-        
         return True
-    
-    async def record_message(self):
-        """Record message processing."""
-        redis = await get_redis()
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        hour = datetime.now(timezone.utc).hour
-        hour_key = f"messages:{self.session_name}:{today}:{hour}"
-        
-        await redis.incr(hour_key)
-        await redis.expire(hour_key, 3600)
-    
-    async def get_message_delay(self) -> float:
-        """Get random delay before processing next message (human-like)."""
-        # Base delay with randomization
-        base_delay = random.uniform(MIN_MESSAGE_DELAY, MAX_MESSAGE_DELAY)
-        
-        # Occasional pauses (low probability)
-        if random.random() < PAUSE_PROB:
-            logger.info(f"⏸️ Taking human-like pause ({PAUSE_DURATION[0]}-{PAUSE_DURATION[1]}s)...")
-            base_delay = random.uniform(PAUSE_DURATION[0], PAUSE_DURATION[1])
-        
-        return base_delay
-    
+
+    def record_call(self):
+        """Record an outbound API call."""
+        self._record(self._calls_key())
+
     async def check_join_rate(self) -> bool:
         """Check if we can join another channel."""
-        redis = await get_redis()
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        join_key = f"joins:{self.session_name}:{today}"
-        
         limits = await self.get_limits()
-        current_joins = await redis.get(join_key)
-        current_joins = int(current_joins) if current_joins else 0
+        current_joins = self._count(self._joins_key())
         
         if current_joins >= limits["max_joins_per_day"]:
             logger.warning(
@@ -166,6 +216,39 @@ class RateLimiter:
         
         return True
 
+    def record_join(self):
+        self._record(self._joins_key())
+
+    def check_download_rate(self) -> bool:
+        """Check the hourly media download budget (separate from API calls)."""
+        current = self._count(self._downloads_key())
+        if current >= MAX_DOWNLOADS_PER_HOUR:
+            logger.warning(f"⚠️ Download rate limit reached: {current}/{MAX_DOWNLOADS_PER_HOUR} per hour")
+            return False
+        return True
+
+    def record_download(self):
+        self._record(self._downloads_key())
+
+    async def pace(self):
+        """Space consecutive outbound calls by a random interval (no wait when calls are sparse)."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self.next_call_at)
+        # Reserve the slot before sleeping so concurrent callers queue behind it
+        self.next_call_at = start + random.uniform(MIN_CALL_INTERVAL, MAX_CALL_INTERVAL)
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def pace_download(self):
+        """Same as pace() on the download lane (shorter interval, independent queue)."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self.next_download_at)
+        self.next_download_at = start + random.uniform(MIN_DOWNLOAD_INTERVAL, MAX_DOWNLOAD_INTERVAL)
+        if start > now:
+            await asyncio.sleep(start - now)
+
 
 class FloodWaitHandler:
     """Handle Telegram FloodWait errors globally."""
@@ -174,6 +257,11 @@ class FloodWaitHandler:
         self.session_name = session_name
         self.flood_key = f"flood_wait:{session_name}"
         self.current_backoff = 1  # Start with 1 second
+        self.resume_at = 0.0  # Epoch seconds, in-process copy of flood_key
+
+    def remaining(self) -> float:
+        """Seconds left of the current flood wait (no Redis call)."""
+        return max(0.0, self.resume_at - datetime.now(timezone.utc).timestamp())
     
     async def is_under_flood_wait(self) -> bool:
         """Check if account is currently under flood wait."""
@@ -209,6 +297,7 @@ class FloodWaitHandler:
         # Store in Redis
         redis = await get_redis()
         resume_time = datetime.now(timezone.utc).timestamp() + actual_wait
+        self.resume_at = resume_time
         await redis.set(self.flood_key, resume_time, ex=int(actual_wait) + 60)
         
         logger.error(f"🚫 FloodWait detected! Waiting {actual_wait:.0f}s (server requested {wait_time}s)")
@@ -228,6 +317,51 @@ class FloodWaitHandler:
                 await redis.delete(self.flood_key)
 
 
+class OutboundGuard:
+    """
+    Single gate for outbound Telegram API calls (get_chat, download_media, join).
+    Skips the call (returns default) under flood wait or over budget instead of blocking
+    the message: the caller falls back (cached title, no image...).
+    Media downloads (download=True) use their own hourly budget and pacing lane.
+    """
+
+    def __init__(self, rate_limiter: RateLimiter, flood_handler: FloodWaitHandler):
+        self.rate_limiter = rate_limiter
+        self.flood_handler = flood_handler
+
+    async def call(self, factory: Callable[[], Awaitable[Any]], name: str = "call",
+                   default: Any = None, join: bool = False, download: bool = False) -> Any:
+        """
+        Run factory() if allowed. join=True also checks / records the daily join budget,
+        download=True uses the download budget / pacing instead of the API call ones.
+        """
+        remaining = self.flood_handler.remaining()
+        if remaining > 0:
+            logger.debug(f"Skipping {name}: flood wait {remaining:.0f}s")
+            return default
+        if join and not await self.rate_limiter.check_join_rate():
+            return default
+
+        if download:
+            if not self.rate_limiter.check_download_rate():
+                return default
+            await self.rate_limiter.pace_download()
+            self.rate_limiter.record_download()
+        else:
+            if not await self.rate_limiter.check_call_rate():
+                return default
+            await self.rate_limiter.pace()
+            self.rate_limiter.record_call()
+        try:
+            result = await factory()
+        except FloodWaitError as e:
+            await self.flood_handler.handle_flood_wait(e)
+            return default
+        if join:
+            self.rate_limiter.record_join()
+        return result
+
+
 class BehaviorRandomizer:
     """Randomize behavior to mimic human activity."""
     
@@ -0,0 +1,200 @@
+"""
+BUFFERED SESSION - Telethon session giữ trong RAM, ghi đĩa theo lô
+SQLiteSession mặc định ghi entity / update state xuống file sau mỗi update (ghi nhỏ,
+đồng bộ, chạy trong event loop). BufferedSession:
+- Khi khởi động đọc file .session sẵn có (auth key, DC, entities, update state) -> resume như cũ.
+- Khi chạy: mọi thứ nằm trong MemorySession; chỉ ghi nhận entity / update state THAY ĐỔI.
+- flush() mỗi SESSION_FLUSH_INTERVAL giây: 1 transaction SQLite trong thread riêng
+  (asyncio.to_thread), event loop không chờ đĩa. Không có gì đổi thì không ghi.
+- close() (client.disconnect) ghi đồng bộ lần cuối.
+File vẫn đúng định dạng SQLiteSession nên create_session.py / Telethon thường dùng được.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession, SQLiteSession
+from telethon.tl import types
+
+from src.common.logger import get_logger
+
+logger = get_logger("session_store")
+
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "30"))  # seconds
+
+
+class BufferedSession(MemorySession):
+    """MemorySession loaded from / periodically flushed to a Telethon SQLite session file."""
+
+    def __init__(self, session_id: str):
+        super().__init__()
+        self.filename = session_id if session_id.endswith(".session") else f"{session_id}.session"
+        self._rows: Dict[int, Tuple] = {}  # id -> current row (also in self._entities)
+        self._saved_entities: Dict[int, Tuple] = {}  # id -> row as last written
+        self._dirty_entities: Dict[int, Tuple] = {}
+        self._dirty_states: Dict[int, types.updates.State] = {}
+        self._saved_header: Optional[Tuple] = None  # (dc_id, address, port, auth_key, takeout_id)
+        self._write_lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.flush_count = 0
+        self._load()
+
+    # ============ Load ============
+    def _load(self):
+        """Read the existing session file (creates / migrates the schema via SQLiteSession)."""
+        SQLiteSession(self.filename).close()
+        conn = sqlite3.connect(self.filename)
+        try:
+            row = conn.execute("select dc_id, server_address, port, auth_key, takeout_id from sessions").fetchone()
+            if row:
+                dc_id, address, port, key, takeout_id = row
+                self._dc_id, self._server_address, self._port = dc_id, address, port
+                self._auth_key = AuthKey(data=key) if key else None
+                self._takeout_id = takeout_id
+            self._saved_header = self._header()
+
+            for entity_id, entity_hash, username, phone, name, _ in conn.execute("select * from entities"):
+                entity = (entity_id, entity_hash, username, phone, name)
+                self._entities.add(entity)
+                self._rows[entity_id] = self._saved_entities[entity_id] = entity
+
+            for entity_id, pts, qts, date, seq in conn.execute("select * from update_state"):
+                self._update_states[entity_id] = types.updates.State(
+                    pts, qts, datetime.fromtimestamp(date, tz=timezone.utc), seq, unread_count=0
+                )
+        finally:
+            conn.close()
+        logger.info(
+            f"Loaded session {self.filename}: {len(self._saved_entities)} entities, "
+            f"{len(self._update_states)} update states"
+        )
+
+    # ============ In-memory changes ============
+    def _header(self) -> Tuple:
+        key = self._auth_key.key if self._auth_key else None
+        return (self._dc_id, self._server_address, self._port, key, self._takeout_id)
+
+    def process_entities(self, tlo):
+        rows = self._entities_to_rows(tlo)
+        if not rows:
+            return
+        for row in rows:
+            entity_id = row[0]
+            current = self._rows.get(entity_id)
+            if current == row:
+                continue  # Most updates repeat known entities: nothing to write
+            # MemorySession keeps a set of tuples: replace the stale row
+            if current is not None:
+                self._entities.discard(current)
+            self._entities.add(row)
+            self._rows[entity_id] = row
+            if self._saved_entities.get(entity_id) != row:
+                self._dirty_entities[entity_id] = row
+            else:
+                self._dirty_entities.pop(entity_id, None)
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self._dirty_states[entity_id] = state
+
+    def is_dirty(self) -> bool:
+        return bool(self._dirty_entities or self._dirty_states or self._header() != self._saved_header)
+
+    def save(self):
+        # Called by Telethon after auth / on some state changes: written by the next flush()
+        pass
+
+    # ============ Flush ============
+    def _take_snapshot(self):
+        """Swap dirty buffers out (event loop thread); returns data for _write()."""
+        entities, self._dirty_entities = self._dirty_entities, {}
+        states, self._dirty_states = self._dirty_states, {}
+        header = self._header()
+        return header, entities, states
+
+    def _write(self, header, entities, states):
+        """One SQLite transaction (runs in a worker thread, or synchronously in close())."""
+        now = int(time.time())
+        with self._write_lock:
+            conn = sqlite3.connect(self.filename)
+            try:
+                with conn:
+                    # Named columns: newer Telethon schemas add columns (sessions.tmp_auth_key)
+                    if header != self._saved_header:
+                        conn.execute("delete from sessions")
+                        conn.execute(
+                            "insert into sessions (dc_id, server_address, port, auth_key, takeout_id) "
+                            "values (?,?,?,?,?)", header
+                        )
+                    if entities:
+                        conn.executemany(
+                            "insert or replace into entities (id, hash, username, phone, name, date) "
+                            "values (?,?,?,?,?,?)",
+                            [(*row, now) for row in entities.values()]
+                        )
+                    if states:
+                        conn.executemany(
+                            "insert or replace into update_state (id, pts, qts, date, seq) values (?,?,?,?,?)",
+                            [(entity_id, s.pts, s.qts, int(s.date.timestamp()), s.seq)
+                             for entity_id, s in states.items()]
+                        )
+            finally:
+                conn.close()
+
+    def _mark_saved(self, header, entities):
+        self._saved_header = header
+        self._saved_entities.update(entities)
+        self.flush_count += 1
+
+    def _restore(self, entities, states):
+        """Put back what a failed flush took (newer changes win)."""
+        for entity_id, row in entities.items():
+            self._dirty_entities.setdefault(entity_id, row)
+        for entity_id, state in states.items():
+            self._dirty_states.setdefault(entity_id, state)
+
+    async def flush(self):
+        if not self.is_dirty():
+            return
+        header, entities, states = self._take_snapshot()
+        try:
+            await asyncio.to_thread(self._write, header, entities, states)
+        except Exception as e:
+            self._restore(entities, states)
+            logger.error(f"Session flush failed: {e}")
+            return
+        self._mark_saved(header, entities)
+        logger.debug(f"Session flushed: {len(entities)} entities, {len(states)} update states")
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(SESSION_FLUSH_INTERVAL)
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush_loop())
+
+    def close(self):
+        """Final synchronous write (client.disconnect / shutdown)."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        if self.is_dirty():
+            header, entities, states = self._take_snapshot()
+            try:
+                self._write(header, entities, states)
+                self._mark_saved(header, entities)
+            except Exception as e:
+                logger.error(f"Session final flush failed: {e}")
+
+    def delete(self):
+        super().delete()
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
@@ -6,6 +6,7 @@ from datetime import datetime
 import pytz # Cần pip install pytz
 from src.common.config import settings
 from src.common.logger import logger
+from src.common.ai_gateway import ai_gateway, AIUnavailableError
 from src.common.template_registry import get_template_config
 
 class AIEngine:
@@ -91,7 +92,8 @@ class AIEngine:
                 response_mime_type="application/json" # Ép Gemini trả về JSON Mode (tính năng mới)
             )
 
-            response = await self.model.generate_content_async(
+            response = await ai_gateway.generate_content(
+                self.model,
                 system_prompt, 
                 generation_config=generation_config
             )
@@ -128,6 +130,9 @@ class AIEngine:
 
             return data
             
+        except AIUnavailableError as e:
+            logger.warning(f"AI unavailable for {template_code}: {e}")
+            return None
         except json.JSONDecodeError as e:
             logger.error(f"AI JSON Decode Error for {template_code}: {e} | Raw: {raw_text[:100]}...")
             return None
@@ -141,8 +146,11 @@ class AIEngine:
         """
         if not self.model: return ""
         try:
-            response = await self.model.generate_content_async(prompt)
+            response = await ai_gateway.generate_content(self.model, prompt)
             return response.text.strip()
+        except AIUnavailableError as e:
+            logger.debug(f"AI unavailable, skipping generation: {e}")
+            return ""
         except Exception as e:
             logger.error(f"AI Generation failed: {e}")
             return ""
@@ -177,8 +185,11 @@ class AIEngine:
             """
 
         try:
-            response = await self.model.generate_content_async(prompt)
+            response = await ai_gateway.generate_content(self.model, prompt)
             return response.text.strip()
+        except AIUnavailableError as e:
+            logger.debug(f"AI unavailable, skipping analysis: {e}")
+            return "AI Analysis Unavailable"
         except Exception as e:
             logger.error(f"AI Analysis failed: {e}")
             return "AI Analysis Failed"
@@ -191,8 +202,11 @@ class AIEngine:
         try:
             img = PIL.Image.open(image_path)
             prompt = "Extract details: Token, Entry, TP, SL, Direction (Long/Short). Return just text."
-            response = await self.model.generate_content_async([prompt, img])
+            response = await ai_gateway.generate_content(self.model, [prompt, img])
             return response.text.strip()
+        except AIUnavailableError as e:
+            logger.debug(f"AI unavailable, skipping OCR: {e}")
+            return ""
         except Exception as e:
             logger.error(f"AI OCR failed: {e}")
             return ""
@@ -5,16 +5,21 @@ from sqlalchemy import select
 from src.common.logger import logger
 from src.common.redis_client import get_redis
 from src.database.db import AsyncSessionLocal
-from src.database.models import AnalysisTemplate
+from src.database.models import AnalysisTemplate, UserTemplateSubscription
 from src.worker.ai_engine import AIEngine
 from src.worker.visualizer import visualizer
 
 # Initialize AI Engine locally for worker usage
 ai_engine = AIEngine()
 
+# Cache danh sách tag đang có template được subscribe (giây)
+CONSUMED_TAGS_TTL = 60
+
 class TemplateProcessor:
     def __init__(self):
         self.redis = None
+        self._consumed_tags = set()
+        self._consumed_tags_at = 0.0
 
     async def get_redis_conn(self):
         if not self.redis:
@@ -101,13 +106,16 @@ class TemplateProcessor:
             "data": report_data
         }
 
-    async def buffer_message(self, tag: str, message_data: dict):
+    async def buffer_message(self, tag: str, message_data: dict, timestamp: float = None) -> tuple:
         """
         Store message in Redis buffer for later analysis.
+        timestamp: score (default now; backfilled messages use their original date).
+        Returns (member, score) so the entry can be replaced after enrichment.
         """
         redis = await self.get_redis_conn()
         key = f"analysis_buffer:{tag}"
-        timestamp = time.time()
+        if timestamp is None:
+            timestamp = time.time()
         
         # Store as JSON
         member = json.dumps(message_data)
@@ -117,6 +125,47 @@ class TemplateProcessor:
         
         # Set expiry (e.g., 24 hours) to prevent infinite growth
         await redis.expire(key, 86400)
+        return member, timestamp
+
+    async def replace_buffered(self, tag: str, old_member: str, message_data: dict, score: float):
+        """
+        Replace a buffered raw message with its enriched version (same timestamp).
+        """
+        redis = await self.get_redis_conn()
+        key = f"analysis_buffer:{tag}"
+        pipe = redis.pipeline(transaction=True)
+        pipe.zrem(key, old_member)
+        pipe.zadd(key, {json.dumps(message_data): score})
+        await pipe.execute()
+
+    async def get_consumed_tags(self) -> set:
+        """
+        Tags required by at least one subscribed template (cached CONSUMED_TAGS_TTL seconds).
+        Only these buffers are worth enriching.
+        """
+        if time.monotonic() - self._consumed_tags_at < CONSUMED_TAGS_TTL:
+            return self._consumed_tags
+
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(AnalysisTemplate.required_tags)
+                    .join(UserTemplateSubscription, UserTemplateSubscription.template_code == AnalysisTemplate.code)
+                )
+                tags = set()
+                for required_tags in result.scalars().all():
+                    if isinstance(required_tags, str):
+                        try:
+                            required_tags = json.loads(required_tags)
+                        except:
+                            required_tags = []
+                    tags.update(required_tags or [])
+            self._consumed_tags = tags
+        except Exception as e:
+            logger.error(f"Failed to load consumed tags: {e}")
+
+        self._consumed_tags_at = time.monotonic()
+        return self._consumed_tags
 
 template_processor = TemplateProcessor()
 
@@ -0,0 +1,167 @@
+"""
+KEYWORD BACKTEST
+Chạy thử 1 FilterRule (keyword hoặc truy vấn AND/OR/NOT/NEAR, cùng logic check_keywords
+của worker) trên lịch sử:
+- crypto_news N ngày gần nhất (stream theo lô, partition-pruned theo created_at)
+- analysis_buffer:* trong Redis (tin raw đã buffer cho template)
+
+Regex matching chạy trong ProcessPoolExecutor nên không block event loop của bot.
+Kết quả được stream: mỗi lô trả về 1 BacktestProgress (đã quét, số match, theo ngày, mẫu).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from src.common.logger import get_logger
+from src.common.redis_client import get_redis
+from src.database.db import AsyncSessionLocal
+from src.database.models import CryptoNews
+from src.worker.filter_engine import FilterRule, MessageProcessor
+from src.worker.news_archiver import ARCHIVE_AFTER_DAYS
+
+logger = get_logger("backtest")
+
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", "2"))
+BACKTEST_CHUNK_SIZE = int(os.getenv("BACKTEST_CHUNK_SIZE", "5000"))
+# crypto_news chỉ giữ ARCHIVE_AFTER_DAYS ngày (cũ hơn đã sang news_archive, không còn text)
+BACKTEST_MAX_DAYS = min(30, ARCHIVE_AFTER_DAYS)
+SAMPLE_LIMIT = 5
+
+# (timestamp, source name, text)
+HistoryRow = Tuple[float, str, str]
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Lazy process pool (shared by all backtests in this process)."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max(1, BACKTEST_WORKERS))
+    return _executor
+
+
+def match_chunk(must_have: List[str], must_not_have: List[str], rows: List[HistoryRow],
+                query: Optional[str] = None) -> List[int]:
+    """Runs in a worker process. Returns indexes of rows matching the rule."""
+    rule = FilterRule(id=0, user_id=0, must_have=[] if query else must_have,
+                      must_not_have=must_not_have, query=query)
+    processor = MessageProcessor()
+    return [
+        i for i, (_, _, text) in enumerate(rows)
+        if processor.check_keywords(processor.normalize_text(text), rule)
+    ]
+
+
+class BacktestProgress:
+    """Kết quả tích lũy, cập nhật sau mỗi lô."""
+    __slots__ = ("scanned", "matches", "per_day", "samples", "days", "done", "elapsed")
+
+    def __init__(self, days: int):
+        self.days = days
+        self.scanned = 0
+        self.matches = 0
+        self.per_day: Dict[str, int] = {}
+        self.samples: List[dict] = []
+        self.done = False
+        self.elapsed = 0.0
+
+    @property
+    def matches_per_day(self) -> float:
+        return self.matches / max(self.days, 1)
+
+
+class KeywordBacktester:
+    """Stream history in chunks and match them in the process pool."""
+
+    async def iter_history(self, days: int) -> AsyncIterator[List[HistoryRow]]:
+        """Yield chunks of (timestamp, source, text), deduplicated across DB and Redis buffers."""
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        seen = set()
+
+        def fresh(text: str) -> bool:
+            key = hashlib.md5(" ".join(text.lower().split())[:300].encode()).digest()
+            if key in seen:
+                return False
+            seen.add(key)
+            return True
+
+        # 1. Redis buffers (freshest raw messages)
+        redis = await get_redis()
+        chunk: List[HistoryRow] = []
+        async for key in redis.scan_iter(match="analysis_buffer:*", count=100):
+            entries = await redis.zrangebyscore(key, since.timestamp(), "+inf", withscores=True)
+            for member, score in entries:
+                try:
+                    data = json.loads(member)
+                except json.JSONDecodeError:
+                    continue
+                text = data.get("text", "")
+                if text and fresh(text):
+                    chunk.append((score, data.get("chat_title", "Buffer"), text))
+        if chunk:
+            yield chunk
+
+        # 2. crypto_news (server-side cursor, no full materialization)
+        stmt = (
+            select(
+                CryptoNews.created_at,
+                CryptoNews.source_name,
+                func.coalesce(CryptoNews.text_full, CryptoNews.text_summary),
+            )
+            .where(CryptoNews.created_at >= since)
+            .execution_options(yield_per=BACKTEST_CHUNK_SIZE)
+        )
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(stmt)
+            async for partition in result.partitions(BACKTEST_CHUNK_SIZE):
+                chunk = [
+                    (created_at.timestamp(), source_name, text)
+                    for created_at, source_name, text in partition
+                    if text and fresh(text)
+                ]
+                if chunk:
+                    yield chunk
+
+    async def run(self, keyword: str, days: int = 7, must_not_have: Optional[List[str]] = None,
+                  query: Optional[str] = None) -> AsyncIterator[BacktestProgress]:
+        """Backtest 1 keyword (or query). Yields the same BacktestProgress after every chunk (done=True last)."""
+        days = max(1, min(days, BACKTEST_MAX_DAYS))
+        must_not_have = must_not_have or []
+        progress = BacktestProgress(days)
+        loop = asyncio.get_running_loop()
+        executor = get_executor()
+        started = time.monotonic()
+
+        async for chunk in self.iter_history(days):
+            hits = await loop.run_in_executor(executor, match_chunk, [keyword], must_not_have, chunk, query)
+
+            progress.scanned += len(chunk)
+            progress.matches += len(hits)
+            for i in hits:
+                ts, source, text = chunk[i]
+                day = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+                progress.per_day[day] = progress.per_day.get(day, 0) + 1
+                if len(progress.samples) < SAMPLE_LIMIT:
+                    progress.samples.append({"source": source, "text": text[:200], "day": day})
+
+            progress.elapsed = time.monotonic() - started
+            yield progress
+
+        progress.done = True
+        progress.elapsed = time.monotonic() - started
+        logger.info(
+            f"Backtest '{keyword}' over {days}d: {progress.matches}/{progress.scanned} matches "
+            f"in {progress.elapsed:.2f}s"
+        )
+        yield progress
+
+
+keyword_backtester = KeywordBacktester()
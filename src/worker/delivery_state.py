@@ -0,0 +1,176 @@
+"""
+DELIVERY STATE - Quota FREE user + dedup per-user, dạng compact
+Thay cho hàng triệu key nhỏ (notif_count:{user}:{date}, dedup:msg:{user}:{hash}):
+
+- Quota: 1 hash / ngày  notif_count:{date} -> {user_id: count}, 1 TTL.
+  Local-first: đếm trong RAM (load từ Redis lần đầu gặp user trong ngày), ghi Redis
+  theo kiểu write-behind mỗi QUOTA_FLUSH_INTERVAL giây (HINCRBY delta trong 1 pipeline).
+  User đã hết quota trong ngày bị chặn ngay trong RAM, không round-trip Redis.
+  Giả định 1 worker process (pm2 instances: 1); nhiều process thì có thể vượt quota 1 chút.
+
+- Dedup: bloom filter theo giờ trên Redis bitmap  dedup:bloom:{YYYYMMDDHH}
+  (DEDUP_BLOOM_BITS bit, k hash). Check giờ hiện tại + giờ trước => cửa sổ 1-2h.
+  Bộ nhớ cố định (~2MB/giờ với 2^24 bit), false positive ~0.1% ở 1 triệu lượt/giờ.
+"""
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from src.common.logger import get_logger
+from src.common.redis_client import get_redis
+
+logger = get_logger("delivery_state")
+
+QUOTA_KEY_PREFIX = "notif_count:"
+QUOTA_TTL = 86400 * 2
+QUOTA_FLUSH_INTERVAL = float(os.getenv("QUOTA_FLUSH_INTERVAL", "5"))
+
+BLOOM_KEY_PREFIX = "dedup:bloom:"
+BLOOM_BITS = int(os.getenv("DEDUP_BLOOM_BITS", str(2 ** 24)))
+BLOOM_HASHES = int(os.getenv("DEDUP_BLOOM_HASHES", "7"))
+BLOOM_TTL = 3 * 3600
+
+# KEYS = [current hour, previous hour] | ARGV = bit offsets
+# 1 nếu mọi bit đã set ở 1 trong 2 key (đã gửi), ngược lại 0
+BLOOM_CHECK_LUA = """
+for _, key in ipairs(KEYS) do
+    local all_set = true
+    for _, offset in ipairs(ARGV) do
+        if redis.call('GETBIT', key, offset) == 0 then
+            all_set = false
+            break
+        end
+    end
+    if all_set then
+        return 1
+    end
+end
+return 0
+"""
+
+# KEYS = [current hour] | ARGV = [ttl, offsets...]
+BLOOM_ADD_LUA = """
+for i = 2, #ARGV do
+    redis.call('SETBIT', KEYS[1], ARGV[i], 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def bloom_offsets(user_id: int, msg_hash: str) -> List[int]:
+    """k bit positions via double hashing of sha256(user:hash)."""
+    digest = hashlib.sha256(f"{user_id}:{msg_hash}".encode()).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:16], "big") | 1
+    return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+
+class DeliveryState:
+    """Daily FREE quota (local-first, write-behind) + hourly bloom dedup."""
+
+    def __init__(self):
+        self._day = None
+        self._counts: Dict[int, int] = {}
+        self._pending: Dict[int, int] = {}
+        self._lock = asyncio.Lock()
+        self._check_script = None
+        self._add_script = None
+
+    # ============ Quota ============
+    async def _roll_day(self, today: str):
+        if self._day != today:
+            # Swap before any await: increments made from now on belong to the new day
+            old_day, old_pending = self._day, self._pending
+            self._day, self._pending = today, {}
+            self._counts.clear()
+            if old_day is not None and old_pending:
+                await self._write(old_day, old_pending)
+
+    async def consume_quota(self, user_id: int, limit: int) -> bool:
+        """Count one delivery for user today. False if the daily limit is reached."""
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        await self._roll_day(today)
+
+        count = self._counts.get(user_id)
+        if count is None:
+            # First time this user is seen today (e.g. after restart): load persisted count
+            redis = await get_redis()
+            count = int(await redis.hget(f"{QUOTA_KEY_PREFIX}{today}", user_id) or 0)
+            count += self._pending.get(user_id, 0)
+            self._counts[user_id] = count
+
+        if count >= limit:
+            return False
+
+        self._counts[user_id] = count + 1
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        return True
+
+    async def _write(self, day: str, pending: Dict[int, int]) -> bool:
+        """HINCRBY deltas into notif_count:{day} + 1 EXPIRE. False on failure."""
+        key = f"{QUOTA_KEY_PREFIX}{day}"
+        try:
+            redis = await get_redis()
+            pipe = redis.pipeline(transaction=False)
+            for user_id, delta in pending.items():
+                pipe.hincrby(key, user_id, delta)
+            pipe.expire(key, QUOTA_TTL)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Quota flush for {day} failed: {e}")
+            return False
+
+    async def flush(self):
+        """Write pending quota increments; failed ones are retried only while their day is current."""
+        async with self._lock:
+            if not self._pending or self._day is None:
+                return
+            day, pending = self._day, self._pending
+            self._pending = {}
+            if await self._write(day, pending):
+                return
+            if self._day == day:
+                for user_id, delta in pending.items():
+                    self._pending[user_id] = self._pending.get(user_id, 0) + delta
+            else:
+                # Never carried into the new day's key (would eat users' fresh quota)
+                logger.warning(f"Dropped {sum(pending.values())} unflushed quota increments of {day}")
+
+    async def run(self):
+        """Write-behind loop."""
+        logger.info(f"Delivery state flusher started (every {QUOTA_FLUSH_INTERVAL}s)")
+        while True:
+            await asyncio.sleep(QUOTA_FLUSH_INTERVAL)
+            await self.flush()
+
+    # ============ Dedup ============
+    @staticmethod
+    def _bloom_keys() -> List[str]:
+        now = datetime.utcnow()
+        return [
+            f"{BLOOM_KEY_PREFIX}{now:%Y%m%d%H}",
+            f"{BLOOM_KEY_PREFIX}{now - timedelta(hours=1):%Y%m%d%H}",
+        ]
+
+    async def is_duplicate(self, user_id: int, msg_hash: str) -> bool:
+        redis = await get_redis()
+        if self._check_script is None:
+            self._check_script = redis.register_script(BLOOM_CHECK_LUA)
+        return bool(await self._check_script(keys=self._bloom_keys(), args=bloom_offsets(user_id, msg_hash)))
+
+    async def mark_delivered(self, user_id: int, msg_hash: str):
+        redis = await get_redis()
+        if self._add_script is None:
+            self._add_script = redis.register_script(BLOOM_ADD_LUA)
+        await self._add_script(
+            keys=self._bloom_keys()[:1],
+            args=[BLOOM_TTL, *bloom_offsets(user_id, msg_hash)]
+        )
+
+
+# Singleton instance
+delivery_state = DeliveryState()
@@ -1,8 +1,49 @@
 import re
 import hashlib
-from typing import List, Optional, Set, Pattern
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Pattern
 from pydantic import BaseModel, Field
 from cachetools import TTLCache
+from src.common.text_norm import clean_lower, fold, get_norm
+from src.worker.query_parser import parse_query, positive_terms
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def is_user_regex(keyword: str) -> bool:
+    """User typed a regex on purpose (contains . * + ? ...)."""
+    return any(c in keyword for c in r".^*+?{}[]\|()")
+
+
+def create_regex(keyword: str) -> Pattern:
+    """
+    Tạo regex thông minh:
+    - Xử lý đúng boundary cho từ thường và từ có ký tự đặc biệt ($BTC).
+    - Hỗ trợ user nhập regex trực tiếp nếu muốn.
+    """
+    # Nếu user cố tình nhập regex phức tạp (có chứa . * + ? ...)
+    if is_user_regex(keyword):
+        try:
+            return re.compile(keyword, re.IGNORECASE)
+        except re.error:
+            # Fallback về text thường nếu regex lỗi
+            pass
+
+    escaped_kw = re.escape(keyword)
+    
+    # LOGIC QUAN TRỌNG:
+    # Nếu keyword bắt đầu bằng ký tự từ (a-z, 0-9), dùng \b phía trước.
+    # Nếu keyword bắt đầu bằng symbol ($, #, @), dùng (?:^|\s) để bắt khoảng trắng.
+    # Kiểm tra ký tự đầu tiên
+    first_char = keyword[0] if keyword else ''
+    last_char = keyword[-1] if keyword else ''
+    
+    prefix = r'\b' if first_char.isalnum() or first_char == '_' else r'(?:^|\s)'
+    suffix = r'\b' if last_char.isalnum() or last_char == '_' else r'(?:\s|$)'
+    
+    return re.compile(f"{prefix}{escaped_kw}{suffix}", re.IGNORECASE)
+
 
 class FilterRule(BaseModel):
     """
@@ -13,10 +54,17 @@ class FilterRule(BaseModel):
     must_have: List[str] = Field(default_factory=list, description="Danh sách từ khóa BẮT BUỘC phải có (OR logic)")
     must_not_have: List[str] = Field(default_factory=list, description="Danh sách từ khóa KHÔNG được có")
     source_channels: Optional[List[int]] = Field(None, description="Chỉ lọc từ các channel ID này (None = tất cả)")
+    query: Optional[str] = Field(None, description="Truy vấn AND/OR/NOT/NEAR (query_parser), thay cho must_have")
 
     # Cache pre-compiled regex để tăng tốc độ (Không lưu vào DB, chỉ dùng runtime)
     _compiled_must_have: List[Pattern] = []
     _compiled_must_not_have: List[Pattern] = []
+    _source_set: Optional[frozenset] = None
+    # Bit của các must_not_have trong TermSet dùng chung (set bởi rule index)
+    _exclude_mask: int = 0
+    # Plan compile trên TermSet (bind_rule): rule index bind vào TermSet dùng chung
+    _plan = None
+    _terms = None
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -28,36 +76,14 @@ class FilterRule(BaseModel):
         """
         self._compiled_must_have = [self._create_regex(k) for k in self.must_have]
         self._compiled_must_not_have = [self._create_regex(k) for k in self.must_not_have]
+        self._source_set = frozenset(self.source_channels) if self.source_channels else None
+        if self.query:
+            # Standalone (backtest...): TermSet riêng, rule index sẽ bind lại vào TermSet chung
+            bind_rule(self, TermSet())
 
     def _create_regex(self, keyword: str) -> Pattern:
-        """
-        Tạo regex thông minh:
-        - Xử lý đúng boundary cho từ thường và từ có ký tự đặc biệt ($BTC).
-        - Hỗ trợ user nhập regex trực tiếp nếu muốn.
-        """
-        # Nếu user cố tình nhập regex phức tạp (có chứa . * + ? ...)
-        is_user_regex = any(c in keyword for c in r".^*+?{}[]\|()")
-        
-        if is_user_regex:
-            try:
-                return re.compile(keyword, re.IGNORECASE)
-            except re.error:
-                # Fallback về text thường nếu regex lỗi
-                pass
-
-        escaped_kw = re.escape(keyword)
-        
-        # LOGIC QUAN TRỌNG:
-        # Nếu keyword bắt đầu bằng ký tự từ (a-z, 0-9), dùng \b phía trước.
-        # Nếu keyword bắt đầu bằng symbol ($, #, @), dùng (?:^|\s) để bắt khoảng trắng.
-        # Kiểm tra ký tự đầu tiên
-        first_char = keyword[0] if keyword else ''
-        last_char = keyword[-1] if keyword else ''
-        
-        prefix = r'\b' if first_char.isalnum() or first_char == '_' else r'(?:^|\s)'
-        suffix = r'\b' if last_char.isalnum() or last_char == '_' else r'(?:\s|$)'
-        
-        return re.compile(f"{prefix}{escaped_kw}{suffix}", re.IGNORECASE)
+        # Match trên text đã bỏ dấu -> keyword cũng bỏ dấu ("đầu tư" khớp "dau tu")
+        return create_regex(fold(keyword))
 
     class Config:
         # Cho phép lưu private attributes (_compiled_...)
@@ -65,6 +91,237 @@ class FilterRule(BaseModel):
         # Pydantic V2 compatibility (if needed, but Config is V1 style)
         extra = "ignore" 
 
+def iter_bits(mask: int):
+    """Indexes of the set bits of a bitset."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class TermSet:
+    """
+    Bảng term dùng chung cho mọi rule: mỗi term (đã dedup) compile 1 lần, quét 1 lần / tin nhắn.
+    scan() trả về bitset (int) các term có trong tin; rule chỉ cần AND với mask của nó.
+
+    Prefilter theo từ: mỗi term thường có 1 "từ neo" (đoạn \w+ dài nhất, vd "$btc" -> "btc",
+    "hidden gem" -> "hidden"); term chỉ có thể khớp nếu từ neo là 1 từ của tin. scan() tra
+    dict từ -> bitset nên chỉ chạy regex cho vài term ứng viên thay vì toàn bộ bảng.
+    Regex do user nhập không có từ neo -> luôn chạy.
+    """
+    def __init__(self, terms: Iterable[str] = ()):
+        self._bits: Dict[str, int] = {}
+        self._patterns: List[Pattern] = []
+        self._by_word: Dict[str, int] = {}  # từ neo -> bitset term
+        self._always = 0  # term không có từ neo
+        for term in terms:
+            self.mask([term])
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def mask(self, terms: Iterable[str]) -> int:
+        """Bitset of the given terms (registered on first use)."""
+        mask = 0
+        for term in terms:
+            bit = self._bits.get(term)
+            if bit is None:
+                bit = len(self._patterns)
+                folded = fold(term)
+                self._bits[term] = bit
+                self._patterns.append(create_regex(folded))
+                words = [] if is_user_regex(folded) else _WORD_RE.findall(folded.lower())
+                if words:
+                    anchor = max(words, key=len)
+                    self._by_word[anchor] = self._by_word.get(anchor, 0) | (1 << bit)
+                else:
+                    self._always |= 1 << bit
+            mask |= 1 << bit
+        return mask
+
+    def pattern(self, term: str) -> Pattern:
+        """Compiled pattern of a registered term."""
+        return self._patterns[self._bits[term]]
+
+    def scan(self, normalized_text: str) -> int:
+        """Bitset of the terms found in the text."""
+        if not self._patterns:
+            return 0
+        candidates = self._always
+        by_word = self._by_word
+        for word in set(_WORD_RE.findall(normalized_text)):
+            bits = by_word.get(word)
+            if bits:
+                candidates |= bits
+        hits = 0
+        for bit in iter_bits(candidates):
+            if self._patterns[bit].search(normalized_text):
+                hits |= 1 << bit
+        return hits
+
+
+class QueryPlan:
+    """
+    Rule compile trên TermSet:
+    - trigger: bitset, phải có ít nhất 1 bit trong tin thì rule mới có thể khớp
+    - evaluate(hits, text): biểu thức đầy đủ, None = trigger là đủ (rule OR đơn giản)
+    """
+    __slots__ = ("trigger", "evaluate")
+
+    def __init__(self, trigger: int, evaluate=None):
+        self.trigger = trigger
+        self.evaluate = evaluate
+
+
+def _word_spans(pattern: Pattern, text: str) -> List[tuple]:
+    """(first word index, last word index) of every match in a normalized (single-spaced) text."""
+    spans = []
+    for m in pattern.finditer(text):
+        matched = m.group(0)
+        stripped = matched.strip()
+        if not stripped:
+            continue
+        start = text.count(" ", 0, m.start() + len(matched) - len(matched.lstrip()))
+        spans.append((start, start + stripped.count(" ")))
+    return spans
+
+
+def _is_near(pattern_a: Pattern, pattern_b: Pattern, distance: int, text: str) -> bool:
+    spans_b = _word_spans(pattern_b, text)
+    for a_start, a_end in _word_spans(pattern_a, text):
+        for b_start, b_end in spans_b:
+            # Number of words between the two matches (either order)
+            gap = b_start - a_end - 1 if b_start > a_end else a_start - b_end - 1
+            if gap <= distance:
+                return True
+    return False
+
+
+def _compile_node(node, terms: TermSet):
+    """AST -> evaluate(hits, text). Term-only AND/OR children collapse into 1 mask check."""
+    kind = node[0]
+    if kind == "term":
+        bit = terms.mask([node[1]])
+        return lambda hits, text: bool(hits & bit)
+
+    if kind == "not":
+        inner = _compile_node(node[1], terms)
+        return lambda hits, text: not inner(hits, text)
+
+    if kind == "near":
+        distance, term_a, term_b = node[1], node[2], node[3]
+        both = terms.mask([term_a, term_b])
+        pattern_a, pattern_b = terms.pattern(term_a), terms.pattern(term_b)
+        # Position check only runs when both terms are in the message
+        return lambda hits, text: (hits & both) == both and _is_near(pattern_a, pattern_b, distance, text)
+
+    children = node[1]
+    mask = terms.mask([c[1] for c in children if c[0] == "term"])
+    others = [_compile_node(c, terms) for c in children if c[0] != "term"]
+    if kind == "and":
+        if not others:
+            return lambda hits, text: (hits & mask) == mask
+        return lambda hits, text: (hits & mask) == mask and all(f(hits, text) for f in others)
+    # or
+    if not others:
+        return lambda hits, text: bool(hits & mask)
+    return lambda hits, text: bool(hits & mask) or any(f(hits, text) for f in others)
+
+
+def compile_query(node, terms: TermSet) -> QueryPlan:
+    """Compile a parsed query (query_parser AST) against a shared TermSet."""
+    evaluate = _compile_node(node, terms)
+    trigger = terms.mask(positive_terms(node) or [])
+    # Pure OR of terms: trigger hit == match
+    if node[0] == "term" or (node[0] == "or" and all(c[0] == "term" for c in node[1])):
+        evaluate = None
+    return QueryPlan(trigger, evaluate)
+
+
+def bind_rule(rule: FilterRule, terms: TermSet):
+    """Register the rule's terms in a TermSet and compile its plan (query or must_have OR)."""
+    rule._terms = terms
+    rule._exclude_mask = terms.mask(rule.must_not_have)
+    if rule.query:
+        rule._plan = compile_query(parse_query(rule.query), terms)
+    elif rule.must_have:
+        rule._plan = QueryPlan(terms.mask(rule.must_have))
+    else:
+        rule._plan = None
+
+
+class CompactRule:
+    """
+    Rule đã compile cho rule index: không pydantic, không validation, không regex riêng.
+    Chỉ giữ id, bitset trên TermSet dùng chung và plan (nếu là truy vấn).
+    """
+    __slots__ = ("id", "user_id", "keyword", "sources", "trigger", "exclude_mask", "evaluate")
+
+    def __init__(self, rule_id: int, user_id: int, keyword: str, sources: Optional[frozenset],
+                 trigger: int, exclude_mask: int, evaluate=None):
+        self.id = rule_id
+        self.user_id = user_id
+        self.keyword = keyword
+        self.sources = sources  # None = mọi nguồn
+        self.trigger = trigger
+        self.exclude_mask = exclude_mask
+        self.evaluate = evaluate  # None = trigger là đủ
+
+
+def compile_rule(rule_id: int, user_id: int, keyword: str, terms: TermSet,
+                 must_not_have: Optional[List[str]] = None,
+                 source_channels: Optional[List[int]] = None,
+                 query: Optional[str] = None) -> CompactRule:
+    """Build a CompactRule on a shared TermSet. Raises QueryError for an invalid query."""
+    if query:
+        plan = compile_query(parse_query(query), terms)
+        trigger, evaluate = plan.trigger, plan.evaluate
+    else:
+        trigger, evaluate = terms.mask([keyword]), None
+    return CompactRule(
+        rule_id, user_id, keyword,
+        frozenset(int(c) for c in source_channels) if source_channels else None,
+        trigger,
+        terms.mask(must_not_have) if must_not_have else 0,
+        evaluate,
+    )
+
+
+class PostingIndex:
+    """
+    Posting list: term bit -> mảng int đã sort (array('I')) vị trí các rule có term đó trong trigger.
+    1 term phổ biến (preset, $BTC...) = 1 regex + 1 posting list, fan-out tới mọi subscriber.
+    """
+    __slots__ = ("rules", "postings")
+
+    def __init__(self, rules: List[CompactRule]):
+        self.rules = rules
+        lists: Dict[int, List[int]] = {}
+        for position, rule in enumerate(rules):
+            for bit in iter_bits(rule.trigger):
+                lists.setdefault(bit, []).append(position)
+        self.postings: Dict[int, array] = {bit: array("I", positions) for bit, positions in lists.items()}
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def candidates(self, hits: int) -> List[CompactRule]:
+        """Union of the posting lists of the hit terms (rule order preserved)."""
+        postings = self.postings
+        hit_lists = [postings[bit] for bit in iter_bits(hits) if bit in postings]
+        if not hit_lists:
+            return []
+        if len(hit_lists) == 1:
+            positions = hit_lists[0]
+        else:
+            merged = set()
+            for positions in hit_lists:
+                merged.update(positions)
+            positions = sorted(merged)
+        rules = self.rules
+        return [rules[i] for i in positions]
+
+
 class MessageProcessor:
     """
     Core logic xử lý và lọc tin nhắn.
@@ -76,22 +333,13 @@ class MessageProcessor:
 
     def normalize_text(self, text: str) -> str:
         """
-        Chuẩn hóa văn bản:
-        - Chuyển về lowercase.
-        - Giữ lại chữ cái, số, khoảng trắng và các ký tự quan trọng cho crypto ($, #, @).
+        Chuẩn hóa văn bản (dạng dùng để match, xem src/common/text_norm.py):
+        - Chuyển về lowercase, bỏ dấu tiếng Việt.
+        - Giữ lại chữ cái, số, khoảng trắng và các ký tự quan trọng cho crypto ($, #, @, ., -).
         - Xóa các ký tự đặc biệt khác gây nhiễu.
+        Tin từ queue đã có sẵn dạng này trong envelope: dùng get_norm(message)["folded"].
         """
-        if not text:
-            return ""
-        
-        text = text.lower()
-        # Giữ lại a-z, 0-9, khoảng trắng, $, #, @, ., -
-        # Thay thế các ký tự khác bằng khoảng trắng để tránh dính từ
-        # UPDATE: Dùng \w để hỗ trợ tiếng Việt và các ngôn ngữ khác
-        text = re.sub(r'[^\w\s$#@.-]', ' ', text)
-        # Xóa khoảng trắng thừa
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        return fold(clean_lower(text))
 
     def _generate_hash(self, text: str) -> str:
         """Tạo hash MD5 cho text để check trùng."""
@@ -107,30 +355,82 @@ class MessageProcessor:
         self._dedup_cache[msg_hash] = True
         return False
 
+    def check_must_have(self, normalized_text: str, rule: FilterRule) -> bool:
+        """OR logic over the rule's must_have patterns (no must_have = pass)."""
+        if not rule._compiled_must_have:
+            return True
+        for pattern in rule._compiled_must_have:
+            if pattern.search(normalized_text):
+                return True
+        return False
+
+    def match_rule(self, normalized_text: str, hits: int, rule: FilterRule) -> bool:
+        """Evaluate a bound rule over the term-hit bitset of the message (TermSet.scan)."""
+        if rule._exclude_mask & hits:
+            return False
+        plan = rule._plan
+        if plan is None:
+            return self.check_must_have(normalized_text, rule)
+        if not hits & plan.trigger:
+            return False
+        return plan.evaluate is None or plan.evaluate(hits, normalized_text)
+
+    @staticmethod
+    def match_compact(normalized_text: str, hits: int, chat_id: Optional[int],
+                      rules: Iterable[CompactRule]) -> List[CompactRule]:
+        """Hot path: CompactRule list over the term-hit bitset (cheapest test first)."""
+        matched = []
+        for rule in rules:
+            if not hits & rule.trigger:
+                continue
+            if rule.sources is not None and chat_id not in rule.sources:
+                continue
+            if hits & rule.exclude_mask:
+                continue
+            if rule.evaluate is None or rule.evaluate(hits, normalized_text):
+                matched.append(rule)
+        return matched
+
+    def match_postings(self, raw_message: dict, indexes: List[PostingIndex], terms: TermSet) -> List[CompactRule]:
+        """
+        Hot path của worker: quét term 1 lần, lấy rule ứng viên từ posting list (union),
+        rồi chỉ kiểm tra nguồn / loại trừ / biểu thức trên các ứng viên.
+        """
+        if not raw_message.get("text"):
+            return []
+        normalized_text = get_norm(raw_message)["folded"]
+        hits = terms.scan(normalized_text)
+        if not hits:
+            return []
+        chat_id = raw_message.get("chat_id")
+        matched = []
+        for index in indexes:
+            matched.extend(self.match_compact(normalized_text, hits, chat_id, index.candidates(hits)))
+        return matched
+
     def check_keywords(self, normalized_text: str, rule: FilterRule) -> bool:
         """
         Kiểm tra khớp rule cực nhanh nhờ pre-compiled regex.
         """
+        # Rule dạng truy vấn: đánh giá plan trên TermSet mà rule được bind
+        if rule.query and rule._terms is not None:
+            return self.match_rule(normalized_text, rule._terms.scan(normalized_text), rule)
+
         # 1. Check Must Not Have (Fail fast)
         for pattern in rule._compiled_must_not_have:
             if pattern.search(normalized_text):
                 return False
 
-        # 2. Check Must Have
-        if not rule._compiled_must_have:
-            return True # Pass nếu không có điều kiện
-
-        # OR Logic: Chỉ cần 1 pattern khớp là được
-        for pattern in rule._compiled_must_have:
-            if pattern.search(normalized_text):
-                return True
-
-        return False
+        # 2. Check Must Have (OR Logic: Chỉ cần 1 pattern khớp là được)
+        return self.check_must_have(normalized_text, rule)
 
-    def process_incoming_message(self, raw_message: dict, user_rules_list: List[FilterRule]) -> List[FilterRule]:
+    def process_incoming_message(self, raw_message: dict, user_rules_list: List[FilterRule],
+                                 terms: Optional[TermSet] = None) -> List[FilterRule]:
         """
         Xử lý luồng chính cho một tin nhắn.
         Trả về danh sách các Rule khớp (để Bot biết gửi cho ai).
+        terms: TermSet dùng chung của rule index; khi có terms, user_rules_list là CompactRule
+        (compile_rule) -> quét term 1 lần / tin, mỗi rule chỉ còn phép toán trên bitset.
         """
         raw_text = raw_message.get("text", "")
         chat_id = raw_message.get("chat_id")
@@ -138,8 +438,8 @@ class MessageProcessor:
         if not raw_text:
             return []
 
-        # 1. Chuẩn hóa
-        normalized_text = self.normalize_text(raw_text)
+        # 1. Chuẩn hóa (đã làm 1 lần ở ingestor, mang theo trong envelope)
+        normalized_text = get_norm(raw_message)["folded"]
 
         # 2. Check trùng (Global deduplication cho nội dung)
         # REMOVED: Global deduplication causes issues with channel-specific rules.
@@ -151,10 +451,16 @@ class MessageProcessor:
 
         matched_rules = []
 
+        if terms is not None:
+            hits = terms.scan(normalized_text)
+            if not hits:
+                return []
+            return self.match_compact(normalized_text, hits, chat_id, user_rules_list)
+
         # 3. Loop qua Rules
         for rule in user_rules_list:
             # Check source channel (nếu rule có quy định)
-            if rule.source_channels and chat_id not in rule.source_channels:
+            if rule._source_set is not None and chat_id not in rule._source_set:
                 continue
 
             # Check keywords
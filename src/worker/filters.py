@@ -12,6 +12,7 @@ from datetime import datetime, timezone
 
 from src.common.logger import get_logger
 from src.common.ai_client import ai_client
+from src.common.ai_gateway import ai_gateway, AIUnavailableError
 
 logger = get_logger("filter")
 
@@ -39,13 +40,15 @@ class KeywordFilter:
     }
     
     @staticmethod
-    def get_matched_categories(text: str) -> Dict[str, List[str]]:
+    def get_matched_categories(text: str, text_upper: Optional[str] = None) -> Dict[str, List[str]]:
         """
         Match keywords and return matched categories.
         Returns: {"ticker": ["BTC", "ETH"], "technical": ["bull"], ...}
+        text_upper: text.upper() đã tính sẵn (MessageFilter tính 1 lần cho mọi layer).
         """
         matched = {}
-        text_upper = text.upper()
+        if text_upper is None:
+            text_upper = text.upper()
         
         for category, pattern in KeywordFilter.CRYPTO_KEYWORDS.items():
             matches = re.findall(pattern, text_upper, re.IGNORECASE)
@@ -116,12 +119,13 @@ class ContentAnalyzer:
     """Analyze message quality and sentiment."""
     
     @staticmethod
-    def analyze_sentiment(text: str) -> Dict:
+    def analyze_sentiment(text: str, text_upper: Optional[str] = None) -> Dict:
         """
         Analyze message sentiment.
         Returns: {"sentiment": "bullish|neutral|bearish", "confidence": 0-100}
         """
-        text_upper = text.upper()
+        if text_upper is None:
+            text_upper = text.upper()
         
         bullish_words = r"\b(moon|rocket|bull|pump|surge|boom|📈|lambo|amazing|gamer|opportunity|bullish)\b"
         bearish_words = r"\b(crash|dump|bear|bearish|fear|bearish|📉|rug|rekt|caution|warning|danger)\b"
@@ -137,7 +141,7 @@ class ContentAnalyzer:
             return {"sentiment": "neutral", "confidence": 50}
     
     @staticmethod
-    def analyze_urgency(text: str) -> str:
+    def analyze_urgency(text: str, text_upper: Optional[str] = None) -> str:
         """
         Determine message urgency level.
         Returns: "breaking" | "important" | "regular"
@@ -147,7 +151,8 @@ class ContentAnalyzer:
             "important": r"\b(important|attention|note|fyi|heads.*up|announcement|update)\b",
         }
         
-        text_upper = text.upper()
+        if text_upper is None:
+            text_upper = text.upper()
         if re.search(urgency_patterns["breaking"], text_upper, re.IGNORECASE):
             return "breaking"
         elif re.search(urgency_patterns["important"], text_upper, re.IGNORECASE):
@@ -187,8 +192,10 @@ class ContentAnalyzer:
         return 30 + (message_links * 5)
     
     @staticmethod
-    def calculate_quality_score(text: str, source_title: str) -> Dict:
+    def calculate_quality_score(text: str, source_title: str, text_upper: Optional[str] = None) -> Dict:
         """Calculate overall content quality."""
+        if text_upper is None:
+            text_upper = text.upper()
         
         # Check length
         min_length = 30  # minimum meaningful text
@@ -204,7 +211,7 @@ class ContentAnalyzer:
         link_score = min(links * 15, 100)
         
         # Sentiment confidence
-        sentiment = ContentAnalyzer.analyze_sentiment(text)
+        sentiment = ContentAnalyzer.analyze_sentiment(text, text_upper)
         sentiment_score = sentiment["confidence"]
         
         # Overall quality
@@ -215,7 +222,7 @@ class ContentAnalyzer:
             "length_score": length_score,
             "link_count": links,
             "sentiment": sentiment,
-            "urgency": ContentAnalyzer.analyze_urgency(text),
+            "urgency": ContentAnalyzer.analyze_urgency(text, text_upper),
             "credibility": ContentAnalyzer.analyze_credibility(source_title, links)
         }
 
@@ -270,7 +277,7 @@ TASK: Provide a JSON response with:
 Return ONLY valid JSON, no other text.
 """
             
-            response = await ai_client.model.generate_content_async(prompt)
+            response = await ai_gateway.generate_content(ai_client.model, prompt)
             
             # Parse AI response
             try:
@@ -300,6 +307,9 @@ Return ONLY valid JSON, no other text.
                 logger.warning(f"Failed to parse AI response: {e}")
                 return AIScorer._default_scoring(keyword_matches, content_analysis)
                 
+        except AIUnavailableError as e:
+            logger.debug(f"AI unavailable ({e}), using default scoring")
+            return AIScorer._default_scoring(keyword_matches, content_analysis)
         except Exception as e:
             logger.error(f"AI scoring error: {e}")
             return AIScorer._default_scoring(keyword_matches, content_analysis)
@@ -349,13 +359,16 @@ class MessageFilter:
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
         
+        # Uppercase form computed once for every layer
+        text_upper = text.upper()
+        
         # ===== LAYER 1: Keyword Matching =====
         if KeywordFilter.is_spam(text):
             logger.debug(f"Message {message_id}: REJECTED - SPAM")
             result["layer1_status"] = "rejected_spam"
             return False, result
         
-        keyword_matches = KeywordFilter.get_matched_categories(text)
+        keyword_matches = KeywordFilter.get_matched_categories(text, text_upper)
         relevance_score = KeywordFilter.calculate_relevance_score(keyword_matches)
         
         if relevance_score < 15:  # Very low relevance threshold (was 20)
@@ -369,7 +382,7 @@ class MessageFilter:
         result["keyword_matches"] = keyword_matches
         
         # ===== LAYER 2: Content Analysis =====
-        content_analysis = ContentAnalyzer.calculate_quality_score(text, source_title)
+        content_analysis = ContentAnalyzer.calculate_quality_score(text, source_title, text_upper)
         
         if content_analysis["quality_score"] < 25:
             logger.debug(f"Message {message_id}: REJECTED - LOW QUALITY")
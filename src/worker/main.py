@@ -7,30 +7,38 @@ import sys
 import asyncio
 import json
 import re
-import hashlib
+import time
 from datetime import datetime, timedelta
 
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+from src.common.config import settings
 from src.common.logger import get_logger
-from src.common.redis_client import get_redis
-from src.database.db import AsyncSessionLocal
-from src.database.models import FilterRule as DBFilterRule, User, PlanType
-from src.worker.filter_engine import MessageProcessor, FilterRule as EngineFilterRule
+from src.common.redis_client import get_redis, get_blocking_redis
+from src.common.metrics import start_metrics_reporter
+from src.common.text_norm import get_norm, strip_norm
+from src.worker.filter_engine import MessageProcessor
+from src.worker.rule_index import rule_index, Entitlement
 from src.worker.ai_engine import ai_engine
 from src.worker.strategies import strategy_processor
 from src.worker.analyzers import template_processor
 from src.worker.scheduler import template_scheduler
+from src.worker.delivery_state import delivery_state
 
 logger = get_logger("worker")
 
 # Queue names
 QUEUE_RAW_MESSAGES = "queue:raw_messages"
 QUEUE_NOTIFICATIONS = "queue:notifications"
+QUEUE_ENRICHMENT = "queue:enrichment"
+
+# Number of concurrent enrichment consumers (AI calls off the matching hot path)
+ENRICHMENT_CONCURRENCY = int(os.getenv("ENRICHMENT_CONCURRENCY", "2"))
+
+# Images of an album sent to OCR (1 = cover image only, the rest are usually charts / duplicates).
+# Shared with the ingestor, which only downloads that many.
+ALBUM_OCR_MAX_IMAGES = settings.ALBUM_OCR_MAX_IMAGES
 
 # Free user limits
 FREE_MAX_KEYWORDS = 3
@@ -40,214 +48,244 @@ FREE_MAX_NOTIFICATIONS_PER_DAY = 10
 processor = MessageProcessor()
 
 
-async def check_user_can_receive(redis, user: User) -> bool:
+async def check_user_can_receive(redis, entitlement: Entitlement, now_ts: int, now_minute: int) -> bool:
     """
     Check if user can receive notification (VIP or within free limits).
-    Also checks Quiet Mode.
+    Also checks Quiet Mode. Pure integer checks on the precomputed entitlement.
     """
-    # 1. Check Quiet Mode
-    if user.quiet_start and user.quiet_end:
-        now = datetime.utcnow().time()
-        start = user.quiet_start
-        end = user.quiet_end
-        
-        is_quiet = False
-        if start < end:
-            # Example: 23:00 to 23:59 (Same day range? No, usually overnight)
-            # If start < end (e.g. 13:00 to 14:00), then quiet if now in between
-            if start <= now <= end:
-                is_quiet = True
-        else:
-            # Example: 23:00 to 07:00 (Overnight)
-            # Quiet if now >= 23:00 OR now <= 07:00
-            if now >= start or now <= end:
-                is_quiet = True
-        
-        if is_quiet:
-            # logger.debug(f"User {user.id} is in Quiet Mode ({start} - {end})")
-            return False
+    # 1. Check Quiet Mode (minute of day, UTC)
+    if entitlement.is_quiet(now_minute):
+        return False
 
     # VIP/BUSINESS users: always can receive (if not in quiet mode)
-    if user.plan_type in [PlanType.VIP, PlanType.BUSINESS]:
-        # Ensure both datetimes are offset-naive or offset-aware
-        # user.expiry_date is usually naive (from DB)
-        # datetime.utcnow() is naive
-        # If user.expiry_date is aware, convert utcnow to aware
-        now = datetime.utcnow()
-        if user.expiry_date:
-            expiry = user.expiry_date
-            if expiry.tzinfo is not None and now.tzinfo is None:
-                # Make now aware (UTC)
-                from datetime import timezone
-                now = now.replace(tzinfo=timezone.utc)
-            elif expiry.tzinfo is None and now.tzinfo is not None:
-                 # Make expiry aware (assume UTC)
-                 from datetime import timezone
-                 expiry = expiry.replace(tzinfo=timezone.utc)
-            
-            if expiry > now:
-                return True
-        # VIP expired, treat as FREE
-    
-    # FREE users: check daily limit
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    counter_key = f"notif_count:{user.id}:{today}"
-    
-    count = await redis.get(counter_key)
-    count = int(count) if count else 0
+    if entitlement.is_unlimited(now_ts):
+        return True
+    # VIP expired, treat as FREE
     
-    if count >= FREE_MAX_NOTIFICATIONS_PER_DAY:
-        return False
-    
-    # Increment counter
-    await redis.incr(counter_key)
-    await redis.expire(counter_key, 86400)  # Expire after 24h
-    
-    return True
+    # FREE users: check daily limit (local counter, written behind to notif_count:{date})
+    return await delivery_state.consume_quota(entitlement.user_id, FREE_MAX_NOTIFICATIONS_PER_DAY)
 
 
 async def process_message(redis, message_data: dict):
     """
     Process a single message using Filter Engine.
     """
-    # 0. Strategy Processing (Enrich/Format message based on Tag)
-    # This happens BEFORE filtering, so users filter on the processed text.
-    message_data = await strategy_processor.process(message_data)
+    # Matching runs on raw text. Strategy enrichment (AI summary / signal extraction)
+    # is an asynchronous stage (see enrichment_worker), only for messages that matched
+    # or feed a subscribed template.
+    # Backfilled history (src/ingestor/backfill.py): buffer at its original date, no alerts
+    if message_data.get("backfill"):
+        await buffer_backfill(message_data)
+        return
 
-    # Buffer message for AI Templates
+    needs_enrichment = strategy_processor.needs_enrichment(message_data)
+
+    # Buffer message for AI Templates (raw text, replaced once enriched)
+    buffered = []
     try:
-        tags = message_data.get("tags", ["NORMAL"])
-        # Backward compatibility
-        if not tags and "tag" in message_data:
-            tags = [message_data["tag"]]
-            
-        for tag in tags:
-            await template_processor.buffer_message(tag, message_data)
+        consumed_tags = await template_processor.get_consumed_tags() if needs_enrichment else set()
+        for tag in strategy_processor.get_tags(message_data):
+            member, score = await template_processor.buffer_message(tag, strip_norm(message_data))
+            if tag in consumed_tags:
+                buffered.append({"tag": tag, "member": member, "score": score})
     except Exception as e:
         logger.error(f"Failed to buffer message: {e}")
 
-    async with AsyncSessionLocal() as session:
-        # Fetch active rules with user info
-        result = await session.execute(
-            select(DBFilterRule)
-            .options(selectinload(DBFilterRule.user))
-            .where(DBFilterRule.is_active == True)
-        )
-        db_rules = result.scalars().all()
-        
-        # Convert DB rules to Engine rules
-        engine_rules = []
-        rule_map = {} # Map engine rule ID back to DB rule object to get user info
-        has_business_user = False
-        
-        for db_rule in db_rules:
-            # Check if we have any business user to enable OCR
-            if db_rule.user.plan_type == PlanType.BUSINESS:
-                has_business_user = True
-
-            # Simple conversion: keyword -> must_have
-            # TODO: In future, DB should support must_not_have columns
-            e_rule = EngineFilterRule(
-                id=db_rule.id,
-                user_id=db_rule.user_id,
-                must_have=[db_rule.keyword], 
-                must_not_have=[]
-            )
-            engine_rules.append(e_rule)
-            rule_map[db_rule.id] = db_rule
-
-        # 1. First Pass: Filter on Caption (Text only)
-        # This saves OCR costs if the caption already matches or is clearly spam.
-        logger.debug(f"Processing message: {message_data.get('text', '')[:50]}...")
-        matched_rules = processor.process_incoming_message(message_data, engine_rules)
-        
-        if matched_rules:
-            logger.info(f"Matched {len(matched_rules)} rules based on text.")
-        else:
-            logger.debug("No rules matched based on text.")
+    # Active rules + user entitlements, kept in memory (invalidated via pub/sub)
+    index = await rule_index.get()
+    postings = index.postings_for(message_data.get("chat_id"))
+
+    # 1. First Pass: Filter on Caption (Text only)
+    # This saves OCR costs if the caption already matches or is clearly spam.
+    logger.debug(f"Processing message: {message_data.get('text', '')[:50]}...")
+    matched_rules = processor.match_postings(message_data, postings, index.terms)
+    
+    if matched_rules:
+        logger.info(f"Matched {len(matched_rules)} rules based on text.")
+    else:
+        logger.debug("No rules matched based on text.")
 
-        # 2. Second Pass: OCR (Only if no match found AND image exists AND has business user)
-        image_path = message_data.get("image_path")
-        # Check if image scanning is disabled
-        inactive_img = os.getenv("INACTIVE_IMG", "False").lower() in ("true", "1", "yes")
+    # 2. Second Pass: OCR (Only if no match found AND image exists AND has business user)
+    # Albums carry every image in image_paths: OCR + re-match run once per album
+    image_paths = message_data.get("image_paths") or [message_data.get("image_path")]
+    image_paths = [path for path in image_paths if path and os.path.exists(path)]
+    # Check if image scanning is disabled
+    inactive_img = os.getenv("INACTIVE_IMG", "False").lower() in ("true", "1", "yes")
 
-        if not matched_rules and image_path and os.path.exists(image_path) and not inactive_img:
-            if has_business_user:
-                logger.info(f"No text match found. Attempting OCR on: {image_path}")
-                try:
+    if not matched_rules and image_paths and not inactive_img:
+        if index.has_business_user:
+            logger.info(f"No text match found. Attempting OCR on: {image_paths[:ALBUM_OCR_MAX_IMAGES]}")
+            try:
+                ocr_texts = []
+                for image_path in image_paths[:ALBUM_OCR_MAX_IMAGES]:
                     ocr_text = await ai_engine.extract_text_from_image(image_path)
                     if ocr_text:
-                        logger.info(f"OCR Result: {ocr_text[:50]}...")
-                        # Append OCR text to message text
-                        message_data['text'] += f"\n\n[OCR Content]:\n{ocr_text}"
-                        
-                        # Run Filter again with enriched text
-                        matched_rules = processor.process_incoming_message(message_data, engine_rules)
-                except Exception as e:
-                    logger.error(f"Error during OCR processing: {e}")
-            else:
-                logger.debug("Skipping OCR: No active BUSINESS users.")
-        
-        # Cleanup Image (Always delete if it exists)
-        if image_path and os.path.exists(image_path):
-            try:
-                os.remove(image_path)
-                logger.info(f"Deleted temp image: {image_path}")
+                        ocr_texts.append(ocr_text)
+                if ocr_texts:
+                    ocr_text = "\n".join(ocr_texts)
+                    logger.info(f"OCR Result: {ocr_text[:50]}...")
+                    # Append OCR text to message text
+                    message_data['text'] += f"\n\n[OCR Content]:\n{ocr_text}"
+                    get_norm(message_data, refresh=True)
+                    
+                    # Run Filter again with enriched text
+                    matched_rules = processor.match_postings(message_data, postings, index.terms)
             except Exception as e:
-                logger.error(f"Failed to delete temp image {image_path}: {e}")
+                logger.error(f"Error during OCR processing: {e}")
+        else:
+            logger.debug("Skipping OCR: No active BUSINESS users.")
+    
+    # Cleanup Images (Always delete if they exist)
+    for image_path in image_paths:
+        try:
+            os.remove(image_path)
+            logger.info(f"Deleted temp image: {image_path}")
+        except Exception as e:
+            logger.error(f"Failed to delete temp image {image_path}: {e}")
 
-        
-        if not matched_rules:
-            return
+    
+    if not matched_rules:
+        if needs_enrichment and buffered:
+            await enqueue_enrichment(redis, message_data, None, [], buffered)
+        return
 
-        # Generate Message Hash for Dedup
-        msg_text = message_data.get('text', '')
-        msg_hash = hashlib.md5(msg_text.encode('utf-8')).hexdigest()
+    # Message Hash for Dedup (computed once at ingest, see text_norm)
+    msg_hash = get_norm(message_data)["hash"]
+    # Downstream payload (bot does not need the normalized forms)
+    payload = strip_norm(message_data)
 
-        # Track which users already matched (avoid duplicate notifications)
-        notified_users = set()
-        
-        for match in matched_rules:
-            db_rule = rule_map.get(match.id)
-            if not db_rule:
-                continue
-                
-            # Skip if user already notified for this message (in this batch)
-            if db_rule.user_id in notified_users:
-                continue
-
-            # Check Redis Dedup (Per-user deduplication)
-            dedup_key = f"dedup:msg:{db_rule.user_id}:{msg_hash}"
-            if await redis.exists(dedup_key):
-                logger.debug(f"Duplicate message for user {db_rule.user_id}, skipping.")
-                continue
-            
-            # Check if user can receive
-            if not await check_user_can_receive(redis, db_rule.user):
-                logger.debug(f"User {db_rule.user_id} reached daily limit")
-                continue
-            
-            # Set Dedup (TTL 1 hour)
-            await redis.setex(dedup_key, 3600, "1")
-            
-            # AI Analysis: DISABLED for individual messages as per request
-            # AI is only used for Templates (aggregated reports)
-            analysis_text = None
-            
-            # Create notification
-            notification = {
-                "user_id": db_rule.user_id,
-                "message": message_data,
-                "matched_keyword": db_rule.keyword,
-                "timestamp": datetime.utcnow().isoformat(),
-                "ai_analysis": analysis_text
-            }
-            
-            await redis.lpush(QUEUE_NOTIFICATIONS, json.dumps(notification, ensure_ascii=False))
-            notified_users.add(db_rule.user_id)
+    # Clock computed once per message (entitlement checks are integer comparisons)
+    now_ts = int(time.time())
+    now_minute = (now_ts % 86400) // 60
+
+    # Track which users already matched (avoid duplicate notifications)
+    notified_users = set()
+    recipients = []
+    
+    for match in matched_rules:
+        entitlement = index.entitlements.get(match.user_id)
+        if not entitlement:
+            continue
+        user_id, keyword = match.user_id, match.keyword
             
-            logger.info(f"Match: user={db_rule.user_id}, keyword='{db_rule.keyword}', chat={message_data.get('chat_title', 'Unknown')}")
+        # Skip if user already notified for this message (in this batch)
+        if user_id in notified_users:
+            continue
 
+        # Check Dedup (Per-user deduplication, hourly bloom filter)
+        if await delivery_state.is_duplicate(user_id, msg_hash):
+            logger.debug(f"Duplicate message for user {user_id}, skipping.")
+            continue
+        
+        # Check if user can receive
+        if not await check_user_can_receive(redis, entitlement, now_ts, now_minute):
+            logger.debug(f"User {user_id} reached daily limit")
+            continue
+        
+        # Set Dedup (window 1-2 hours)
+        await delivery_state.mark_delivered(user_id, msg_hash)
+        
+        # AI Analysis: DISABLED for individual messages as per request
+        # AI is only used for Templates (aggregated reports)
+        analysis_text = None
+        
+        # Create notification
+        notification = {
+            "user_id": user_id,
+            "message": payload,
+            "matched_keyword": keyword,
+            "timestamp": datetime.utcnow().isoformat(),
+            "ai_analysis": analysis_text,
+            "msg_key": msg_hash,
+            "enrichment_pending": needs_enrichment
+        }
+        
+        await redis.lpush(QUEUE_NOTIFICATIONS, json.dumps(notification, ensure_ascii=False))
+        notified_users.add(user_id)
+        recipients.append({"user_id": user_id, "keyword": keyword, "ai_analysis": analysis_text})
+        
+        logger.info(f"Match: user={user_id}, keyword='{keyword}', chat={message_data.get('chat_title', 'Unknown')}")
+
+    if needs_enrichment and (recipients or buffered):
+        await enqueue_enrichment(redis, message_data, msg_hash, recipients, buffered)
+
+
+async def buffer_backfill(message_data: dict):
+    """Template buffers only (no rule matching / OCR / enrichment), scored by message date."""
+    try:
+        timestamp = datetime.fromisoformat(message_data["date"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        timestamp = None
+    try:
+        payload = strip_norm(message_data)
+        for tag in strategy_processor.get_tags(message_data):
+            await template_processor.buffer_message(tag, payload, timestamp)
+    except Exception as e:
+        logger.error(f"Failed to buffer backfilled message: {e}")
+
+
+async def enqueue_enrichment(redis, message_data: dict, msg_key, recipients: list, buffered: list):
+    """Push an enrichment job (runs after alerts are already delivered)."""
+    job = {
+        "message": strip_norm(message_data),
+        "msg_key": msg_key,
+        "recipients": recipients,
+        "buffered": buffered
+    }
+    try:
+        await redis.lpush(QUEUE_ENRICHMENT, json.dumps(job, ensure_ascii=False))
+    except Exception as e:
+        logger.error(f"Failed to enqueue enrichment: {e}")
+
+
+async def process_enrichment(redis, job: dict):
+    """
+    Enrichment stage: run the tag strategy (AI summary / signal extraction),
+    then update the delivered alerts and the template buffers.
+    """
+    raw_message = job["message"]
+    raw_text = raw_message.get("text", "")
+    enriched = await strategy_processor.process(dict(raw_message))
+
+    if enriched.get("text", "") == raw_text:
+        return
+
+    # 1. Edit (or follow up) the alerts already delivered by the Bot
+    if job.get("recipients"):
+        update = {
+            "type": "ALERT_ENRICHMENT",
+            "msg_key": job["msg_key"],
+            "message": enriched,
+            "recipients": job["recipients"],
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        await redis.lpush(QUEUE_NOTIFICATIONS, json.dumps(update, ensure_ascii=False))
+
+    # 2. Swap buffered raw text for the enriched version
+    for entry in job.get("buffered", []):
+        try:
+            await template_processor.replace_buffered(entry["tag"], entry["member"], enriched, entry["score"])
+        except Exception as e:
+            logger.error(f"Failed to update buffer {entry.get('tag')}: {e}")
+
+
+async def enrichment_worker(worker_id: int):
+    """Background consumer for queue:enrichment."""
+    redis = await get_redis()
+    blocking_redis = await get_blocking_redis()
+    logger.info(f"Enrichment worker #{worker_id} started.")
+    
+    while True:
+        try:
+            result = await blocking_redis.brpop(QUEUE_ENRICHMENT, timeout=0)
+            if result:
+                _, data = result
+                await process_enrichment(redis, json.loads(data))
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON in enrichment queue: {e}")
+        except Exception as e:
+            logger.error(f"Enrichment worker error: {e}")
+            await asyncio.sleep(1)
 
 
 async def main():
@@ -259,19 +297,32 @@ async def main():
     # Start Scheduler in background
     asyncio.create_task(template_scheduler.start())
 
+    # Publish pool metrics to Redis
+    start_metrics_reporter()
+
+    # Write-behind flush of FREE quota counters
+    asyncio.create_task(delivery_state.run())
+
+    # Start enrichment stage (off the matching hot path)
+    for i in range(ENRICHMENT_CONCURRENCY):
+        asyncio.create_task(enrichment_worker(i + 1))
+
     redis = await get_redis()
     
     # Test Redis connection
     await redis.ping()
     logger.info("Redis connection: OK")
     
+    # brpop runs on its own pool so a long block never holds a command connection
+    blocking_redis = await get_blocking_redis()
+    
     logger.info(f"Listening to queue: {QUEUE_RAW_MESSAGES}")
     logger.info("Worker is running. Waiting for messages...")
     
     while True:
         try:
             # Blocking pop from Redis (timeout 0 = wait forever)
-            result = await redis.brpop(QUEUE_RAW_MESSAGES, timeout=0)
+            result = await blocking_redis.brpop(QUEUE_RAW_MESSAGES, timeout=0)
             
             if result:
                 _, data = result
@@ -6,19 +6,22 @@ Luồng:
 1. Ingestor push messages vào queue:raw_messages (KHÔNG THAY ĐỔI)
 2. Analyzer pull từ queue
 3. Áp dụng 3-layer filter
-4. Lưu vào crypto_news table với dedup
+4. Lưu vào crypto_news table với dedup (ghi theo lô, xem news_writer.py)
+
+Tin được LMOVE sang queue:raw_messages:processing, chỉ bị xoá khỏi Redis khi đã bị lọc,
+đã commit hoặc đã vào dead-letter; khi khởi động, phần còn sót được trả lại đầu queue.
 """
 import asyncio
 import json
-import hashlib
-from datetime import datetime, timezone
 from typing import Optional
-from sqlalchemy import select, insert, update
 
 from src.common.logger import get_logger
 from src.common.redis_client import get_redis
-from src.database.db import AsyncSessionLocal
-from src.database.models import CryptoNews, NewsDuplicate
+from src.common.metrics import start_metrics_reporter
+from src.common.text_norm import NORM_KEY, content_hash, get_norm
+from src.worker.news_writer import NewsBatchWriter, QUEUE_ANALYZER_PROCESSING
+from src.worker.news_archiver import news_archiver
+from src.worker.news_partitions import news_partitions
 from src.worker.filters import MessageFilter, KeywordFilter, ContentAnalyzer
 
 logger = get_logger("analyzer")
@@ -33,14 +36,12 @@ class NewsAnalyzer:
     def __init__(self):
         self.processed_count = 0
         self.filtered_count = 0
-        self.saved_count = 0
+        self.writer = NewsBatchWriter()
     
     @staticmethod
     def calculate_content_hash(text: str) -> str:
-        """Calculate SHA256 hash of normalized text."""
-        # Normalize: lowercase, remove extra whitespace
-        normalized = " ".join(text.lower().split())
-        return hashlib.sha256(normalized.encode()).hexdigest()
+        """Calculate SHA256 hash of normalized text (lowercase, collapsed whitespace)."""
+        return content_hash(text)
     
     async def process_message(self, message_data: dict) -> Optional[dict]:
         """
@@ -85,11 +86,12 @@ class NewsAnalyzer:
             
             logger.info(f"✅ Message {message_id} PASSED filters - weight={filter_result['ai_score']['final_weight']}")
             
-            # Enrich with original data
+            # Enrich with original data (hash computed once at ingest, carried in the envelope)
+            content_hash_value = get_norm(message_data)["hash"]
             result = {
-                **message_data,
+                **{k: v for k, v in message_data.items() if k != NORM_KEY},
                 **filter_result,
-                "content_hash": self.calculate_content_hash(text),
+                "content_hash": content_hash_value,
             }
             
             return result
@@ -100,86 +102,12 @@ class NewsAnalyzer:
     
     async def save_to_database(self, filtered_message: dict) -> bool:
         """
-        Save filtered message to database.
-        Handle deduplication via content_hash.
+        Save a single filtered message immediately (upsert on content_hash).
+        The queue loop uses self.writer.add() for batched writes instead.
         """
         try:
-            content_hash = filtered_message["content_hash"]
-            text = filtered_message.get("text", "")[:500]
-            
-            async with AsyncSessionLocal() as session:
-                # Check if content already exists
-                existing = await session.execute(
-                    select(CryptoNews).where(CryptoNews.content_hash == content_hash)
-                )
-                existing_news = existing.scalar_one_or_none()
-                
-                if existing_news:
-                    # Increment occurrence counter
-                    existing_news.occurrences += 1
-                    existing_news.last_seen_at = datetime.now(timezone.utc)
-                    
-                    # Save duplicate reference
-                    duplicate = NewsDuplicate(
-                        content_hash=content_hash,
-                        first_news_id=existing_news.id,
-                        source_id=filtered_message.get("chat_id", 0),
-                        message_id=filtered_message.get("message_id"),
-                        cosine_similarity=0.95,
-                        text_diff_ratio=0.05
-                    )
-                    session.add(duplicate)
-                    
-                    logger.info(
-                        f"📝 Updated existing news (id={existing_news.id}), "
-                        f"occurrences={existing_news.occurrences}"
-                    )
-                    
-                else:
-                    # New news - create record
-                    ai_score = filtered_message.get("ai_score", {})
-                    content_analysis = filtered_message.get("content_analysis", {})
-                    
-                    news = CryptoNews(
-                        content_hash=content_hash,
-                        source_id=filtered_message.get("chat_id", 0),
-                        source_name=filtered_message.get("source_title", "Unknown"),
-                        message_id=filtered_message.get("message_id"),
-                        text_summary=text,
-                        # Store full text only if important (weight >= 70)
-                        text_full=filtered_message.get("text") if ai_score.get("final_weight", 0) >= 70 else None,
-                        
-                        # Layer 1 results
-                        layer1_matched_keywords=filtered_message.get("keyword_matches"),
-                        
-                        # Layer 2 results
-                        layer2_quality_score=content_analysis.get("quality_score"),
-                        layer2_sentiment=content_analysis.get("sentiment", {}).get("sentiment"),
-                        layer2_urgency=content_analysis.get("urgency"),
-                        layer2_credibility=content_analysis.get("credibility"),
-                        
-                        # Layer 3 results
-                        layer3_relevance=ai_score.get("relevance_score"),
-                        layer3_credibility=ai_score.get("credibility_score"),
-                        layer3_market_impact=ai_score.get("market_impact"),
-                        final_weight=ai_score.get("final_weight"),
-                        ai_reasoning=ai_score.get("reasoning"),
-                        
-                        # Metadata
-                        message_link=filtered_message.get("message_link"),
-                        image_path=filtered_message.get("image_path"),
-                        tags=filtered_message.get("tags", []),
-                    )
-                    session.add(news)
-                    logger.info(
-                        f"💾 Saved new news - weight={ai_score.get('final_weight')}, "
-                        f"sentiment={content_analysis.get('sentiment', {}).get('sentiment')}"
-                    )
-                
-                await session.commit()
-                self.saved_count += 1
-                return True
-                
+            await self.writer.write_batch([filtered_message])
+            return True
         except Exception as e:
             logger.error(f"Error saving to database: {e}", exc_info=True)
             return False
@@ -190,11 +118,40 @@ class NewsAnalyzer:
         """
         redis = await get_redis()
         logger.info(f"🎯 News Analyzer started (batch_size={batch_size})")
+        await self._requeue_unfinished(redis)
+        flush_task = asyncio.create_task(self.writer.run())
         
+        try:
+            await self._consume_queue(redis, batch_size)
+        finally:
+            flush_task.cancel()
+            # Ghi nốt các tin còn trong buffer trước khi dừng
+            await self.writer.flush()
+    
+    @staticmethod
+    async def _requeue_unfinished(redis):
+        """Messages taken by a previous run but never written: back to the head of the queue, in order."""
+        requeued = 0
+        while await redis.lmove(QUEUE_ANALYZER_PROCESSING, QUEUE_RAW_MESSAGES, "RIGHT", "LEFT"):
+            requeued += 1
+        if requeued:
+            logger.warning(f"Requeued {requeued} unfinished messages from {QUEUE_ANALYZER_PROCESSING}")
+    
+    async def _consume_queue(self, redis, batch_size: int):
         while True:
             try:
-                # Get batch of messages
-                messages = await redis.lrange(QUEUE_RAW_MESSAGES, 0, batch_size - 1)
+                if self.writer.backlogged:
+                    # DB unavailable: leave new messages in Redis until the writer catches up
+                    await asyncio.sleep(self.writer.flush_interval)
+                    continue
+                
+                # Get batch of messages (kept in the processing list until written)
+                messages = []
+                for _ in range(batch_size):
+                    msg_json = await redis.lmove(QUEUE_RAW_MESSAGES, QUEUE_ANALYZER_PROCESSING, "LEFT", "RIGHT")
+                    if msg_json is None:
+                        break
+                    messages.append(msg_json)
                 
                 if not messages:
                     await asyncio.sleep(5)  # Sleep if queue empty
@@ -202,7 +159,7 @@ class NewsAnalyzer:
                 
                 logger.debug(f"Processing batch of {len(messages)} messages")
                 
-                for msg_json in messages:
+                for i, msg_json in enumerate(messages):
                     try:
                         message_data = json.loads(msg_json)
                         self.processed_count += 1
@@ -211,18 +168,22 @@ class NewsAnalyzer:
                         filtered = await self.process_message(message_data)
                         
                         if filtered:
-                            # Save to database
-                            await self.save_to_database(filtered)
-                        
-                        # Remove from queue after processing
-                        await redis.lpop(QUEUE_RAW_MESSAGES)
+                            # Buffer for batched upsert (flush on size/time); the writer acks it
+                            await self.writer.add(filtered, raw=msg_json)
+                        else:
+                            await redis.lrem(QUEUE_ANALYZER_PROCESSING, 1, msg_json)
                         
                     except json.JSONDecodeError as e:
                         logger.error(f"Invalid JSON in queue: {e}")
-                        await redis.lpop(QUEUE_RAW_MESSAGES)
+                        await redis.lrem(QUEUE_ANALYZER_PROCESSING, 1, msg_json)
                     except Exception as e:
                         logger.error(f"Error processing message: {e}")
-                        # Keep message in queue for retry
+                        # Put this and the untouched rest of the batch back at the head, in order
+                        pipe = redis.pipeline(transaction=False)
+                        for unfinished in reversed(messages[i:]):
+                            pipe.lrem(QUEUE_ANALYZER_PROCESSING, 1, unfinished)
+                            pipe.lpush(QUEUE_RAW_MESSAGES, unfinished)
+                        await pipe.execute()
                         await asyncio.sleep(1)
                         break
                 
@@ -230,7 +191,9 @@ class NewsAnalyzer:
                 logger.info(
                     f"📊 Stats - Processed: {self.processed_count}, "
                     f"Filtered: {self.filtered_count}, "
-                    f"Saved: {self.saved_count}"
+                    f"Saved: {self.writer.saved_count}, "
+                    f"Duplicates: {self.writer.duplicate_count}, "
+                    f"Dead-letter: {self.writer.dead_letter_count}"
                 )
                 
             except Exception as e:
@@ -248,6 +211,18 @@ async def main():
     logger.info("Ingestor → queue:raw_messages → Analyzer → 3-Layer Filter → crypto_news")
     logger.info("=" * 60)
     
+    # Partitions must exist before the first write (fresh DB from init_db / create_all)
+    try:
+        await news_partitions.ensure_partitions()
+    except Exception as e:
+        logger.error(f"Failed to ensure crypto_news partitions: {e}")
+    
+    # Hot/cold archival of old crypto_news rows (throttled, chunked)
+    asyncio.create_task(news_archiver.start())
+    
+    # Publish pool metrics to Redis
+    start_metrics_reporter()
+    
     try:
         await analyzer.process_queue(batch_size=10)
     except KeyboardInterrupt:
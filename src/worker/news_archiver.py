@@ -0,0 +1,152 @@
+"""
+NEWS ARCHIVER - Hot/Cold storage cho crypto_news
+Tin cũ hơn NEWS_ARCHIVE_AFTER_DAYS (mặc định 7 ngày) được chuyển sang news_archive
+để bảng crypto_news và các index (created_at, final_weight) luôn nhỏ.
+
+Mỗi batch là 1 transaction, theo khoảng id:
+1. INSERT INTO news_archive ... SELECT ... FROM crypto_news (ON CONFLICT content_hash -> cộng dồn occurrences)
+2. DELETE news_duplicates trỏ tới các tin này (số lần trùng đã nằm trong total_occurrences)
+3. DELETE crypto_news theo khoảng id
+
+- Resumable: transaction nào đã commit thì các row đã rời khỏi crypto_news, nên mỗi lần chạy
+  quét lại từ id 0 (không lưu checkpoint: tin backfill có id mới nhưng created_at cũ vẫn được archive).
+- Throttle: nghỉ NEWS_ARCHIVE_THROTTLE giây giữa các batch, lock_timeout ngắn để nhường analyzer.
+- Chỉ 1 process chạy tại 1 thời điểm (Redis lock).
+- Sau mỗi lần chạy: tạo partition tuần tới, drop partition đã rỗng (news_partitions.py).
+
+Chạy tay: python -m src.worker.news_archiver
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+from src.common.logger import get_logger
+from src.common.redis_client import get_redis
+from src.database.db import AsyncSessionLocal
+from src.worker.news_partitions import news_partitions
+
+logger = get_logger("news_archiver")
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("NEWS_ARCHIVE_AFTER_DAYS", "7"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("NEWS_ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_THROTTLE = float(os.getenv("NEWS_ARCHIVE_THROTTLE", "0.5"))  # seconds between batches
+ARCHIVE_INTERVAL = int(os.getenv("NEWS_ARCHIVE_INTERVAL", "3600"))  # seconds between runs
+ARCHIVE_LOCK_TIMEOUT = os.getenv("NEWS_ARCHIVE_LOCK_TIMEOUT", "2s")
+
+LOCK_KEY = "news_archiver:lock"
+LOCK_TTL = 600
+
+NEXT_RANGE_SQL = text("""
+    SELECT min(id), max(id), count(*) FROM (
+        SELECT id FROM crypto_news
+        WHERE created_at < :cutoff AND id > :after
+        ORDER BY id
+        LIMIT :limit
+    ) AS batch
+""")
+
+ARCHIVE_SQL = text("""
+    INSERT INTO news_archive (id, content_hash, summary, total_occurrences, final_weight, sentiment, original_created_at)
+    SELECT id, content_hash, left(text_summary, 200), coalesce(occurrences, 1), final_weight, layer2_sentiment, created_at
+    FROM crypto_news
+    WHERE id BETWEEN :lo AND :hi AND created_at < :cutoff
+    ON CONFLICT (content_hash) DO UPDATE
+    SET total_occurrences = news_archive.total_occurrences + excluded.total_occurrences
+""")
+
+DELETE_DUPLICATES_SQL = text("""
+    DELETE FROM news_duplicates
+    WHERE first_news_id IN (
+        SELECT id FROM crypto_news WHERE id BETWEEN :lo AND :hi AND created_at < :cutoff
+    )
+""")
+
+DELETE_NEWS_SQL = text("""
+    DELETE FROM crypto_news
+    WHERE id BETWEEN :lo AND :hi AND created_at < :cutoff
+""")
+
+
+class NewsArchiver:
+    """Chunked, resumable move of old crypto_news rows into news_archive."""
+
+    def __init__(self):
+        self.is_running = False
+        self.archived_count = 0
+
+    async def start(self):
+        """Scheduler loop: archive + partition maintenance every ARCHIVE_INTERVAL seconds."""
+        self.is_running = True
+        logger.info(f"🗄️ News Archiver started (after={ARCHIVE_AFTER_DAYS}d, batch={ARCHIVE_BATCH_SIZE})")
+        while self.is_running:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Archiver error: {e}")
+            # Create upcoming partitions, drop archived ones
+            await news_partitions.maintain()
+            await asyncio.sleep(ARCHIVE_INTERVAL)
+
+    async def stop(self):
+        self.is_running = False
+
+    async def run_once(self, max_batches: Optional[int] = None) -> int:
+        """Archive all rows older than the cutoff. Returns number of rows moved."""
+        redis = await get_redis()
+        if not await redis.set(LOCK_KEY, "1", nx=True, ex=LOCK_TTL):
+            logger.info("Archiver already running in another process. Skipping.")
+            return 0
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+        moved = 0
+        batches = 0
+        try:
+            after = 0
+            while max_batches is None or batches < max_batches:
+                count, hi = await self.archive_batch(cutoff, after)
+                if not count:
+                    break
+
+                moved += count
+                batches += 1
+                after = hi
+                # Keep the lock alive and give the live analyzer room
+                await redis.expire(LOCK_KEY, LOCK_TTL)
+                await asyncio.sleep(ARCHIVE_THROTTLE)
+        finally:
+            await redis.delete(LOCK_KEY)
+
+        if moved:
+            self.archived_count += moved
+            logger.info(f"🗄️ Archived {moved} news rows older than {cutoff:%Y-%m-%d} in {batches} batches")
+        return moved
+
+    async def archive_batch(self, cutoff: datetime, after: int):
+        """Move one id range in a single transaction. Returns (row count, max id)."""
+        async with AsyncSessionLocal() as session:
+            # Bỏ qua batch nếu phải chờ lock lâu (analyzer đang ghi)
+            await session.execute(text(f"SET LOCAL lock_timeout = '{ARCHIVE_LOCK_TIMEOUT}'"))
+
+            result = await session.execute(
+                NEXT_RANGE_SQL, {"cutoff": cutoff, "after": after, "limit": ARCHIVE_BATCH_SIZE}
+            )
+            lo, hi, count = result.one()
+            if not count:
+                return 0, after
+
+            params = {"lo": lo, "hi": hi, "cutoff": cutoff}
+            await session.execute(ARCHIVE_SQL, params)
+            await session.execute(DELETE_DUPLICATES_SQL, params)
+            await session.execute(DELETE_NEWS_SQL, params)
+            await session.commit()
+            return count, hi
+
+
+news_archiver = NewsArchiver()
+
+
+if __name__ == "__main__":
+    asyncio.run(news_archiver.run_once())
@@ -0,0 +1,141 @@
+"""
+NEWS PARTITIONS - Quản lý partition theo tuần của crypto_news
+- ensure_partitions(): tạo partition từ mốc retention (tin backfill mang ngày gốc của tin)
+  tới NEWS_PARTITION_WEEKS_AHEAD tuần tới (+ crypto_news_default để không bao giờ mất insert).
+  Tuần đã có dòng trong default thì không tạo được: archiver chuyển các dòng đó đi trước.
+- apply_retention(): detach + drop partition cũ hơn NEWS_PARTITION_RETENTION_DAYS
+  khi đã rỗng (archiver đã chuyển hết sang news_archive); prune news_hashes cùng mốc.
+Partition name: crypto_news_pYYYYMMDD (thứ Hai đầu tuần).
+"""
+from datetime import date, datetime, timedelta, timezone
+import os
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from src.common.logger import get_logger
+from src.database.db import AsyncSessionLocal
+
+logger = get_logger("news_partitions")
+
+PARENT_TABLE = "crypto_news"
+PARTITION_PREFIX = "crypto_news_p"
+DEFAULT_PARTITION = "crypto_news_default"
+
+WEEKS_AHEAD = int(os.getenv("NEWS_PARTITION_WEEKS_AHEAD", "4"))
+RETENTION_DAYS = int(os.getenv("NEWS_PARTITION_RETENTION_DAYS", "30"))
+# Hash dedup window (after this a re-post is stored again as new news)
+HASH_RETENTION_DAYS = int(os.getenv("NEWS_HASH_RETENTION_DAYS", "30"))
+
+LIST_PARTITIONS_SQL = text("""
+    SELECT c.relname FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'crypto_news'::regclass
+""")
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def partition_name(start: date) -> str:
+    return f"{PARTITION_PREFIX}{start:%Y%m%d}"
+
+
+def partition_start(name: str) -> date:
+    return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+
+
+def partition_bounds(start: date, end: date) -> tuple:
+    """
+    Return (from, to) created_at bounds covering [start, end] by whole weeks,
+    for queries that should be pruned to a few partitions.
+    """
+    return week_start(start), week_start(end) + timedelta(days=7)
+
+
+class NewsPartitionManager:
+    """Create upcoming weekly partitions and drop expired ones."""
+
+    async def list_partitions(self, session) -> List[str]:
+        result = await session.execute(LIST_PARTITIONS_SQL)
+        return [row[0] for row in result.all() if row[0].startswith(PARTITION_PREFIX)]
+
+    async def ensure_partitions(self, weeks_ahead: int = WEEKS_AHEAD,
+                                retention_days: int = RETENTION_DAYS) -> int:
+        """Create missing partitions from the retention horizon to weeks_ahead. Returns number created."""
+        created = 0
+        today = datetime.now(timezone.utc).date()
+        lo = week_start(today - timedelta(days=retention_days))
+        last = week_start(today) + timedelta(days=7 * weeks_ahead)
+        async with AsyncSessionLocal() as session:
+            existing = set(await self.list_partitions(session))
+            while lo <= last:
+                name = partition_name(lo)
+                hi = lo + timedelta(days=7)
+                if name not in existing:
+                    try:
+                        async with session.begin_nested():
+                            await session.execute(text(
+                                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                                f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+                            ))
+                        created += 1
+                    except DBAPIError as e:
+                        # Past week whose rows already sit in the default partition
+                        logger.info(f"Partition {name} not created yet (rows in {DEFAULT_PARTITION}): {e.orig}")
+                lo = hi
+            await session.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"
+            ))
+            await session.commit()
+
+        if created:
+            logger.info(f"📅 Created {created} crypto_news partitions")
+        return created
+
+    async def apply_retention(self, retention_days: int = RETENTION_DAYS) -> int:
+        """Detach and drop empty partitions older than retention_days. Returns number dropped."""
+        cutoff = datetime.now(timezone.utc).date() - timedelta(days=retention_days)
+        dropped = 0
+        async with AsyncSessionLocal() as session:
+            for name in sorted(await self.list_partitions(session)):
+                # Partition covers [start, start + 7d)
+                if partition_start(name) + timedelta(days=7) > cutoff:
+                    continue
+
+                has_rows = (await session.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})"))).scalar()
+                if has_rows:
+                    logger.warning(f"Partition {name} expired but not archived yet. Skipping drop.")
+                    continue
+
+                await session.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+                await session.execute(text(f"DROP TABLE {name}"))
+                await session.commit()
+                dropped += 1
+                logger.info(f"🗑️ Dropped expired partition {name}")
+
+            # The archiver moves old rows out of every partition, default included
+            stale = (await session.execute(
+                text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff"),
+                {"cutoff": cutoff}
+            )).scalar()
+            if stale:
+                logger.warning(f"{DEFAULT_PARTITION} holds {stale} rows older than {cutoff} (archiver behind?)")
+
+            hash_cutoff = datetime.now(timezone.utc) - timedelta(days=HASH_RETENTION_DAYS)
+            await session.execute(text("DELETE FROM news_hashes WHERE created_at < :cutoff"), {"cutoff": hash_cutoff})
+            await session.commit()
+        return dropped
+
+    async def maintain(self):
+        """Run both steps; errors are logged, never raised (called from scheduler loops)."""
+        try:
+            await self.ensure_partitions()
+            await self.apply_retention()
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+
+
+news_partitions = NewsPartitionManager()
@@ -0,0 +1,300 @@
+"""
+NEWS BATCH WRITER
+Gom các tin đã qua filter và ghi vào crypto_news theo lô:
+- 1 câu INSERT ... ON CONFLICT (content_hash) vào news_hashes cho cả lô (không SELECT trước khi ghi)
+- 1 câu bulk INSERT tin mới + 1 câu UPDATE occurrences cho tin đã có
+- 1 câu bulk INSERT vào news_duplicates cho các bản trùng
+- Flush khi đủ NEWS_BATCH_SIZE tin hoặc sau NEWS_FLUSH_INTERVAL giây
+- Lô lỗi:
+  * lỗi kết nối / timeout -> giữ nguyên lô, thử lại ở lần flush sau
+  * lỗi dữ liệu -> chia đôi lô và ghi lại từng nửa; chỉ dòng vẫn lỗi khi đứng 1 mình
+    mới vào dead-letter (queue:news_dead_letter), các dòng còn lại được ghi bình thường
+- Tin gốc (JSON) nằm trong QUEUE_ANALYZER_PROCESSING cho tới khi đã commit hoặc đã vào
+  dead-letter -> analyzer chết giữa chừng thì tin được đưa lại queue khi khởi động
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, insert, literal_column, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.common.logger import get_logger
+from src.common.redis_client import get_redis
+from src.database.db import AsyncSessionLocal
+from src.database.models import CryptoNews, NewsDuplicate, NewsHash
+
+logger = get_logger("news_writer")
+
+NEWS_BATCH_SIZE = int(os.getenv("NEWS_BATCH_SIZE", "100"))
+NEWS_FLUSH_INTERVAL = float(os.getenv("NEWS_FLUSH_INTERVAL", "2"))
+# Số tin chờ ghi tối đa; vượt ngưỡng thì analyzer ngừng lấy tin mới (tin nằm lại trong Redis)
+NEWS_MAX_PENDING = int(os.getenv("NEWS_MAX_PENDING", "5000"))
+
+# Tin analyzer đã lấy khỏi queue:raw_messages nhưng chưa commit vào crypto_news
+QUEUE_ANALYZER_PROCESSING = "queue:raw_messages:processing"
+QUEUE_NEWS_DEAD_LETTER = "queue:news_dead_letter"
+NEWS_DEAD_LETTER_MAX = int(os.getenv("NEWS_DEAD_LETTER_MAX", "10000"))
+
+# Max chars indexed into search_vector per message
+SEARCH_TEXT_LIMIT = 4000
+
+# Core table: crypto_news is partitioned, rows are written with explicit id/created_at
+news_table = CryptoNews.__table__
+
+# (filtered message, raw JSON in QUEUE_ANALYZER_PROCESSING or None)
+PendingEntry = Tuple[dict, Optional[str]]
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Connection / pool / timeout errors: the batch itself is fine, retry it later."""
+    if isinstance(error, (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError,
+                          OSError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class NewsBatchWriter:
+    """Batched upsert writer for crypto_news + news_duplicates."""
+
+    def __init__(self, batch_size: int = NEWS_BATCH_SIZE, flush_interval: float = NEWS_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[PendingEntry] = []
+        self._lock = asyncio.Lock()
+        self._db_unavailable = False  # Last flush hit a transient error: only the timed flush retries
+
+        # Stats
+        self.saved_count = 0
+        self.duplicate_count = 0
+        self.dead_letter_count = 0
+
+    @property
+    def backlogged(self) -> bool:
+        """True when the caller should stop feeding messages until a flush succeeds."""
+        return len(self._pending) >= NEWS_MAX_PENDING
+
+    @staticmethod
+    def build_row(filtered_message: dict) -> dict:
+        """Map a filtered message to a crypto_news row (same keys for every row)."""
+        ai_score = filtered_message.get("ai_score", {})
+        content_analysis = filtered_message.get("content_analysis", {})
+        text = filtered_message.get("text", "")
+
+        return {
+            "content_hash": filtered_message["content_hash"],
+            "source_id": filtered_message.get("chat_id", 0),
+            "source_name": filtered_message.get("source_title", "Unknown"),
+            "message_id": filtered_message.get("message_id"),
+            "text_summary": text[:500],
+            # Store full text only if important (weight >= 70)
+            "text_full": text if ai_score.get("final_weight", 0) >= 70 else None,
+
+            # Layer 1 results
+            "layer1_matched_keywords": filtered_message.get("keyword_matches"),
+
+            # Layer 2 results
+            "layer2_quality_score": content_analysis.get("quality_score"),
+            "layer2_sentiment": content_analysis.get("sentiment", {}).get("sentiment"),
+            "layer2_urgency": content_analysis.get("urgency"),
+            "layer2_credibility": content_analysis.get("credibility"),
+
+            # Layer 3 results
+            "layer3_relevance": ai_score.get("relevance_score"),
+            "layer3_credibility": ai_score.get("credibility_score"),
+            "layer3_market_impact": ai_score.get("market_impact"),
+            "final_weight": ai_score.get("final_weight"),
+            "ai_reasoning": ai_score.get("reasoning"),
+
+            # Metadata
+            "message_link": filtered_message.get("message_link"),
+            "image_path": filtered_message.get("image_path"),
+            "tags": filtered_message.get("tags", []),
+            "occurrences": 1,
+
+            # Full-text search over the whole message (even if text_full is not stored)
+            "search_vector": func.to_tsvector("simple", text[:SEARCH_TEXT_LIMIT]),
+        }
+
+    @staticmethod
+    def created_at(filtered_message: dict):
+        """now(), or the original message date for backfilled history (lands in its week's partition)."""
+        if filtered_message.get("backfill") and filtered_message.get("date"):
+            try:
+                return datetime.fromisoformat(filtered_message["date"])
+            except (TypeError, ValueError):
+                pass
+        return func.now()
+
+    async def add(self, filtered_message: dict, raw: Optional[str] = None):
+        """
+        Queue a filtered message; flushes immediately when the batch is full.
+        raw: the message's JSON in QUEUE_ANALYZER_PROCESSING, removed once written / dead-lettered.
+        """
+        self._pending.append((filtered_message, raw))
+        if len(self._pending) >= self.batch_size and not self._db_unavailable:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write all pending messages. Returns number of messages written."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+
+            written, dead, retry = await self._write_split(batch)
+            self._db_unavailable = bool(retry)
+            if retry:
+                # Kept (in order) for the next flush; the raw copies stay in Redis meanwhile
+                self._pending = retry + self._pending
+            try:
+                await self._ack(written, dead)
+            except Exception as e:
+                # Rows are committed: at worst they are re-analyzed after a restart (counted as duplicates)
+                logger.warning(f"Failed to ack {len(written) + len(dead)} messages in Redis: {e}")
+            return len(written)
+
+    async def _write_split(self, entries: List[PendingEntry]) -> Tuple[List, List, List]:
+        """
+        Write entries, bisecting on data errors. Returns (written, dead, retry):
+        dead = [(entry, error)] for single rows the DB still rejects, retry = entries not attempted because the DB is unavailable.
+        """
+        try:
+            await self.write_batch([msg for msg, _ in entries])
+            return entries, [], []
+        except Exception as e:
+            if is_transient_error(e):
+                logger.error(f"Batch write failed ({len(entries)} messages), retrying later: {e}")
+                return [], [], entries
+            if len(entries) == 1:
+                msg = entries[0][0]
+                logger.error(
+                    f"Message {msg.get('message_id')} from {msg.get('chat_id')} rejected, "
+                    f"moved to dead-letter: {e}"
+                )
+                return [], [(entries[0], str(e))], []
+            logger.warning(f"Batch write failed ({len(entries)} messages), splitting: {e}")
+
+        mid = len(entries) // 2
+        written, dead, retry = await self._write_split(entries[:mid])
+        if retry:
+            # DB went away while splitting: keep the untried half as is
+            return written, dead, retry + entries[mid:]
+        written_2, dead_2, retry_2 = await self._write_split(entries[mid:])
+        return written + written_2, dead + dead_2, retry_2
+
+    async def _ack(self, written: List[PendingEntry], dead: List[Tuple[PendingEntry, str]]):
+        """Dead-letter rejected rows and drop finished messages from the processing list."""
+        raws = [raw for _, raw in written if raw is not None] + [raw for (_, raw), _ in dead if raw is not None]
+        if not raws and not dead:
+            return
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        if dead:
+            failed_at = datetime.now(timezone.utc).isoformat()
+            for (msg, _), error in dead:
+                pipe.lpush(QUEUE_NEWS_DEAD_LETTER, json.dumps(
+                    {"message": msg, "error": error, "failed_at": failed_at}, ensure_ascii=False, default=str
+                ))
+            pipe.ltrim(QUEUE_NEWS_DEAD_LETTER, 0, NEWS_DEAD_LETTER_MAX - 1)
+            self.dead_letter_count += len(dead)
+        for raw in raws:
+            pipe.lrem(QUEUE_ANALYZER_PROCESSING, 1, raw)
+        await pipe.execute()
+
+    async def run(self):
+        """Time-based flush loop."""
+        logger.info(f"News writer started (batch_size={self.batch_size}, interval={self.flush_interval}s)")
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def write_batch(self, messages: List[dict]):
+        """
+        Upsert a batch in one transaction:
+        1. INSERT INTO news_hashes ... ON CONFLICT (content_hash) -> canonical id per hash
+           (crypto_news is partitioned, so cross-partition uniqueness lives in news_hashes)
+        2. Bulk INSERT new crypto_news rows with that id/created_at
+        3. UPDATE occurrences = occurrences + n, last_seen_at = now() for existing news
+        Duplicates (already stored, or repeated inside this batch) go to news_duplicates.
+        """
+        # Collapse repeated hashes inside the batch (ON CONFLICT cannot touch a row twice).
+        # Sorted so concurrent analyzers lock news_hashes rows in the same order.
+        grouped: Dict[str, List[dict]] = {}
+        for msg in messages:
+            grouped.setdefault(msg["content_hash"], []).append(msg)
+        hashes = sorted(grouped)
+
+        stmt = pg_insert(NewsHash).values([
+            {
+                "content_hash": content_hash,
+                "news_id": func.nextval("crypto_news_id_seq"),
+                "created_at": self.created_at(grouped[content_hash][0]),
+            }
+            for content_hash in hashes
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[NewsHash.content_hash],
+            # No-op update so RETURNING also yields existing rows (and locks them)
+            set_={"content_hash": stmt.excluded.content_hash}
+        ).returning(
+            NewsHash.content_hash,
+            NewsHash.news_id,
+            NewsHash.created_at,
+            literal_column("(xmax = 0)").label("inserted"),
+        )
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt)
+
+            new_rows = []
+            seen_rows = []
+            duplicate_rows = []
+            for content_hash, news_id, created_at, inserted in result.all():
+                group = grouped[content_hash]
+                if inserted:
+                    # New news: the first message is canonical, the rest are duplicates
+                    row = self.build_row(group[0])
+                    row.update(id=news_id, created_at=created_at, occurrences=len(group))
+                    new_rows.append(row)
+                    group = group[1:]
+                else:
+                    seen_rows.append({"b_id": news_id, "b_created_at": created_at, "b_count": len(group)})
+
+                for msg in group:
+                    duplicate_rows.append({
+                        "content_hash": content_hash,
+                        "first_news_id": news_id,
+                        "source_id": msg.get("chat_id", 0),
+                        "message_id": msg.get("message_id"),
+                        "cosine_similarity": 0.95,
+                        "text_diff_ratio": 0.05,
+                    })
+
+            if new_rows:
+                await session.execute(insert(news_table).values(new_rows))
+
+            if seen_rows:
+                # Partition-pruned by (id, created_at); rows already archived simply match nothing
+                await session.execute(
+                    update(news_table)
+                    .where(news_table.c.id == bindparam("b_id"), news_table.c.created_at == bindparam("b_created_at"))
+                    .values(occurrences=news_table.c.occurrences + bindparam("b_count"), last_seen_at=func.now()),
+                    seen_rows
+                )
+
+            if duplicate_rows:
+                await session.execute(insert(NewsDuplicate).values(duplicate_rows))
+
+            await session.commit()
+
+        self.saved_count += len(new_rows)
+        self.duplicate_count += len(duplicate_rows)
+        logger.info(
+            f"💾 Flushed {len(messages)} messages: {len(new_rows)} new, "
+            f"{len(duplicate_rows)} duplicates"
+        )
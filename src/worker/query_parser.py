@@ -0,0 +1,205 @@
+"""
+KEYWORD QUERY - Ngôn ngữ truy vấn cho 1 FilterRule
+Cú pháp (toán tử viết HOA):
+- AND / OR / NOT, ngoặc ( ), AND ngầm khi 2 vế đứng cạnh nhau: `eth listing` = `eth AND listing`
+- Cụm từ trong ngoặc kép: "hidden gem"
+- -từ = NOT từ:  `btc -giveaway`
+- a NEAR/n b: a và b cách nhau tối đa n từ (a, b là từ hoặc cụm từ)
+- Ticker / hashtag / mention giữ nguyên ký hiệu: $BTC, #AI, @binance
+
+Parser thuần Python (không phụ thuộc engine) để bot validate + lưu dạng chuẩn hóa;
+worker compile AST thành plan trên bitset (filter_engine.compile_query).
+
+AST: ("term", str) | ("and", [node]) | ("or", [node]) | ("not", node) | ("near", n, term_a, term_b)
+"""
+import re
+from typing import List, Optional, Tuple
+
+from src.common.text_norm import clean_lower
+
+MAX_QUERY_TERMS = 20
+MAX_NEAR_DISTANCE = 50
+
+_TOKEN_RE = re.compile(r'\(|\)|"[^"]*"?|NEAR/\d+|[^\s()"]+')
+_OPERATORS = {"AND", "OR", "NOT"}
+_QUERY_HINT_RE = re.compile(r'["()]|\bNEAR/\d+\b|(?:^|\s)(?:AND|OR|NOT)(?:\s|$)')
+
+
+class QueryError(ValueError):
+    """Invalid keyword query (message shown to the user)."""
+
+
+def normalize_term(term: str) -> str:
+    """Same cleaning as the message text (diacritics are kept for display, folded when compiled)."""
+    return clean_lower(term)
+
+
+def is_query(text: str) -> bool:
+    """True if the input uses query syntax (operators, quotes, parentheses, NEAR/n)."""
+    return bool(_QUERY_HINT_RE.search(text))
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _TOKEN_RE.findall(text)
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self) -> str:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("Truy vấn trống")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QueryError(f"Thừa ký tự gần '{self.peek()}'")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while True:
+            token = self.peek()
+            if token == "AND":
+                self.take()
+                children.append(self.parse_not())
+            elif token is not None and token not in ("OR", ")"):
+                children.append(self.parse_not())  # Implicit AND
+            else:
+                break
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def parse_not(self):
+        if self.peek() == "NOT":
+            self.take()
+            return ("not", self.parse_not())
+        return self.parse_near()
+
+    def parse_near(self):
+        node = self.parse_primary()
+        while self.peek() is not None and self.peek().startswith("NEAR/"):
+            distance = int(self.take()[5:])
+            if distance > MAX_NEAR_DISTANCE:
+                raise QueryError(f"NEAR tối đa {MAX_NEAR_DISTANCE} từ")
+            right = self.parse_primary()
+            if node[0] != "term" or right[0] != "term":
+                raise QueryError("NEAR/n chỉ dùng giữa 2 từ hoặc cụm từ")
+            node = ("near", distance, node[1], right[1])
+        return node
+
+    def parse_primary(self):
+        token = self.peek()
+        if token is None:
+            raise QueryError("Truy vấn kết thúc đột ngột")
+        if token in _OPERATORS or token.startswith("NEAR/") or token == ")":
+            raise QueryError(f"Thiếu từ khóa trước/sau '{token}'")
+        self.take()
+
+        if token == "(":
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise QueryError("Thiếu dấu ')'")
+            self.take()
+            return node
+
+        if token.startswith('"'):
+            if len(token) < 2 or not token.endswith('"'):
+                raise QueryError("Thiếu dấu \" đóng cụm từ")
+            return self._term(token[1:-1])
+
+        if len(token) > 1 and token.startswith("-"):
+            return ("not", self._term(token[1:]))
+
+        return self._term(token)
+
+    @staticmethod
+    def _term(raw: str):
+        term = normalize_term(raw)
+        if not term or not re.search(r'[^\W_]', term):
+            raise QueryError(f"Từ khóa không hợp lệ: '{raw}'")
+        return ("term", term)
+
+
+def parse_query(text: str):
+    """Parse and validate a query. Raises QueryError."""
+    node = _Parser(text.strip()).parse()
+    terms = query_terms(node)
+    if len(terms) > MAX_QUERY_TERMS:
+        raise QueryError(f"Tối đa {MAX_QUERY_TERMS} từ khóa / truy vấn")
+    if positive_terms(node) is None:
+        raise QueryError("Truy vấn phải có ít nhất 1 từ khóa bắt buộc (không chỉ NOT)")
+    return node
+
+
+def query_terms(node) -> List[str]:
+    """Every distinct term of the AST (phrases included)."""
+    kind = node[0]
+    if kind == "term":
+        return [node[1]]
+    if kind == "near":
+        return list(dict.fromkeys([node[2], node[3]]))
+    if kind == "not":
+        return query_terms(node[1])
+    terms = []
+    for child in node[1]:
+        terms.extend(query_terms(child))
+    return list(dict.fromkeys(terms))
+
+
+def positive_terms(node) -> Optional[List[str]]:
+    """
+    Terms of which at least one must be present for the node to match.
+    None = the node can match with no term present (e.g. NOT x, a OR NOT b).
+    """
+    kind = node[0]
+    if kind == "term":
+        return [node[1]]
+    if kind == "near":
+        return [node[2]]
+    if kind == "not":
+        return None
+    if kind == "and":
+        # Every child must match: the smallest child trigger is enough
+        options = [t for t in (positive_terms(c) for c in node[1]) if t is not None]
+        return min(options, key=len) if options else None
+    # or: any child may match
+    terms = []
+    for child in node[1]:
+        child_terms = positive_terms(child)
+        if child_terms is None:
+            return None
+        terms.extend(child_terms)
+    return list(dict.fromkeys(terms))
+
+
+def format_query(node, parent: str = "") -> str:
+    """Canonical text of an AST (stored in filter_rules.query and shown to the user)."""
+    kind = node[0]
+    if kind == "term":
+        return f'"{node[1]}"' if " " in node[1] else node[1]
+    if kind == "near":
+        return f"{format_query(('term', node[2]))} NEAR/{node[1]} {format_query(('term', node[3]))}"
+    if kind == "not":
+        return f"NOT {format_query(node[1], 'not')}"
+    text = f" {kind.upper()} ".join(format_query(c, kind) for c in node[1])
+    # Parentheses only where precedence requires it
+    return f"({text})" if parent and parent != kind else text
+
+
+def split_query_input(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """(canonical query, None) or (None, error message) for bot input."""
+    try:
+        return format_query(parse_query(text)), None
+    except QueryError as e:
+        return None, str(e)
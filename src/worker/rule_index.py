@@ -0,0 +1,251 @@
+"""
+RULE INDEX - Rule + quyền nhận tin của user, giữ sẵn trong RAM cho match path
+Trước đây mỗi tin nhắn đều query toàn bộ filter_rules (kèm ORM User) và tính lại
+quiet mode / hạn VIP bằng datetime. Giờ:
+- Rule được compile 1 lần khi load thành CompactRule (__slots__, không pydantic).
+- Inverted index theo nguồn: chat_id -> rule chỉ áp dụng cho chat đó. Tin từ 1 chat
+  chỉ chạy qua rule global + rule của chat đó (postings_for()).
+- Posting list theo term (PostingIndex): term -> vị trí các rule subscribe term đó.
+  Từ khóa nhiều user cùng theo dõi ($BTC, preset) chỉ tốn 1 regex, rule ứng viên = union posting list.
+- Từ khóa, term của truy vấn (AND/OR/NOT/NEAR) và must_not_have của mọi rule gom vào
+  1 TermSet (terms): quét 1 lần / tin, mỗi rule chỉ còn phép toán trên bitset (compile_rule).
+- Mỗi user có 1 Entitlement gọn (plan, expiry epoch, quiet window theo phút,
+  có forward target) -> match path chỉ so sánh số nguyên.
+- Cập nhật qua Redis pub/sub (src/common/rule_events.py): reload toàn bộ khi rule đổi,
+  reload 1 user khi đổi gói / hết hạn / settings. Reload định kỳ RULE_INDEX_MAX_AGE làm dự phòng.
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, exists
+
+from src.common.logger import get_logger
+from src.common.redis_client import get_blocking_redis
+from src.common.rule_events import RULE_INDEX_CHANNEL
+from src.database.db import AsyncSessionLocal
+from src.database.models import FilterRule as DBFilterRule, User, UserForwardingTarget, PlanType
+from src.worker.filter_engine import CompactRule, PostingIndex, TermSet, compile_rule
+from src.worker.query_parser import QueryError
+
+logger = get_logger("rule_index")
+
+RULE_INDEX_MAX_AGE = int(os.getenv("RULE_INDEX_MAX_AGE", "300"))  # seconds, safety full reload
+
+PLAN_FREE = 0
+PLAN_VIP = 1
+PLAN_BUSINESS = 2
+PLAN_CODES = {PlanType.FREE: PLAN_FREE, PlanType.VIP: PLAN_VIP, PlanType.BUSINESS: PLAN_BUSINESS}
+
+NO_QUIET = -1
+
+
+class Entitlement:
+    """Precomputed delivery rights of a user (integers only)."""
+    __slots__ = ("user_id", "plan", "expiry_ts", "quiet_start", "quiet_end", "has_forward_target")
+
+    def __init__(self, user_id: int, plan: int, expiry_ts: int,
+                 quiet_start: int, quiet_end: int, has_forward_target: bool):
+        self.user_id = user_id
+        self.plan = plan
+        self.expiry_ts = expiry_ts  # Epoch seconds, 0 = no expiry set
+        self.quiet_start = quiet_start  # Minute of day (UTC), NO_QUIET = off
+        self.quiet_end = quiet_end
+        self.has_forward_target = has_forward_target
+
+    @classmethod
+    def from_row(cls, user_id, plan_type, expiry_date, quiet_start, quiet_end, has_forward_target) -> "Entitlement":
+        expiry_ts = 0
+        if expiry_date is not None:
+            # Naive datetimes from DB are UTC
+            if expiry_date.tzinfo is None:
+                expiry_ts = int(expiry_date.replace(tzinfo=timezone.utc).timestamp())
+            else:
+                expiry_ts = int(expiry_date.timestamp())
+
+        start = end = NO_QUIET
+        if quiet_start is not None and quiet_end is not None:
+            start = quiet_start.hour * 60 + quiet_start.minute
+            end = quiet_end.hour * 60 + quiet_end.minute
+
+        return cls(user_id, PLAN_CODES.get(plan_type, PLAN_FREE), expiry_ts, start, end, bool(has_forward_target))
+
+    def is_quiet(self, minute_of_day: int) -> bool:
+        if self.quiet_start == NO_QUIET:
+            return False
+        if self.quiet_start < self.quiet_end:
+            return self.quiet_start <= minute_of_day <= self.quiet_end
+        # Overnight window, e.g. 23:00 -> 07:00
+        return minute_of_day >= self.quiet_start or minute_of_day <= self.quiet_end
+
+    def is_unlimited(self, now_ts: int) -> bool:
+        """Active VIP/BUSINESS (no expiry set = treated as FREE, as before)."""
+        return self.plan != PLAN_FREE and self.expiry_ts > now_ts
+
+
+class RuleIndex:
+    """In-memory rules + entitlements, refreshed by pub/sub invalidation."""
+
+    def __init__(self):
+        self.rules: List[CompactRule] = []  # CompactRule.keyword / user_id cho notification
+        self.global_index = PostingIndex([])  # source_channels = NULL
+        self.chat_indexes: Dict[int, PostingIndex] = {}
+        self.terms = TermSet()
+        self.entitlements: Dict[int, Entitlement] = {}
+        self.has_business_user = False
+
+        self._loaded_at = 0.0
+        self._dirty = True
+        self._dirty_users = set()
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    # ============ Loading ============
+    @staticmethod
+    def _entitlement_query():
+        has_target = exists().where(UserForwardingTarget.user_id == User.id)
+        return select(
+            User.id, User.plan_type, User.expiry_date, User.quiet_start, User.quiet_end,
+            has_target.label("has_forward_target")
+        )
+
+    def _update_business_flag(self):
+        self.has_business_user = any(e.plan == PLAN_BUSINESS for e in self.entitlements.values())
+
+    async def load(self):
+        """Full reload of active rules and the entitlements of their owners."""
+        # Clear flags first: invalidations arriving during the queries trigger another reload
+        self._dirty = False
+        self._dirty_users.clear()
+        try:
+            async with AsyncSessionLocal() as session:
+                rule_rows = (await session.execute(
+                    select(DBFilterRule.id, DBFilterRule.user_id, DBFilterRule.keyword,
+                           DBFilterRule.source_channels, DBFilterRule.must_not_have, DBFilterRule.query)
+                    .where(DBFilterRule.is_active == True)
+                )).all()
+
+                user_ids = select(DBFilterRule.user_id).where(DBFilterRule.is_active == True)
+                user_rows = (await session.execute(
+                    self._entitlement_query().where(User.id.in_(user_ids))
+                )).all()
+        except Exception:
+            self._dirty = True
+            raise
+
+        rules = []
+        global_rules = []
+        rules_by_chat: Dict[int, List[CompactRule]] = {}
+        terms = TermSet()
+        for rule_id, user_id, keyword, source_channels, must_not_have, query in rule_rows:
+            try:
+                rule = compile_rule(rule_id, user_id, keyword, terms, must_not_have, source_channels, query)
+            except QueryError as e:
+                logger.warning(f"Skipping rule {rule_id}: invalid query '{query}': {e}")
+                continue
+            rules.append(rule)
+            if rule.sources:
+                for chat_id in rule.sources:
+                    rules_by_chat.setdefault(chat_id, []).append(rule)
+            else:
+                global_rules.append(rule)
+
+        global_index = PostingIndex(global_rules)
+        chat_indexes = {chat_id: PostingIndex(scoped) for chat_id, scoped in rules_by_chat.items()}
+
+        # Swap atomically (no await between assignments)
+        self.rules = rules
+        self.global_index = global_index
+        self.chat_indexes = chat_indexes
+        self.terms = terms
+        self.entitlements = {row[0]: Entitlement.from_row(*row) for row in user_rows}
+        self._update_business_flag()
+
+        self._loaded_at = time.monotonic()
+        logger.info(
+            f"Rule index loaded: {len(rules)} rules ({len(global_rules)} global, "
+            f"{len(rules_by_chat)} scoped chats, {len(terms)} terms, "
+            f"{len(global_index.postings)} posting lists), "
+            f"{len(self.entitlements)} users"
+        )
+
+    async def refresh_users(self, user_ids: Iterable[int]):
+        """Reload entitlements of a few users (plan/expiry/quiet/forward target changed)."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                self._entitlement_query().where(User.id.in_(user_ids))
+            )).all()
+
+        for row in rows:
+            if row[0] in self.entitlements:
+                self.entitlements[row[0]] = Entitlement.from_row(*row)
+        self._update_business_flag()
+        logger.debug(f"Refreshed entitlements for {len(rows)} users")
+
+    def postings_for(self, chat_id: Optional[int]) -> List[PostingIndex]:
+        """Posting indexes that can match a message from chat_id: global + scoped to that chat."""
+        scoped = self.chat_indexes.get(chat_id)
+        if scoped is None:
+            return [self.global_index]
+        return [self.global_index, scoped]
+
+    async def get(self) -> "RuleIndex":
+        """Return the index, reloading what was invalidated since the last call."""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self.listen())
+
+        stale = time.monotonic() - self._loaded_at > RULE_INDEX_MAX_AGE
+        if self._dirty or stale or self._dirty_users:
+            async with self._lock:
+                if self._dirty or time.monotonic() - self._loaded_at > RULE_INDEX_MAX_AGE:
+                    await self.load()
+                elif self._dirty_users:
+                    users, self._dirty_users = self._dirty_users, set()
+                    await self.refresh_users(users)
+        return self
+
+    # ============ Invalidation ============
+    def invalidate(self, scope: str = "rules", user_id: Optional[int] = None):
+        if scope == "user" and user_id is not None:
+            self._dirty_users.add(user_id)
+        else:
+            self._dirty = True
+
+    async def listen(self):
+        """Subscribe to rule_index:invalidate; reconnects on error."""
+        while True:
+            pubsub = None
+            try:
+                redis = await get_blocking_redis()
+                pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(RULE_INDEX_CHANNEL)
+                # Anything may have changed while we were not subscribed
+                self._dirty = True
+                async for message in pubsub.listen():
+                    try:
+                        event = json.loads(message["data"])
+                    except (TypeError, json.JSONDecodeError):
+                        self._dirty = True
+                        continue
+                    self.invalidate(event.get("scope", "rules"), event.get("user_id"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Rule index listener error, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+
+# Singleton instance
+rule_index = RuleIndex()
@@ -8,6 +8,7 @@ from src.common.redis_client import get_redis
 from src.database.db import AsyncSessionLocal
 from src.database.models import UserTemplateSubscription, AnalysisTemplate, User, FilterRule, PlanType
 from src.worker.analyzers import template_processor
+from src.common.rule_events import publish_rules_changed
 
 logger = get_logger("scheduler")
 
@@ -178,6 +179,8 @@ class TemplateScheduler:
                     logger.error(f"Error downgrading user {user.id}: {e}")
             
             await session.commit()
+            # Keywords were deleted and plans changed
+            await publish_rules_changed()
             logger.info(f"✅ Processed {len(expired_users)} expired users")
 
 
@@ -0,0 +1,256 @@
+"""
+SIGNAL PARSER - Trích xuất tín hiệu giao dịch bằng regex (không cần AI)
+Phần lớn kênh SIGNAL đăng theo format cố định (Pair / Entry / TP / SL).
+Parser cục bộ xử lý các layout phổ biến trong vài micro giây; chỉ khi độ tin cậy thấp
+StrategyProcessor mới gọi Gemini.
+
+Pattern riêng cho từng nguồn: file JSON (SIGNAL_PATTERNS_FILE, mặc định signal_patterns.json)
+{
+    "-1001234567890": {
+        "pair": "Coin:\\s*#?(\\w+)",
+        "direction": "(LONG|SHORT)",
+        "entry": "Vào lệnh:\\s*([\\d.,\\s-]+)",
+        "tp": "Mục tiêu \\d:\\s*([\\d.,]+)",
+        "sl": "Dừng lỗ:\\s*([\\d.,]+)"
+    }
+}
+Mỗi pattern cần 1 capture group (nguồn có pattern thiếu group bị bỏ qua khi load);
+field nào không khai báo sẽ dùng grammar chung.
+"""
+import os
+import re
+import json
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Pattern
+
+from src.common.logger import get_logger
+from src.common.redis_client import get_redis
+
+logger = get_logger("signal_parser")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SIGNAL_PATTERNS_FILE = os.getenv("SIGNAL_PATTERNS_FILE", os.path.join(BASE_DIR, "signal_patterns.json"))
+
+# Ngưỡng tin cậy để dùng kết quả local (dưới ngưỡng, hoặc không có TP/SL -> escalate lên AI)
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("SIGNAL_LOCAL_CONFIDENCE", "0.75"))
+
+STATS_KEY_PREFIX = "signal_parser:stats:"
+STATS_TTL = 86400 * 30
+
+# ============ GENERIC GRAMMAR ============
+# 29,500 / 29500 / 1.5 (dấu phẩy chỉ là phân cách hàng nghìn: "100, 110" là 2 số)
+NUM = r"(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+RANGE = rf"{NUM}(?:\s*(?:-|–|~|to|đến)\s*{NUM})?"
+QUOTES = r"USDT|USDC|BUSD|FDUSD|USD|BTC|ETH"
+# Số thứ tự danh sách "1) 100", "2. 110" (không ăn "1.5": sau dấu phải có khoảng trắng)
+LIST_INDEX = r"(?:\d{1,2}\s*[).]\s+)?"
+
+# Từ thường gặp nhưng không phải ticker
+NOT_TICKERS = {
+    "LONG", "SHORT", "BUY", "SELL", "ENTRY", "TP", "SL", "STOP", "TARGET", "TARGETS",
+    "LEVERAGE", "CROSS", "ISOLATED", "SIGNAL", "VIP", "FREE", "SPOT", "FUTURES", "USDT", "USD",
+}
+
+GENERIC_PATTERNS = {
+    # BTC/USDT, BTC-USDT, BTCUSDT, #BTC/USDT
+    "pair_quoted": re.compile(rf"#?\$?\b([A-Z][A-Z0-9]{{1,11}}?)\s*[/\-]?\s*({QUOTES})\b"),
+    # #BTC, $BTC
+    "pair_tagged": re.compile(r"[#$]([A-Z][A-Z0-9]{1,11})\b"),
+    "direction": re.compile(r"\b(long|short|buy|sell|mua|bán)\b", re.IGNORECASE),
+    "entry": re.compile(
+        rf"(?:entry(?:\s*zone)?|entries|buy\s*zone|open|vào\s*lệnh|điểm\s*vào|vùng\s*mua)\s*(?:price)?\s*[:=@\-]?\s*({RANGE})",
+        re.IGNORECASE
+    ),
+    "tp": re.compile(
+        rf"\b(?:tp|targets?|take[\s-]?profit|chốt\s*lời)(?:\s*\d)?\b\s*[:=@\-)]?\s*{LIST_INDEX}({NUM})",
+        re.IGNORECASE
+    ),
+    # Phần tiếp theo của 1 danh sách target sau "Targets: 1) 2900": " 2) 2800", ", 2800", " / 2800"
+    "tp_next": re.compile(rf"(?:\s*[,;/|]\s*{LIST_INDEX}|\s*\d{{1,2}}\s*[).]\s+)({NUM})"),
+    "sl": re.compile(rf"\b(?:sl|stop[\s-]?loss|stop|cắt\s*lỗ|dừng\s*lỗ)\b\s*[:=@\-]?\s*({NUM})", re.IGNORECASE),
+}
+
+DIRECTION_MAP = {"long": "LONG", "buy": "LONG", "mua": "LONG", "short": "SHORT", "sell": "SHORT", "bán": "SHORT"}
+
+# Trọng số từng field trong confidence (tổng = 1.0)
+FIELD_WEIGHTS = {"pair": 0.3, "direction": 0.2, "entry": 0.25, "tp": 0.15, "sl": 0.1}
+
+
+def _to_float(value: str) -> Optional[float]:
+    try:
+        return float(value.replace(",", ""))
+    except (ValueError, AttributeError):
+        return None
+
+
+class SignalExtraction:
+    """Kết quả trích xuất + độ tin cậy (0-1)."""
+    __slots__ = ("pair", "direction", "entry", "tp", "sl", "confidence")
+
+    def __init__(self):
+        self.pair = None
+        self.direction = None
+        self.entry = None
+        self.tp: List[str] = []
+        self.sl = None
+        self.confidence = 0.0
+
+    @property
+    def has_exits(self) -> bool:
+        """Có ít nhất TP hoặc SL (pair + direction + entry thôi chưa đủ để dùng kết quả local)."""
+        return bool(self.tp or self.sl)
+
+    def to_dict(self) -> dict:
+        return {
+            "pair": self.pair,
+            "direction": self.direction,
+            "entry": self.entry,
+            "tp": ", ".join(self.tp) if self.tp else None,
+            "sl": self.sl,
+        }
+
+
+class SignalExtractor:
+    """Regex-based extractor: per-source patterns trước, grammar chung sau."""
+
+    def __init__(self, patterns_file: str = SIGNAL_PATTERNS_FILE):
+        self.source_patterns: Dict[int, Dict[str, Pattern]] = self._load_source_patterns(patterns_file)
+
+    @staticmethod
+    def _load_source_patterns(filepath: str) -> Dict[int, Dict[str, Pattern]]:
+        if not os.path.exists(filepath):
+            return {}
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Failed to load signal patterns from {filepath}: {e}")
+            return {}
+
+        compiled = {}
+        for chat_id, fields in raw.items():
+            try:
+                patterns = {
+                    field: re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+                    for field, pattern in fields.items()
+                    if field in FIELD_WEIGHTS
+                }
+                # extract() đọc group(1): pattern không có capture group sẽ raise IndexError
+                missing = [field for field, pattern in patterns.items() if pattern.groups < 1]
+                if missing:
+                    raise ValueError(f"no capture group in {', '.join(missing)}")
+                compiled[int(chat_id)] = patterns
+            except (ValueError, re.error) as e:
+                logger.error(f"Invalid signal pattern for source {chat_id}: {e}")
+        logger.info(f"Loaded signal patterns for {len(compiled)} sources.")
+        return compiled
+
+    @staticmethod
+    def _find_targets(text: str) -> List[str]:
+        """Every TP: "TP1: a TP2: b" and numbered / comma lists after 1 keyword ("Targets: 1) a 2) b")."""
+        targets = []
+        for m in GENERIC_PATTERNS["tp"].finditer(text):
+            targets.append(m.group(1))
+            pos = m.end()
+            while (item := GENERIC_PATTERNS["tp_next"].match(text, pos)):
+                targets.append(item.group(1))
+                pos = item.end()
+        return targets
+
+    @staticmethod
+    def _find_pair(text: str) -> Optional[str]:
+        for m in GENERIC_PATTERNS["pair_quoted"].finditer(text):
+            base = m.group(1).upper()
+            if base not in NOT_TICKERS and not base.isdigit():
+                return f"{base}/{m.group(2).upper()}"
+        for m in GENERIC_PATTERNS["pair_tagged"].finditer(text):
+            base = m.group(1).upper()
+            if base not in NOT_TICKERS:
+                return f"{base}/USDT"
+        return None
+
+    def extract(self, text: str, chat_id: Optional[int] = None) -> SignalExtraction:
+        result = SignalExtraction()
+        if not text:
+            return result
+
+        custom = self.source_patterns.get(chat_id, {}) if chat_id is not None else {}
+
+        def search(field: str, pattern: Pattern) -> Optional[str]:
+            m = custom[field].search(text) if field in custom else pattern.search(text)
+            return m.group(1).strip() if m else None
+
+        # Pair
+        if "pair" in custom:
+            m = custom["pair"].search(text)
+            result.pair = m.group(1).upper() if m else None
+        else:
+            result.pair = self._find_pair(text)
+
+        # Direction
+        direction = search("direction", GENERIC_PATTERNS["direction"])
+        if direction:
+            result.direction = DIRECTION_MAP.get(direction.lower(), direction.upper())
+
+        # Entry / TP / SL
+        result.entry = search("entry", GENERIC_PATTERNS["entry"])
+        if "tp" in custom:
+            result.tp = [m.group(1) for m in custom["tp"].finditer(text)]
+        else:
+            result.tp = self._find_targets(text)
+        result.sl = search("sl", GENERIC_PATTERNS["sl"])
+
+        # Suy ra direction từ TP so với Entry nếu kênh không ghi rõ
+        inferred = False
+        if not result.direction and result.entry and result.tp:
+            entry_value = _to_float(re.split(r"\s*(?:-|–|~|to|đến)\s*", result.entry)[0])
+            tp_value = _to_float(result.tp[0])
+            if entry_value and tp_value and entry_value != tp_value:
+                result.direction = "LONG" if tp_value > entry_value else "SHORT"
+                inferred = True
+
+        # Confidence
+        score = 0.0
+        if result.pair:
+            score += FIELD_WEIGHTS["pair"]
+        if result.direction:
+            score += FIELD_WEIGHTS["direction"] * (0.75 if inferred else 1.0)
+        if result.entry:
+            score += FIELD_WEIGHTS["entry"]
+        if result.tp:
+            score += FIELD_WEIGHTS["tp"]
+        if result.sl:
+            score += FIELD_WEIGHTS["sl"]
+        result.confidence = round(score, 3)
+        return result
+
+    # ============ HIT RATE TRACKING ============
+    async def record(self, chat_id: Optional[int], outcome: str):
+        """
+        Đếm kết quả theo nguồn/ngày: outcome = local | ai | ai_no_signal.
+        Redis hash signal_parser:stats:{date} -> field "{chat_id}:{outcome}".
+        """
+        try:
+            redis = await get_redis()
+            key = f"{STATS_KEY_PREFIX}{datetime.now(timezone.utc).strftime('%Y-%m-%d')}"
+            pipe = redis.pipeline(transaction=False)
+            pipe.hincrby(key, f"{chat_id or 0}:{outcome}", 1)
+            pipe.expire(key, STATS_TTL)
+            await pipe.execute()
+        except Exception as e:
+            logger.debug(f"Failed to record signal stats: {e}")
+
+    @staticmethod
+    async def get_stats(date_str: str) -> Dict[str, Dict[str, int]]:
+        """Trả về {chat_id: {"local": n, "ai": n, "ai_no_signal": n}} cho 1 ngày."""
+        redis = await get_redis()
+        raw = await redis.hgetall(f"{STATS_KEY_PREFIX}{date_str}")
+        stats: Dict[str, Dict[str, int]] = {}
+        for field, value in raw.items():
+            chat_id, _, outcome = field.rpartition(":")
+            stats.setdefault(chat_id, {})[outcome] = int(value)
+        return stats
+
+
+# Singleton instance
+signal_extractor = SignalExtractor()
@@ -2,24 +2,38 @@ import re
 import json
 from src.common.logger import get_logger
 from src.worker.ai_engine import ai_engine
+from src.worker.signal_parser import signal_extractor, LOCAL_CONFIDENCE_THRESHOLD
 
 logger = get_logger("strategy_processor")
 
+# Tags có bước làm giàu (enrich) nội dung
+ENRICHED_TAGS = ("NEWS_VIP", "SIGNAL", "ONCHAIN")
+
 class StrategyProcessor:
     """
     Xử lý tin nhắn theo chiến lược dựa trên Tag.
     """
+
+    @staticmethod
+    def get_tags(message_data: dict) -> list:
+        tags = message_data.get("tags", ["NORMAL"])
+        # Backward compatibility
+        if not tags and "tag" in message_data:
+            tags = [message_data["tag"]]
+        return tags or []
+
+    def needs_enrichment(self, message_data: dict) -> bool:
+        """True nếu tin nhắn có tag cần xử lý (AI summary / extraction / on-chain prefix)."""
+        if not message_data.get("text"):
+            return False
+        return any(tag in ENRICHED_TAGS for tag in self.get_tags(message_data))
     
     async def process(self, message_data: dict) -> dict:
         """
         Điều phối xử lý dựa trên tag.
         Trả về message_data đã được làm giàu (enriched) hoặc format lại.
         """
-        tags = message_data.get("tags", ["NORMAL"])
-        # Backward compatibility
-        if not tags and "tag" in message_data:
-            tags = [message_data["tag"]]
-            
+        tags = self.get_tags(message_data)
         text = message_data.get("text", "")
         
         if not text:
@@ -31,7 +45,7 @@ class StrategyProcessor:
             if "NEWS_VIP" in tags:
                 message_data["text"] = await self.handle_news_vip(text)
             elif "SIGNAL" in tags:
-                message_data["text"] = await self.handle_signal(text)
+                message_data["text"] = await self.handle_signal(text, message_data.get("chat_id"))
             elif "ONCHAIN" in tags:
                 # Assuming handle_onchain exists or will exist
                 if hasattr(self, 'handle_onchain'):
@@ -71,11 +85,21 @@ class StrategyProcessor:
             
         return f"{prefix}{summary}\n\n📄 *Chi tiết:*\n{text[:500]}..."
 
-    async def handle_signal(self, text: str) -> str:
+    async def handle_signal(self, text: str, chat_id: int = None) -> str:
         """
-        Xử lý tín hiệu: Trích xuất JSON và format đẹp.
+        Xử lý tín hiệu: Trích xuất bằng regex (local), chỉ gọi AI khi độ tin cậy thấp.
         """
-        # 1. AI Extraction
+        # 1. Local Extraction (regex, vài micro giây)
+        try:
+            extraction = signal_extractor.extract(text, chat_id)
+        except Exception as e:
+            logger.warning(f"Local signal extraction failed for {chat_id}: {e}")
+            extraction = None
+        if extraction and extraction.confidence >= LOCAL_CONFIDENCE_THRESHOLD and extraction.has_exits:
+            await signal_extractor.record(chat_id, "local")
+            return self._format_signal(extraction.to_dict(), text)
+
+        # 2. AI Extraction (fallback)
         prompt = f"""
         Bạn là bot trích xuất tín hiệu giao dịch.
         Hãy trích xuất thông tin từ văn bản sau và trả về JSON (không markdown).
@@ -93,12 +117,22 @@ class StrategyProcessor:
             data = json.loads(json_str)
             
             if data.get("error"):
+                await signal_extractor.record(chat_id, "ai_no_signal")
                 return text # Return original if no signal found
                 
-            # 2. Format Message
-            direction_icon = "🟢" if data.get("direction", "").upper() == "LONG" else "🔴"
+            await signal_extractor.record(chat_id, "ai")
+            return self._format_signal(data, text)
             
-            formatted_msg = f"""
+        except Exception as e:
+            logger.warning(f"Failed to extract signal: {e}")
+            return text
+
+    @staticmethod
+    def _format_signal(data: dict, text: str) -> str:
+        """Format tín hiệu đã trích xuất."""
+        direction_icon = "🟢" if (data.get("direction") or "").upper() == "LONG" else "🔴"
+        
+        return f"""
 {direction_icon} **SIGNAL: {data.get('pair', 'Unknown')}**
 
 📈 **Direction:** {data.get('direction')}
@@ -109,11 +143,6 @@ class StrategyProcessor:
 📝 *Original:*
 {text[:200]}...
 """
-            return formatted_msg
-            
-        except Exception as e:
-            logger.warning(f"Failed to extract signal: {e}")
-            return text
 
     async def handle_onchain(self, text: str) -> str:
         """